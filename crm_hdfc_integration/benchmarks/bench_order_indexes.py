@@ -0,0 +1,267 @@
+import random
+import time
+from datetime import timedelta
+
+import frappe
+from frappe.utils import now_datetime
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    reconciliation,
+    settlement,
+)
+from crm_hdfc_integration.install import HDFC_ORDER_INDEXES, add_hdfc_order_indexes
+
+# Query plans of the integration's HDFC Order lookups without and with its
+# indexes. Run it on a disposable site, it inserts synthetic orders and drops
+# the indexes while measuring:
+#   bench --site <site> execute \
+#       crm_hdfc_integration.benchmarks.bench_order_indexes.generate \
+#       --kwargs "{'rows': 1000000}"
+#   bench --site <site> execute crm_hdfc_integration.benchmarks.bench_order_indexes.run
+# and cleanup to delete the synthetic orders afterwards.
+
+BENCHMARK_PREFIX = "HDFC-BENCH-"
+# Indexes created from search_index on the doctype, named after the field
+SEARCH_INDEX_FIELDS = ("customer", "txn_id", "gateway_reference_id")
+
+# Share of orders per status, the open ones are the latest few hours only
+ORDER_STATUS_WEIGHTS = {
+    "Success": 80,
+    "Failed": 8,
+    "Card Payment Failed": 4,
+    "Cancelled": 3,
+    "Auto Refunded": 2,
+    "New": 1,
+    "Started": 1,
+    "Pending": 1,
+}
+DATASET_DAYS = 365
+
+
+def generate(rows=1_000_000, chunk_size=10_000, seed=42):
+    # Written with bulk_insert, so controllers, the rollup and the known
+    # orders filter are left alone
+    rng = random.Random(seed)
+    now = now_datetime()
+    companies = frappe.get_all("Company", pluck="name") or [None]
+    statuses = list(ORDER_STATUS_WEIGHTS)
+    weights = list(ORDER_STATUS_WEIGHTS.values())
+    fields = (
+        "name",
+        "creation",
+        "modified",
+        "owner",
+        "modified_by",
+        "docstatus",
+        "customer",
+        "company",
+        "order_status",
+        "hdfc_status",
+        "payment_entry_status",
+        "txn_id",
+        "txn_date",
+        "gateway_reference_id",
+        "reference_type",
+        "reference_doc",
+        "posting_date",
+        "amount",
+    )
+
+    offset = frappe.db.count("HDFC Order", {"name": ["like", f"{BENCHMARK_PREFIX}%"]})
+    for start in range(offset, offset + rows, chunk_size):
+        values = []
+        for idx in range(start, min(start + chunk_size, offset + rows)):
+            order_status = rng.choices(statuses, weights)[0]
+            is_open = order_status in reconciliation.OPEN_ORDER_STATUSES
+            age = timedelta(
+                seconds=rng.uniform(0, 6 * 3600 if is_open else DATASET_DAYS * 86400)
+            )
+            creation = now - age
+            is_settled = order_status in settlement.SETTLED_ORDER_STATUSES
+            has_reference = idx % 2 == 0
+
+            values.append(
+                (
+                    f"{BENCHMARK_PREFIX}{idx:09d}",
+                    creation,
+                    creation + timedelta(seconds=rng.uniform(0, 600)),
+                    "Administrator",
+                    "Administrator",
+                    1 if order_status == "Success" else 0,
+                    f"{BENCHMARK_PREFIX}CUST-{rng.randrange(rows // 20 or 1):07d}",
+                    rng.choice(companies),
+                    order_status,
+                    order_status.upper().replace(" ", "_"),
+                    _get_payment_entry_status(rng, order_status),
+                    f"txn-{idx:09d}" if not is_open else None,
+                    creation + timedelta(seconds=30) if is_settled else None,
+                    f"{idx:012d}" if not is_open else None,
+                    "Sales Invoice" if has_reference else None,
+                    f"{BENCHMARK_PREFIX}SINV-{idx:09d}" if has_reference else None,
+                    creation.date(),
+                    round(rng.uniform(100, 50_000), 2),
+                )
+            )
+
+        frappe.db.bulk_insert("HDFC Order", fields, values)
+        frappe.db.commit()
+
+    return frappe.db.count("HDFC Order")
+
+
+def run(repeat=5):
+    sample = _get_sample_order()
+    queries = _get_queries(sample)
+
+    _drop_indexes()
+    before = {name: _measure(query, repeat) for name, query in queries.items()}
+
+    add_hdfc_order_indexes()
+    for fieldname in SEARCH_INDEX_FIELDS:
+        frappe.db.add_index("HDFC Order", [fieldname], index_name=fieldname)
+    after = {name: _measure(query, repeat) for name, query in queries.items()}
+
+    print(f"HDFC Order rows: {frappe.db.count('HDFC Order')}")
+    print(
+        f"{'query':<24}{'before':<34}{'after':<34}"
+        f"{'before ms':>10}{'after ms':>10}"
+    )
+    for name in queries:
+        print(
+            f"{name:<24}{before[name]['plan']:<34}{after[name]['plan']:<34}"
+            f"{before[name]['ms']:>10.2f}{after[name]['ms']:>10.2f}"
+        )
+
+    return {"before": before, "after": after}
+
+
+def cleanup():
+    frappe.db.delete("HDFC Order", {"name": ["like", f"{BENCHMARK_PREFIX}%"]})
+    frappe.db.commit()
+
+
+def _get_queries(sample):
+    # The filters, columns and ordering the integration uses for each lookup
+    now = now_datetime()
+    min_age, max_age = reconciliation.ORDER_AGE_BUCKETS["today"]
+    queries = {
+        "reconciliation": dict(
+            filters=[
+                ["order_status", "in", reconciliation.OPEN_ORDER_STATUSES],
+                ["docstatus", "=", 0],
+                ["creation", ">=", now - max_age],
+                ["creation", "<", now - min_age],
+            ],
+            fields=["name", "customer"],
+            order_by="name asc",
+            limit=config.HDFC_RECONCILIATION_PAGE_SIZE,
+        ),
+        "queued_payment_entries": dict(
+            filters={
+                "docstatus": 1,
+                "payment_entry_status": "Queued",
+                "company": sample.company,
+            },
+            fields=["name"],
+            order_by="creation asc",
+            limit=config.HDFC_PAYMENT_ENTRY_BATCH_SIZE,
+        ),
+        "settlement_period": dict(
+            filters=[
+                ["order_status", "in", settlement.SETTLED_ORDER_STATUSES],
+                ["txn_date", ">=", now - timedelta(days=2)],
+                ["txn_date", "<=", now - timedelta(days=1)],
+            ],
+            fields=["name"],
+            order_by="name asc",
+            limit=config.HDFC_SETTLEMENT_CHUNK_SIZE,
+        ),
+        "export_page": dict(
+            filters=[["modified", ">=", now - timedelta(days=30)]],
+            fields=["name", "modified", "order_status"],
+            order_by="modified asc, name asc",
+            limit=config.HDFC_EXPORT_PAGE_SIZE,
+        ),
+        "by_txn_id": dict(filters={"txn_id": sample.txn_id}, fields=["name"]),
+        "by_gateway_reference": dict(
+            filters={"gateway_reference_id": sample.gateway_reference_id},
+            fields=["name"],
+        ),
+        "by_reference_doc": dict(
+            filters={
+                "reference_type": sample.reference_type,
+                "reference_doc": sample.reference_doc,
+            },
+            fields=["name"],
+        ),
+        "by_customer": dict(
+            filters={"customer": sample.customer},
+            fields=["name", "order_status", "amount"],
+            order_by="creation desc",
+            limit=20,
+        ),
+    }
+
+    return {
+        name: frappe.get_all("HDFC Order", run=0, **kwargs)
+        for name, kwargs in queries.items()
+    }
+
+
+def _get_sample_order():
+    return frappe.get_all(
+        "HDFC Order",
+        filters={
+            "name": ["like", f"{BENCHMARK_PREFIX}%"],
+            "txn_id": ["is", "set"],
+            "reference_doc": ["is", "set"],
+        },
+        fields=[
+            "company",
+            "customer",
+            "txn_id",
+            "gateway_reference_id",
+            "reference_type",
+            "reference_doc",
+        ],
+        order_by="name desc",
+        limit=1,
+    )[0]
+
+
+def _drop_indexes():
+    for index_name in (*HDFC_ORDER_INDEXES, *SEARCH_INDEX_FIELDS):
+        if not frappe.db.has_index("tabHDFC Order", index_name):
+            continue
+        if frappe.db.db_type == "postgres":
+            frappe.db.sql_ddl(f'drop index if exists "{index_name}"')
+        else:
+            frappe.db.sql_ddl(f"alter table `tabHDFC Order` drop index `{index_name}`")
+
+
+def _measure(query, repeat):
+    plan = frappe.db.sql(f"explain {query}", as_dict=True)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        frappe.db.sql(query)
+        timings.append(time.perf_counter() - started)
+
+    return {"plan": _summarize_plan(plan), "ms": min(timings) * 1000}
+
+
+def _summarize_plan(plan):
+    # The index used and the rows examined on MariaDB, the top plan node on
+    # Postgres
+    if plan and "QUERY PLAN" in plan[0]:
+        return plan[0]["QUERY PLAN"].split("  (", 1)[0][:32]
+    row = plan[0]
+    return f"{row.get('key') or row.get('type')}, {row.get('rows')} rows"[:32]
+
+
+def _get_payment_entry_status(rng, order_status):
+    if order_status != "Success":
+        return None
+    # A few submitted orders still wait for their Payment Entry
+    return "Queued" if rng.random() < 0.001 else "Created"
@@ -0,0 +1,95 @@
+import hmac
+import timeit
+from base64 import b64encode
+from hashlib import sha256
+from urllib.parse import quote_plus
+
+from crm_hdfc_integration.benchmarks.payloads import load_signature_vectors
+from crm_hdfc_integration.hdfc_smartgateway.integration import signature
+
+# Does not need a site:
+#   python -m crm_hdfc_integration.benchmarks.bench_signature
+
+
+def run(iterations=20000):
+    vectors = load_signature_vectors()
+    key = vectors["key"]
+    callbacks = [
+        (vector["signature"], vector["params"]) for vector in vectors["vectors"]
+    ]
+
+    for signature_value, params in callbacks:
+        if not _baseline_verify_hmac_signature(signature_value, params, key):
+            raise AssertionError(f"Baseline rejects the vector {params}")
+        if not signature.verify_signature(signature_value, params, key):
+            raise AssertionError(f"Signature differs from the baseline for {params}")
+    if not all(signature.verify_signatures(callbacks, key)):
+        raise AssertionError("Batch verification rejects a vector")
+
+    results = []
+    for vector in vectors["vectors"]:
+        args = (vector["signature"], vector["params"], key)
+        baseline = _time_per_call(_baseline_verify_hmac_signature, args, iterations)
+        current = _time_per_call(signature.verify_signature, args, iterations)
+        results.append(
+            {
+                "vector": vector["name"],
+                "baseline_us": baseline,
+                "current_us": current,
+                "speedup": baseline / current,
+            }
+        )
+
+    baseline = _time_per_call(
+        lambda: [
+            _baseline_verify_hmac_signature(*callback, key) for callback in callbacks
+        ],
+        (),
+        iterations // len(callbacks),
+    )
+    batch = _time_per_call(
+        signature.verify_signatures, (callbacks, key), iterations // len(callbacks)
+    )
+    results.append(
+        {
+            "vector": f"batch of {len(callbacks)}",
+            "baseline_us": baseline,
+            "current_us": batch,
+            "speedup": baseline / batch,
+        }
+    )
+
+    print(f"{'vector':<24}{'baseline':>12}{'current':>12}{'x':>8}")
+    for result in results:
+        print(
+            f"{result['vector']:<24}"
+            f"{result['baseline_us']:>10.2f}us"
+            f"{result['current_us']:>10.2f}us"
+            f"{result['speedup']:>8.2f}"
+        )
+
+    return results
+
+
+def _time_per_call(fn, args, iterations):
+    # Best of 5 runs, in microseconds per call
+    timings = timeit.repeat(lambda: fn(*args), number=iterations, repeat=5)
+    return min(timings) / iterations * 1_000_000
+
+
+# utils.verify_hmac_signature before the signature module, kept as the baseline
+def _baseline_verify_hmac_signature(signature, params, key):
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    encoded_sorted = []
+    for i in sorted(params.keys()):
+        encoded_sorted.append(quote_plus(i) + "=" + quote_plus(params.get(i)))
+
+    encoded_string = quote_plus("&".join(encoded_sorted))
+    dig = hmac.new(key, msg=encoded_string.encode("utf-8"), digestmod=sha256).digest()
+
+    return b64encode(dig).decode() == signature
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,182 @@
+import timeit
+
+import frappe
+from frappe import utils
+from pytz import timezone
+
+from crm_hdfc_integration.benchmarks.payloads import load_order_status_payloads
+from crm_hdfc_integration.hdfc_smartgateway.integration import transformers
+
+# Usage:
+#   bench --site <site> execute \
+#       crm_hdfc_integration.benchmarks.bench_transformers.run \
+#       --kwargs "{'iterations': 20000}"
+
+
+def run(iterations=5000):
+    results = []
+
+    for name, payload in load_order_status_payloads().items():
+        expected = _normalize(_baseline_parse_order_status_res(payload))
+        if _normalize(transformers.parse_order_status_res(payload)) != expected:
+            frappe.throw(f"Parsed output differs from the baseline for {name}")
+
+        baseline = _time_per_call(_baseline_parse_order_status_res, payload, iterations)
+        full = _time_per_call(transformers.parse_order_status_res, payload, iterations)
+        peek = _time_per_call(transformers.peek_order_status_res, payload, iterations)
+
+        results.append(
+            {
+                "payload": name,
+                "baseline_us": baseline,
+                "full_us": full,
+                "peek_us": peek,
+                "full_speedup": baseline / full,
+                "peek_speedup": baseline / peek,
+            }
+        )
+
+    print(
+        f"{'payload':<36}{'baseline':>12}{'full':>12}{'peek':>12}"
+        f"{'full x':>9}{'peek x':>9}"
+    )
+    for result in results:
+        print(
+            f"{result['payload']:<36}"
+            f"{result['baseline_us']:>10.2f}us"
+            f"{result['full_us']:>10.2f}us"
+            f"{result['peek_us']:>10.2f}us"
+            f"{result['full_speedup']:>9.2f}"
+            f"{result['peek_speedup']:>9.2f}"
+        )
+
+    return results
+
+
+def _normalize(parsed):
+    # user_defined_values is compared as data, its JSON formatting may differ
+    order_status_data, user_defined_values = parsed
+    order_status_data = dict(order_status_data)
+    order_status_data["user_defined_values"] = frappe.parse_json(
+        order_status_data["user_defined_values"]
+    )
+    return order_status_data, user_defined_values
+
+
+def _time_per_call(fn, payload, iterations):
+    # Best of 5 runs, in microseconds per call
+    timings = timeit.repeat(lambda: fn(payload), number=iterations, repeat=5)
+    return min(timings) / iterations * 1_000_000
+
+
+def _baseline_parse_utc_datetime(datetime_like_obj):
+    system_tz_name = utils.get_system_timezone()
+    system_tz = timezone(system_tz_name)
+
+    datetime = utils.get_datetime(datetime_like_obj)
+    if datetime:
+        return datetime.astimezone(system_tz).replace(tzinfo=None)
+    return None
+
+
+# parse_order_status_res before the field spec rewrite, kept as the baseline
+def _baseline_parse_order_status_res(order_status_res):
+    user_defined_values = {
+        "udf1": order_status_res["udf1"],
+        "udf2": order_status_res["udf2"],
+        "udf3": order_status_res["udf3"],
+        "udf4": order_status_res["udf4"],
+        "udf5": order_status_res["udf5"],
+        "udf6": order_status_res["udf6"],
+        "udf7": order_status_res["udf7"],
+        "udf8": order_status_res["udf8"],
+        "udf9": order_status_res["udf9"],
+        "udf10": order_status_res["udf10"],
+    }
+
+    txn_details = order_status_res.get("txn_detail") or {}
+
+    order_status_data = {
+        "order_status": transformers.HDFC_STATUS_ID_MAP[order_status_res["status_id"]],
+        "hdfc_status": order_status_res["status"],
+        "amount": order_status_res["amount"],
+        "user_defined_values": frappe.as_json(user_defined_values),
+        "mode_of_payment": transformers.HDFC_PAYMENT_METHOD_MAP[
+            order_status_res["payment_method_type"]
+        ],
+        "payment_service": order_status_res["payment_method"],
+        "refunded": order_status_res["refunded"],
+        "amount_refunded": order_status_res["amount_refunded"],
+        "effective_amount": order_status_res["effective_amount"],
+        "response_code": order_status_res["resp_code"],
+        "response_message": order_status_res["resp_message"],
+        "bank_error_code": order_status_res["bank_error_code"],
+        "bank_error_message": order_status_res["bank_error_message"],
+        "txn_id": txn_details.get("txn_id"),
+        "txn_uuid": txn_details.get("txn_uuid"),
+        "txn_status": txn_details.get("status"),
+        "txn_date": _baseline_parse_utc_datetime(txn_details.get("created")),
+        "txn_currency": txn_details.get("currency"),
+        "txn_net_amount": txn_details.get("net_amount"),
+        "txn_supercharge_amount": txn_details.get("surcharge_amount"),
+        "txn_tax_amount": txn_details.get("tax_amount"),
+        "txn_amount": txn_details.get("txn_amount"),
+        "txn_offer_deduction_amount": txn_details.get("offer_deduction_amount"),
+        "txn_error_code": txn_details.get("error_code"),
+        "txn_error_message": txn_details.get("error_message"),
+        "express_checkout": txn_details.get("express_checkout"),
+        "gateway": txn_details.get("gateway"),
+        "txn_amount_breakup": [
+            {
+                "idx": amnt_break.get("sno"),
+                "breakup_name": amnt_break.get("name"),
+                "value": amnt_break.get("value"),
+                "method": amnt_break.get("method"),
+                "description": amnt_break.get("desc"),
+            }
+            for amnt_break in txn_details.get("txn_amount_breakup") or []
+        ],
+        "gateway_id": order_status_res["gateway_id"],
+        "gateway_reference_id": order_status_res["gateway_reference_id"],
+    }
+
+    if order_status_res.get("card"):
+        card_res = order_status_res["card"]
+        order_status_data["name_on_card"] = card_res["name_on_card"]
+        order_status_data["card_reference"] = card_res["card_reference"]
+        order_status_data["expiry_year"] = card_res["expiry_year"]
+        order_status_data["expiry_month"] = card_res["expiry_month"]
+        order_status_data["last_four_digits"] = card_res["last_four_digits"]
+        order_status_data["saved_to_locker"] = card_res["saved_to_locker"]
+        order_status_data["using_saved_card"] = card_res["using_saved_card"]
+        order_status_data["card_issuer"] = card_res["card_issuer"]
+        order_status_data["card_brand"] = card_res["card_brand"]
+        order_status_data["card_type"] = card_res["card_type"]
+        order_status_data["card_isin"] = card_res["card_isin"]
+        order_status_data["card_fingerprint"] = card_res["card_fingerprint"]
+
+    if order_status_res.get("refunds"):
+        order_status_data["refunds"] = []
+        for refund in order_status_res.get("refunds"):
+            order_status_data["refunds"].append(
+                {
+                    "id": refund["id"],
+                    "amount": refund["amount"],
+                    "unique_request_id": refund["unique_request_id"],
+                    "ref": refund["ref"],
+                    "refund_time": _baseline_parse_utc_datetime(refund["created"]),
+                    "status": refund["status"],
+                    "error_message": refund["error_message"],
+                    "sent_to_gateway": refund["sent_to_gateway"],
+                    "initiated_by": refund["initiated_by"],
+                    "refund_source": refund["refund_source"],
+                    "refund_type": refund["refund_type"],
+                    "error_code": refund["error_code"],
+                    "metadata": refund["metadata"],
+                }
+            )
+
+    # Cleanoff None values
+    order_status_data = {k: v for k, v in order_status_data.items() if v is not None}
+
+    return order_status_data, user_defined_values
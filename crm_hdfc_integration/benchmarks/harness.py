@@ -0,0 +1,369 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.app import application
+from frappe.database.database import Database
+from frappe.utils import create_batch, today
+from werkzeug.test import Client
+
+from crm_hdfc_integration.benchmarks.mock_gateway import MockSmartGateway
+from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order_status_rollup import (
+    hdfc_order_status_rollup,
+)
+from crm_hdfc_integration.hdfc_smartgateway.integration import metrics, transformers
+
+# Drives the integration endpoints end to end against the local gateway
+# stand-in. It only runs on a disposable site with "hdfc_benchmark_site": 1 in
+# its site config:
+#   bench --site <site> execute crm_hdfc_integration.benchmarks.harness.run \
+#       --kwargs "{'concurrency': 16, 'checkouts': 500, 'latency_ms': 80}"
+# While it runs the SmartGateway settings point at the mock and a System
+# Manager benchmark user makes the calls. The settings are restored and the
+# user, its orders, their logs and webhook events are deleted afterwards.
+# Payment Entries created for charged orders are left on the site.
+
+BENCHMARK_USER = "hdfc-benchmark@example.com"
+BENCHMARK_CUSTOMER = "HDFC Benchmark Customer"
+METHOD_PATH = "/api/method/crm_hdfc_integration.hdfc_smartgateway"
+ENDPOINTS = {
+    "create_order": f"{METHOD_PATH}.doctype.hdfc_order.hdfc_order.create_order",
+    "verify_order": f"{METHOD_PATH}.integration.service.verify_order",
+    "handle_order": f"{METHOD_PATH}.integration.webhook.handle_order",
+    "sync_order_status": f"{METHOD_PATH}.integration.service.sync_order_status",
+}
+
+_query_counter = threading.local()
+
+
+def run(
+    concurrency=8,
+    checkouts=200,
+    latency_ms=50,
+    latency_jitter_ms=10,
+    error_rate=0.0,
+    refund_rate=0.0,
+    final_status="PENDING_VBV",
+    output=None,
+):
+    if not frappe.conf.get("hdfc_benchmark_site"):
+        frappe.throw(
+            "The benchmark changes the SmartGateway settings and creates a System "
+            "Manager user. Set hdfc_benchmark_site in the site config of a "
+            "disposable site to run it."
+        )
+
+    mock = MockSmartGateway(
+        latency_ms=latency_ms,
+        latency_jitter_ms=latency_jitter_ms,
+        error_rate=error_rate,
+        refund_rate=refund_rate,
+    )
+
+    started_on = today()
+    original_settings = _get_settings_values()
+    with mock, _count_queries():
+        context = None
+        try:
+            _point_settings_to(mock.base_uri, original_settings)
+            context = frappe._dict(
+                site=frappe.local.site,
+                mock=mock,
+                order_ids=[],
+                final_status=final_status,
+                response_key=frappe.db.get_single_value(
+                    "HDFC SmartGateway Settings", "response_key"
+                ),
+                authorization=_get_benchmark_authorization(),
+                customer=_get_benchmark_customer(),
+            )
+            frappe.db.commit()
+            metrics.reset_metrics()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                checkout_samples = list(
+                    executor.map(lambda _: _run_checkout(context), range(checkouts))
+                )
+            elapsed = time.perf_counter() - started
+        finally:
+            _restore_settings(original_settings)
+            _delete_benchmark_data(context.order_ids if context else [], started_on)
+            frappe.db.commit()
+
+    samples = [sample for checkout in checkout_samples for sample in checkout]
+    report = {
+        "concurrency": concurrency,
+        "checkouts": checkouts,
+        "latency_ms": latency_ms,
+        "error_rate": error_rate,
+        "elapsed_s": elapsed,
+        "gateway_requests": dict(mock.request_counts),
+        "endpoints": _summarize(samples, elapsed),
+        "stages": _summarize_stages(metrics.get_metrics_snapshot()),
+    }
+
+    _print_report(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    return report
+
+
+def _run_checkout(context):
+    client = Client(application)
+    headers = {"X-Frappe-Site-Name": context.site}
+    auth_headers = {**headers, "Authorization": context.authorization}
+    samples = []
+
+    res = _call(
+        samples,
+        "create_order",
+        client.post,
+        data={
+            "order_amount": 1000,
+            "customer_details": json.dumps({"customer_id": context.customer}),
+        },
+        headers=auth_headers,
+    )
+    if res.status_code != 200:
+        return samples
+
+    order_id = res.json["message"]["order_id"]
+    context.order_ids.append(order_id)
+    order = context.mock.pay(order_id, context.final_status)
+
+    _call(
+        samples,
+        "verify_order",
+        client.get,
+        query_string=context.mock.return_url_params(order_id, context.response_key),
+        headers=headers,
+    )
+    _call(
+        samples,
+        "handle_order",
+        client.post,
+        json=context.mock.webhook_body(order_id),
+        headers=headers,
+    )
+    _call(
+        samples,
+        "sync_order_status",
+        client.post,
+        data={
+            "order_id": order_id,
+            "status": transformers.HDFC_STATUS_ID_MAP[order["status_id"]],
+        },
+        headers=auth_headers,
+    )
+
+    return samples
+
+
+def _call(samples, endpoint, request, **kwargs):
+    _query_counter.count = 0
+    started = time.perf_counter()
+    res = request(ENDPOINTS[endpoint], **kwargs)
+    samples.append(
+        {
+            "endpoint": endpoint,
+            "duration": time.perf_counter() - started,
+            "queries": _query_counter.count,
+            # verify_order answers with a redirect on success
+            "failed": res.status_code >= 400,
+        }
+    )
+    return res
+
+
+class _count_queries:
+    # Counts Database.sql calls made by the current thread
+    def __enter__(self):
+        self.sql = Database.sql
+        sql = self.sql
+
+        def counting_sql(db, *args, **kwargs):
+            _query_counter.count = getattr(_query_counter, "count", 0) + 1
+            return sql(db, *args, **kwargs)
+
+        Database.sql = counting_sql
+        return self
+
+    def __exit__(self, *exc):
+        Database.sql = self.sql
+
+
+def _get_settings_values():
+    settings = frappe.get_single("HDFC SmartGateway Settings")
+    return {
+        "enabled": settings.enabled,
+        "api_base_uri": settings.api_base_uri,
+        "merchant_id": settings.merchant_id,
+        "client_id": settings.client_id,
+        "response_key": settings.response_key,
+        "api_key": settings.get_password("api_key", raise_exception=False),
+    }
+
+
+def _point_settings_to(base_uri, original_settings):
+    settings = frappe.get_single("HDFC SmartGateway Settings")
+    settings.update(
+        {
+            "enabled": 1,
+            "api_base_uri": base_uri,
+            "merchant_id": settings.merchant_id or "hdfc_benchmark",
+            "client_id": settings.client_id or "hdfc_benchmark",
+            "response_key": settings.response_key or frappe.generate_hash(length=32),
+            "api_key": original_settings["api_key"] or frappe.generate_hash(length=32),
+        }
+    )
+    settings.save(ignore_permissions=True)
+    frappe.db.commit()
+
+
+def _restore_settings(original_settings):
+    settings = frappe.get_single("HDFC SmartGateway Settings")
+    settings.update(original_settings)
+    settings.save(ignore_permissions=True)
+
+
+def _delete_benchmark_data(order_ids, started_on):
+    # Orders may be submitted, so they are removed without their controllers
+    # and the rollup is rebuilt from what is left
+    for order_ids_chunk in create_batch(order_ids, 1000):
+        order_ids_chunk = list(order_ids_chunk)
+        for child_doctype in (
+            "HDFC Reference Invoices",
+            "HDFC Txn Amount Breakup",
+            "HDFC Refunds",
+        ):
+            frappe.db.delete(
+                child_doctype,
+                {"parenttype": "HDFC Order", "parent": ["in", order_ids_chunk]},
+            )
+        frappe.db.delete("HDFC Order Status Logs", {"order": ["in", order_ids_chunk]})
+        frappe.db.delete("HDFC Webhook Event", {"order_id": ["in", order_ids_chunk]})
+        frappe.db.delete("HDFC Order", {"name": ["in", order_ids_chunk]})
+    if order_ids:
+        hdfc_order_status_rollup.rebuild_rollup(from_date=started_on)
+
+    if frappe.db.exists("User", BENCHMARK_USER):
+        frappe.delete_doc("User", BENCHMARK_USER, ignore_permissions=True, force=True)
+
+
+def _get_benchmark_customer():
+    if not frappe.db.exists("Customer", BENCHMARK_CUSTOMER):
+        frappe.get_doc(
+            {
+                "doctype": "Customer",
+                "customer_name": BENCHMARK_CUSTOMER,
+                "customer_type": "Individual",
+            }
+        ).insert(ignore_permissions=True)
+    return BENCHMARK_CUSTOMER
+
+
+def _get_benchmark_authorization():
+    if not frappe.db.exists("User", BENCHMARK_USER):
+        user = frappe.get_doc(
+            {
+                "doctype": "User",
+                "email": BENCHMARK_USER,
+                "first_name": "HDFC Benchmark",
+                "send_welcome_email": 0,
+                "roles": [{"role": "System Manager"}],
+            }
+        ).insert(ignore_permissions=True)
+    else:
+        user = frappe.get_doc("User", BENCHMARK_USER)
+
+    api_secret = frappe.generate_hash(length=15)
+    user.api_key = user.api_key or frappe.generate_hash(length=15)
+    user.api_secret = api_secret
+    user.save(ignore_permissions=True)
+
+    return f"token {user.api_key}:{api_secret}"
+
+
+def _summarize(samples, elapsed):
+    summary = {}
+    for endpoint in ENDPOINTS:
+        endpoint_samples = [s for s in samples if s["endpoint"] == endpoint]
+        if not endpoint_samples:
+            continue
+
+        durations = sorted(s["duration"] * 1000 for s in endpoint_samples)
+        summary[endpoint] = {
+            "calls": len(endpoint_samples),
+            "errors": sum(s["failed"] for s in endpoint_samples),
+            "p50_ms": _percentile(durations, 50),
+            "p95_ms": _percentile(durations, 95),
+            "p99_ms": _percentile(durations, 99),
+            "throughput": len(endpoint_samples) / elapsed,
+            "queries": sum(s["queries"] for s in endpoint_samples)
+            / len(endpoint_samples),
+        }
+    return summary
+
+
+def _summarize_stages(snapshot):
+    # Mean latency and queries per instrumented operation, from the metrics
+    # recorded by the integration itself
+    stages = {}
+    for sample, value in snapshot.items():
+        name, _, labels = sample.partition("{")
+        if not labels.startswith('operation="'):
+            continue
+        operation = labels.split('"')[1]
+        stage = stages.setdefault(operation, {})
+        if name == "hdfc_operation_seconds_count":
+            stage["calls"] = int(value)
+        elif name == "hdfc_operation_seconds_sum":
+            stage["seconds"] = value
+        elif name == "hdfc_operation_queries_sum":
+            stage["queries"] = value
+
+    return {
+        operation: {
+            "calls": stage.get("calls", 0),
+            "mean_ms": stage.get("seconds", 0) * 1000 / (stage.get("calls") or 1),
+            "queries": stage.get("queries", 0) / (stage.get("calls") or 1),
+        }
+        for operation, stage in sorted(stages.items())
+    }
+
+
+def _percentile(sorted_values, percent):
+    # Nearest rank
+    rank = max(int(round(percent / 100 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+def _print_report(report):
+    print(
+        f"{report['checkouts']} checkouts at concurrency {report['concurrency']}, "
+        f"gateway latency {report['latency_ms']}ms, "
+        f"error rate {report['error_rate']:.1%}, {report['elapsed_s']:.2f}s"
+    )
+    print(
+        f"{'endpoint':<20}{'calls':>7}{'errors':>8}{'p50':>10}{'p95':>10}"
+        f"{'p99':>10}{'req/s':>9}{'queries':>9}"
+    )
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint:<20}{stats['calls']:>7}{stats['errors']:>8}"
+            f"{stats['p50_ms']:>8.1f}ms{stats['p95_ms']:>8.1f}ms"
+            f"{stats['p99_ms']:>8.1f}ms{stats['throughput']:>9.1f}"
+            f"{stats['queries']:>9.1f}"
+        )
+
+    print(f"\n{'stage':<28}{'calls':>7}{'mean':>10}{'queries':>9}")
+    for operation, stats in report["stages"].items():
+        print(
+            f"{operation:<28}{stats['calls']:>7}{stats['mean_ms']:>8.1f}ms"
+            f"{stats['queries']:>9.1f}"
+        )
@@ -0,0 +1,383 @@
+import argparse
+import base64
+import copy
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote_plus, urlencode
+from urllib.request import Request, urlopen
+
+from crm_hdfc_integration.benchmarks.payloads import load_order_status_payloads
+
+# Local stand-in for the HDFC SmartGateway API. It does not import frappe so
+# it can also run on its own:
+#   python -m crm_hdfc_integration.benchmarks.mock_gateway --port 8765
+
+HDFC_STATUS_IDS = {
+    "NEW": 10,
+    "STARTED": 20,
+    "CHARGED": 21,
+    "JUSPAY_DECLINED": 22,
+    "PENDING_VBV": 23,
+    "AUTHORIZED": 25,
+    "AUTHENTICATION_FAILED": 26,
+    "AUTHORIZATION_FAILED": 27,
+    "AUTHORIZING": 28,
+    "VOIDED": 31,
+    "AUTO_REFUNDED": 36,
+}
+
+WEBHOOK_EVENTS = {
+    "CHARGED": "ORDER_SUCCEEDED",
+    "AUTHENTICATION_FAILED": "ORDER_FAILED",
+    "AUTHORIZATION_FAILED": "ORDER_FAILED",
+    "JUSPAY_DECLINED": "ORDER_FAILED",
+    "AUTO_REFUNDED": "ORDER_REFUNDED",
+}
+
+
+class MockSmartGateway:
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency_ms=0,
+        latency_jitter_ms=0,
+        error_rate=0.0,
+        refund_rate=0.0,
+        seed=None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.refund_rate = refund_rate
+        self.random = random.Random(seed)
+        self.templates = list(load_order_status_payloads().values())
+        self.orders = {}
+        self.request_counts = {}
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_uri(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def create_session(self, session_req):
+        order_id = session_req.get("order_id") or f"order{uuid.uuid4().hex[:15]}"
+        with self.lock:
+            template = self.random.choice(self.templates)
+        order = copy.deepcopy(template)
+        hdfc_order_id = f"ordeh_{uuid.uuid4().hex[:20]}"
+        now = datetime.now(timezone.utc)
+
+        order.update(
+            {
+                "order_id": order_id,
+                "id": hdfc_order_id,
+                "customer_id": session_req.get("customer_id") or "",
+                "customer_email": session_req.get("customer_email") or "",
+                "customer_phone": session_req.get("customer_phone") or "",
+                "amount": float(session_req.get("amount") or 0),
+                "effective_amount": float(session_req.get("amount") or 0),
+                "currency": session_req.get("currency") or "INR",
+                "return_url": session_req.get("return_url") or "",
+                "date_created": _isoformat(now),
+                "refunded": False,
+                "amount_refunded": 0.0,
+                "refunds": [],
+                **{
+                    f"udf{idx}": session_req.get(f"udf{idx}", "")
+                    for idx in range(1, 11)
+                },
+            }
+        )
+        _set_status(order, "NEW")
+        txn_detail = order.get("txn_detail")
+        if txn_detail:
+            txn_detail.update(
+                {
+                    "order_id": order_id,
+                    "txn_id": f"SG-{order_id}-1",
+                    "net_amount": order["amount"],
+                    "txn_amount": order["amount"],
+                    "created": _isoformat(now),
+                }
+            )
+            order["txn_id"] = txn_detail["txn_id"]
+
+        with self.lock:
+            self.orders[order_id] = order
+
+        payment_link = f"{self.base_uri}/orders/{hdfc_order_id}/payment-page"
+        return {
+            "status": "NEW",
+            "id": hdfc_order_id,
+            "order_id": order_id,
+            "payment_links": {
+                "web": payment_link,
+                "expiry": _isoformat(now + timedelta(minutes=15)),
+            },
+            "sdk_payload": {
+                "requestId": uuid.uuid4().hex,
+                "service": "in.juspay.hyperpay",
+                "payload": {
+                    "clientId": session_req.get("payment_page_client_id"),
+                    "orderId": order_id,
+                    "amount": str(order["amount"]),
+                    "returnUrl": order["return_url"],
+                    "action": session_req.get("action"),
+                },
+            },
+        }
+
+    def get_order(self, order_id):
+        with self.lock:
+            order = self.orders.get(order_id)
+            return copy.deepcopy(order) if order else None
+
+    def pay(self, order_id, status="CHARGED"):
+        # Moves the order as if the payer completed the payment page
+        with self.lock:
+            order = self.orders[order_id]
+            _set_status(order, status)
+
+            if status == "CHARGED" and self.random.random() < self.refund_rate:
+                self._add_refund(
+                    order, round(order["amount"] / 2, 2), f"refund-{order_id}"
+                )
+
+            return copy.deepcopy(order)
+
+    def refund(self, order_id, unique_request_id, amount):
+        # Returns the order with the refund added, or None when HDFC would
+        # reject it. A repeated unique_request_id returns the order unchanged.
+        with self.lock:
+            order = self.orders.get(order_id)
+            if not order or order["status"] != "CHARGED" or not unique_request_id:
+                return None
+            if not any(
+                refund["unique_request_id"] == unique_request_id
+                for refund in order["refunds"]
+            ):
+                amount = round(float(amount or 0), 2)
+                if amount <= 0 or amount > order["effective_amount"]:
+                    return None
+                self._add_refund(order, amount, unique_request_id)
+
+            return copy.deepcopy(order)
+
+    def _add_refund(self, order, amount, unique_request_id):
+        order["refunded"] = True
+        order["amount_refunded"] = round(order["amount_refunded"] + amount, 2)
+        order["effective_amount"] = order["amount"] - order["amount_refunded"]
+        order["refunds"].append(
+            {
+                "id": f"RF-{uuid.uuid4().hex[:12]}",
+                "amount": amount,
+                "unique_request_id": unique_request_id,
+                "ref": str(self.random.randint(10**11, 10**12 - 1)),
+                "created": _isoformat(datetime.now(timezone.utc)),
+                "status": "PENDING",
+                "error_message": "",
+                "sent_to_gateway": True,
+                "initiated_by": "API",
+                "refund_source": "HDFC",
+                "refund_type": "STANDARD",
+                "error_code": "",
+                "metadata": None,
+            }
+        )
+
+    def return_url_params(self, order_id, response_key):
+        # Query parameters HDFC appends to the return URL after payment
+        order = self.get_order(order_id)
+        params = {
+            "order_id": order_id,
+            "status": order["status"],
+            "status_id": str(order["status_id"]),
+        }
+        params["signature"] = sign_params(params, response_key)
+        params["signature_algorithm"] = "HMAC-SHA256"
+        return params
+
+    def webhook_body(self, order_id):
+        order = self.get_order(order_id)
+        return {
+            "id": f"evt_{uuid.uuid4().hex[:16]}",
+            "date_created": _isoformat(datetime.now(timezone.utc)),
+            "event_name": WEBHOOK_EVENTS.get(order["status"], "ORDER_UPDATED"),
+            "content": {"order": order},
+        }
+
+    def send_return_callback(self, return_url, order_id, response_key):
+        separator = "&" if "?" in return_url else "?"
+        url = (
+            return_url
+            + separator
+            + urlencode(self.return_url_params(order_id, response_key))
+        )
+        with urlopen(Request(url, method="GET"), timeout=30) as res:
+            return res.status
+
+    def send_webhook(self, webhook_url, order_id, headers=None):
+        req = Request(
+            webhook_url,
+            data=json.dumps(self.webhook_body(order_id)).encode("utf-8"),
+            headers={"Content-Type": "application/json", **(headers or {})},
+            method="POST",
+        )
+        with urlopen(req, timeout=30) as res:
+            return res.status
+
+    def simulate_network(self, endpoint):
+        with self.lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+            delay = self.latency_ms + self.random.uniform(
+                -self.latency_jitter_ms, self.latency_jitter_ms
+            )
+            fail = self.random.random() < self.error_rate
+
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+
+def sign_params(params, key):
+    # Same canonical form HDFC uses for return URL signatures
+    encoded_sorted = [
+        quote_plus(name) + "=" + quote_plus(params[name]) for name in sorted(params)
+    ]
+    encoded_string = quote_plus("&".join(encoded_sorted))
+    digest = hmac.new(
+        key.encode("utf-8"), encoded_string.encode("utf-8"), sha256
+    ).digest()
+    return base64.b64encode(digest).decode()
+
+
+def _set_status(order, status):
+    order["status"] = status
+    order["status_id"] = HDFC_STATUS_IDS[status]
+    if order.get("txn_detail"):
+        order["txn_detail"]["status"] = status
+
+
+def _isoformat(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _make_handler(gateway):
+    class MockSmartGatewayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            path = self.path.split("?")[0].rstrip("/")
+            if path.startswith("/orders/") and path.endswith("/refunds"):
+                return self._refund(path[len("/orders/") : -len("/refunds")])
+            if path != "/session":
+                return self._send_json(404, {"error_message": "Not Found"})
+            if not self._is_authorized():
+                return self._send_json(401, {"error_message": "Unauthorized"})
+            if gateway.simulate_network("session"):
+                return self._send_json(503, {"error_message": "Service Unavailable"})
+
+            session_req = json.loads(self._read_body() or b"{}")
+            self._send_json(200, gateway.create_session(session_req))
+
+        def _refund(self, order_id):
+            if not self._is_authorized():
+                return self._send_json(401, {"error_message": "Unauthorized"})
+            if gateway.simulate_network("refunds"):
+                return self._send_json(503, {"error_message": "Service Unavailable"})
+
+            refund_req = dict(parse_qsl(self._read_body().decode("utf-8")))
+            order = gateway.refund(
+                order_id, refund_req.get("unique_request_id"), refund_req.get("amount")
+            )
+            if not order:
+                return self._send_json(400, {"error_message": "Invalid refund request"})
+            self._send_json(200, order)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length)
+
+        def do_GET(self):
+            if not self.path.startswith("/orders/"):
+                return self._send_json(404, {"error_message": "Not Found"})
+            if not self._is_authorized():
+                return self._send_json(401, {"error_message": "Unauthorized"})
+            if gateway.simulate_network("orders"):
+                return self._send_json(503, {"error_message": "Service Unavailable"})
+
+            order = gateway.get_order(self.path[len("/orders/") :].split("?")[0])
+            if not order:
+                return self._send_json(404, {"error_message": "Order not found"})
+            self._send_json(200, order)
+
+        def _is_authorized(self):
+            return self.headers.get("Authorization", "").startswith(
+                "Basic "
+            ) and self.headers.get("x-merchantid")
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return MockSmartGatewayHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HDFC SmartGateway stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--refund-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockSmartGateway(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        refund_rate=args.refund_rate,
+    )
+    print(f"Mock HDFC SmartGateway listening on {mock.base_uri}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
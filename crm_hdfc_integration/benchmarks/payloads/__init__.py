@@ -0,0 +1,20 @@
+import json
+import os
+
+PAYLOADS_PATH = os.path.dirname(__file__)
+
+
+def load_order_status_payloads():
+    payloads = {}
+    for file_name in sorted(os.listdir(PAYLOADS_PATH)):
+        if file_name.startswith("order_status_") and file_name.endswith(".json"):
+            with open(os.path.join(PAYLOADS_PATH, file_name)) as f:
+                payloads[file_name[: -len(".json")]] = json.load(f)
+    return payloads
+
+
+def load_signature_vectors():
+    # Signatures computed with the original verify_hmac_signature, the
+    # canonical string they pin is the one HDFC return urls are signed with
+    with open(os.path.join(PAYLOADS_PATH, "signature_vectors.json")) as f:
+        return json.load(f)
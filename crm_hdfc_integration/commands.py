@@ -0,0 +1,26 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-hdfc-order-rollup")
+@click.option("--from-date", help="First date to rebuild, all dates when left out")
+@click.option("--to-date", help="Last date to rebuild, all dates when left out")
+@pass_context
+def rebuild_hdfc_order_rollup(context, from_date=None, to_date=None):
+    "Recompute the HDFC Order Status Rollup from HDFC Orders"
+    import frappe
+    from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order_status_rollup import (
+        hdfc_order_status_rollup,
+    )
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        buckets = hdfc_order_status_rollup.rebuild_rollup(from_date, to_date)
+        click.echo(f"Rebuilt {buckets} HDFC Order Status Rollup buckets on {site}")
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_hdfc_order_rollup]
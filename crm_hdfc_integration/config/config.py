@@ -4,3 +4,92 @@ HDFC_MODE_OF_PAYMENTS = [
     {"mode_of_payment": "UPI", "type": "Phone"},
     {"mode_of_payment": "Wallet", "type": "Phone"},
 ]
+
+# HTTP connection pool defaults, used when the settings leave them empty
+HDFC_HTTP_POOL_CONNECTIONS = 10
+HDFC_HTTP_POOL_MAXSIZE = 10
+HDFC_HTTP_CONNECT_TIMEOUT = 5
+HDFC_HTTP_READ_TIMEOUT = 30
+
+HDFC_WEBHOOK_BATCH_SIZE = 200
+HDFC_WEBHOOK_IP_RATE_LIMIT = 300  # calls per client IP per window
+HDFC_WEBHOOK_RATE_LIMIT_WINDOW = 60  # seconds
+
+# Bloom filter of known order ids, 2**24 bits (2MB) keep false positives
+# near 1% up to about 1.7 million orders
+HDFC_KNOWN_ORDERS_FILTER_BITS = 2**24
+HDFC_KNOWN_ORDERS_FILTER_HASHES = 7
+HDFC_KNOWN_ORDERS_REBUILD_PAGE_SIZE = 5000
+
+HDFC_RECONCILIATION_CONCURRENCY = 8
+HDFC_RECONCILIATION_COMMIT_SIZE = 50
+HDFC_RECONCILIATION_PAGE_SIZE = 500
+HDFC_RECONCILIATION_RATE_LIMIT = 20  # requests per second
+# Job timeout per order age bucket, in seconds. A run stops short of it and
+# the next run resumes after the last reconciled order.
+HDFC_RECONCILIATION_TIMEOUTS = {
+    "recent": 10 * 60,
+    "today": 60 * 60,
+    "week": 3 * 60 * 60,
+}
+
+HDFC_PAYMENT_ENTRY_QUEUE = "long"
+HDFC_PAYMENT_ENTRY_BATCH_SIZE = 20
+
+# Retry and circuit breaker defaults
+HDFC_HTTP_MAX_RETRIES = 2
+HDFC_HTTP_RETRY_BACKOFF = 0.5  # seconds
+HDFC_HTTP_RETRY_MAX_DELAY = 5  # seconds, also caps Retry-After
+HDFC_BREAKER_FAILURE_THRESHOLD = 5
+HDFC_BREAKER_RESET_TIMEOUT = 30  # seconds
+HDFC_BREAKER_FAILURE_WINDOW = 60  # seconds
+
+# Read timeouts per request class, capped by the settings read timeout. Calls
+# without a request class use the settings read timeout.
+HDFC_HTTP_READ_TIMEOUTS = {
+    "session": 20,
+    "order_status": 10,
+    "refund": 20,
+}
+
+# Outbound rate limits in requests per second, shared by all workers
+HDFC_TOTAL_RATE_LIMIT = 40
+HDFC_RATE_LIMITS = {
+    "session": 20,
+    "order_status": 30,
+    "refund": 10,
+}
+HDFC_BACKGROUND_RESERVE = 25  # percent of the total budget kept for payers
+HDFC_RATE_LIMIT_MAX_WAIT = 2  # seconds a payer facing request may queue
+HDFC_RATE_LIMIT_BACKGROUND_MAX_WAIT = 300  # seconds
+
+# Order status response cache, TTLs in seconds
+HDFC_STATUS_CACHE_TTL = 2
+# Terminal responses are not cached indefinitely: a settled order can still be
+# refunded, and the refund only shows in a fresh response. The default and any
+# Settled Order Cache TTL set in the settings are capped at a day.
+HDFC_TERMINAL_STATUS_CACHE_TTL = 3600
+HDFC_MAX_TERMINAL_STATUS_CACHE_TTL = 24 * 60 * 60
+HDFC_STATUS_FETCH_LOCK_TIMEOUT = 30
+
+# Seconds a wait_for_order_status request is held by default and at most.
+# Each waiting request occupies a web worker for that long.
+HDFC_ORDER_STATUS_WAIT_TIMEOUT = 10
+HDFC_MAX_ORDER_STATUS_WAIT_TIMEOUT = 25
+
+HDFC_BULK_ORDER_CHUNK_SIZE = 50
+HDFC_BULK_ORDER_CONCURRENCY = 8
+HDFC_BULK_ORDER_RESULT_TTL = 24 * 60 * 60  # seconds
+
+HDFC_EXPORT_PAGE_SIZE = 2000
+# Orders a direct CSV download may hold, larger exports run as a job
+HDFC_EXPORT_MAX_DIRECT_ROWS = 10000
+
+HDFC_SETTLEMENT_CHUNK_SIZE = 1000
+
+HDFC_REFUND_CHUNK_SIZE = 100
+HDFC_REFUND_CONCURRENCY = 8
+HDFC_REFUND_RESULT_TTL = 24 * 60 * 60  # seconds
+HDFC_REFUND_POLL_PAGE_SIZE = 500
+# Refunds HDFC has not acknowledged are resent after this many seconds
+HDFC_REFUND_RESEND_AFTER = 5 * 60
@@ -4,10 +4,29 @@
 import frappe
 from frappe.model.document import Document
 from crm_hdfc_integration import utils
-from crm_hdfc_integration.hdfc_smartgateway.integration import service
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order_status_rollup import (
+    hdfc_order_status_rollup,
+)
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    known_orders,
+    metrics,
+    service,
+)
+from crm_hdfc_integration.hdfc_smartgateway.integration import utils as integration_utils
 from erpnext import get_default_company
 from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
 
+INVOICE_FIELDS = [
+    "name",
+    "docstatus",
+    "status",
+    "customer",
+    "currency",
+    "grand_total",
+    "company",
+]
+
 
 class HDFCOrder(Document):
 
@@ -21,10 +40,24 @@ class HDFCOrder(Document):
             if not (self.get("reference_type") or self.get("reference_doc")):
                 frappe.throw("Reference Type and Doc are required.")
 
+    @metrics.timed("order_before_submit")
     def before_submit(self):
         if self.order_status != "Success":
             frappe.throw("Order status should be Success to submit the order.")
 
+        settings = integration_utils.get_cached_settings()
+        if settings.payment_entry_creation == "Deferred":
+            self.set("payment_entry_status", "Queued")
+            return
+
+        self.make_payment_entry()
+        self.set("payment_entry_status", "Created")
+
+    def on_submit(self):
+        if self.payment_entry_status == "Queued":
+            enqueue_payment_entries(self.company)
+
+    def make_payment_entry(self):
         pe = self.create_order_pe(ignore_permissions=True)
         pe.run_method("before_submit")
         pe = pe.save(ignore_permissions=True)
@@ -39,6 +72,8 @@ class HDFCOrder(Document):
             reference_doc.set(reference_pe_fieldname, pe.name)
             reference_doc.save(ignore_permissions=True)
 
+        return pe
+
     def before_insert(self):
         reference_fieldname = self.get("reference_fieldname")
         if reference_fieldname:
@@ -48,6 +83,16 @@ class HDFCOrder(Document):
             reference_doc.set(reference_fieldname, self.name)
             reference_doc.save(ignore_permissions=True)
 
+    def after_insert(self):
+        known_orders.add_order(self.name)
+
+    def on_change(self):
+        # Runs once for every insert, save, submit and cancel
+        hdfc_order_status_rollup.update_order_rollup(self.get_doc_before_save(), self)
+
+    def on_trash(self):
+        hdfc_order_status_rollup.update_order_rollup(self, None)
+
     def create_order_pe(self, ignore_permissions=False):
         pe = get_payment_entry(
             self.doctype,
@@ -71,7 +116,8 @@ class HDFCOrder(Document):
         for invoice in self.get("reference_invoices") or []:
             invoice_type = invoice.get("invoice_type")
             invoice_name = invoice.get("invoice")
-            invoice_amount = frappe.db.get_value(
+            # Rows of older orders do not carry the amount
+            invoice_amount = invoice.get("amount") or frappe.db.get_value(
                 invoice_type, invoice_name, "grand_total"
             )
             pe.append(
@@ -86,6 +132,85 @@ class HDFCOrder(Document):
         return pe
 
 
+def enqueue_payment_entries(company):
+    settings = integration_utils.get_cached_settings()
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order.hdfc_order.create_queued_payment_entries",
+        queue=settings.payment_entry_queue or config.HDFC_PAYMENT_ENTRY_QUEUE,
+        job_id=f"hdfc_order_payment_entries::{company}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        company=company,
+    )
+
+
+def enqueue_all_payment_entries():
+    # Picks up orders whose job was lost, e.g. on a worker restart
+    for company in frappe.get_all(
+        "HDFC Order",
+        filters={"docstatus": 1, "payment_entry_status": "Queued"},
+        pluck="company",
+        distinct=True,
+    ):
+        enqueue_payment_entries(company)
+
+
+def create_queued_payment_entries(company):
+    while True:
+        order_names = frappe.get_all(
+            "HDFC Order",
+            filters={
+                "docstatus": 1,
+                "payment_entry_status": "Queued",
+                "company": company,
+            },
+            pluck="name",
+            order_by="creation asc",
+            limit=config.HDFC_PAYMENT_ENTRY_BATCH_SIZE,
+        )
+        if not order_names:
+            break
+
+        for order_name in order_names:
+            _create_queued_payment_entry(order_name)
+
+        frappe.db.commit()
+
+
+def _create_queued_payment_entry(order_name):
+    frappe.db.savepoint("hdfc_order_payment_entry")
+    try:
+        # Row lock keeps concurrent jobs from creating a second entry
+        order = frappe.db.get_value(
+            "HDFC Order",
+            order_name,
+            ["payment_entry", "payment_entry_status"],
+            as_dict=True,
+            for_update=True,
+        )
+        if order.payment_entry_status != "Queued":
+            return
+
+        payment_entry = order.payment_entry
+        if not payment_entry:
+            order_doc = frappe.get_doc("HDFC Order", order_name)
+            payment_entry = order_doc.make_payment_entry().name
+
+        frappe.db.set_value(
+            "HDFC Order",
+            order_name,
+            {"payment_entry": payment_entry, "payment_entry_status": "Created"},
+        )
+    except Exception:
+        frappe.db.rollback(save_point="hdfc_order_payment_entry")
+        frappe.db.set_value("HDFC Order", order_name, "payment_entry_status", "Failed")
+        frappe.log_error(
+            "HDFC Order Payment Entry creation failed",
+            reference_doctype="HDFC Order",
+            reference_name=order_name,
+        )
+
+
 @frappe.whitelist()
 def create_order(
     order_currency="INR",
@@ -101,6 +226,58 @@ def create_order(
     failed_url=None,
     user_defined_parameters=None,
 ):
+    order_doc, session_args = build_order(
+        order_currency=order_currency,
+        order_amount=order_amount,
+        customer_details=customer_details,
+        invoices=invoices,
+        description=description,
+        reference_doctype=reference_doctype,
+        reference_name=reference_name,
+        reference_fieldname=reference_fieldname,
+        reference_pe_fieldname=reference_pe_fieldname,
+        success_url=success_url,
+        failed_url=failed_url,
+        user_defined_parameters=user_defined_parameters,
+    )
+
+    if not order_doc.has_permission("create"):
+        frappe.throw("User don't have permissions for HDFC Order.")
+
+    hdfc_order = service.create_order_session(**session_args)
+    apply_order_session(order_doc, hdfc_order)
+
+    # Restored on the HDFC return URL, where the payer's cookies are lost
+    if frappe.session.user != "Guest" and frappe.session.sid not in (None, "Guest"):
+        order_doc.payer_sid = frappe.session.sid
+
+    order_doc.insert()
+    frappe.db.commit()
+
+    if hdfc_order.get("order_status") == "New":
+        return {
+            "order_id": hdfc_order.get("order_id"),
+            "payment_link": hdfc_order.get("payment_link"),
+        }
+    return {"order_id": hdfc_order.get("order_id")}
+
+
+def build_order(
+    order_currency="INR",
+    order_amount=0,
+    customer_details={},
+    invoices=None,
+    description=None,
+    reference_doctype=None,
+    reference_name=None,
+    reference_fieldname=None,
+    reference_pe_fieldname=None,
+    success_url=None,
+    failed_url=None,
+    user_defined_parameters=None,
+    invoice_values=None,
+):
+    # Unsaved HDFC Order and the arguments of its HDFC session request
     customer_details = utils.ensure_parsed(customer_details)
     invoices = utils.ensure_parsed(invoices)
 
@@ -109,7 +286,9 @@ def create_order(
     company = None
 
     if invoices:
-        parsed = parse_reference_invoices(invoices, order_currency, customer_id)
+        parsed = parse_reference_invoices(
+            invoices, order_currency, customer_id, invoice_values=invoice_values
+        )
         order_amount = parsed["amount"]
         order_currency = parsed["currency"]
         invoices = parsed["invoices"]
@@ -150,18 +329,19 @@ def create_order(
         }
     )
 
-    if not order_doc.has_permission("create"):
-        frappe.throw("User don't have permissions for HDFC Order.")
+    session_args = {
+        "amount": order_amount,
+        "customer_details": customer_details,
+        "order_id": order_id,
+        "currency": order_currency,
+        "description": description,
+        "user_defined_parameters": user_defined_parameters,
+    }
+
+    return order_doc, session_args
 
-    hdfc_order = service.create_order_session(
-        amount=order_amount,
-        customer_details=customer_details,
-        order_id=order_id,
-        currency=order_currency,
-        description=description,
-        user_defined_parameters=user_defined_parameters,
-    )
 
+def apply_order_session(order_doc, hdfc_order):
     order_doc.update(
         {
             "order_status": hdfc_order.get("order_status"),
@@ -171,30 +351,29 @@ def create_order(
         }
     )
 
-    order_doc.insert()
-    frappe.db.commit()
-
-    if hdfc_order.get("order_status") == "New":
-        return {
-            "order_id": hdfc_order.get("order_id"),
-            "payment_link": hdfc_order.get("payment_link"),
-        }
-    return {"order_id": hdfc_order.get("order_id")}
-
 
 def parse_reference_invoices(
     reference_invoices: list[dict],
     currency: str,
     customer_id: str | None = None,
+    invoice_values: dict | None = None,
 ):
     amount = 0
     company = None
     parsed_invoices = []
 
+    if invoice_values is None:
+        invoice_values = get_invoice_values(reference_invoices)
+
     for invoice in reference_invoices:
         invoice_type = invoice.get("invoice_type", "")
         invoice_id = invoice.get("invoice_id", "")
-        invoice_doc = frappe.get_doc(invoice_type, invoice_id)
+        invoice_doc = invoice_values.get((invoice_type, invoice_id))
+        if not invoice_doc:
+            frappe.throw(
+                f"Invoice {invoice_type}:{invoice_id} not found.",
+                frappe.DoesNotExistError,
+            )
         if invoice_doc.docstatus != 1:
             frappe.throw(f"Invoice {invoice_type}:{invoice_id} is not submitted.")
         if invoice_doc.status == "Paid":
@@ -220,7 +399,13 @@ def parse_reference_invoices(
         if company != invoice_company:
             frappe.throw("Company doesn't matches across invoices.")
 
-        parsed_invoices.append({"invoice_type": invoice_type, "invoice": invoice_id})
+        parsed_invoices.append(
+            {
+                "invoice_type": invoice_type,
+                "invoice": invoice_id,
+                "amount": invoice_amount,
+            }
+        )
 
     return {
         "currency": currency,
@@ -229,3 +414,32 @@ def parse_reference_invoices(
         "invoices": parsed_invoices,
         "company": company,
     }
+
+
+def get_invoice_values(reference_invoices: list[dict]):
+    # One query per invoice doctype instead of loading every invoice document
+    invoice_names = {}
+    for invoice in reference_invoices:
+        invoice_names.setdefault(invoice.get("invoice_type", ""), set()).add(
+            invoice.get("invoice_id", "")
+        )
+
+    invoice_values = {}
+    for invoice_type, names in invoice_names.items():
+        if not invoice_type:
+            continue
+
+        # Missing fields (e.g. customer on Purchase Invoice) fail validation later
+        meta = frappe.get_meta(invoice_type)
+        fields = [
+            field
+            for field in INVOICE_FIELDS
+            if field in ("name", "docstatus") or meta.has_field(field)
+        ]
+
+        for invoice in frappe.get_all(
+            invoice_type, filters={"name": ["in", list(names)]}, fields=fields
+        ):
+            invoice_values[(invoice_type, invoice.name)] = invoice
+
+    return invoice_values
@@ -1,9 +1,191 @@
 # Copyright (c) 2025, OneHash and contributors
 # For license information, please see license.txt
 
-# import frappe
+import zlib
+from base64 import b64decode, b64encode
+
+import frappe
 from frappe.model.document import Document
+from frappe.utils import add_days, now_datetime
+
+# A Diff log is rewritten as a full snapshot once this many diffs chain up
+DIFF_SNAPSHOT_INTERVAL = 20
+# Latest logged response per order, the base of the next diff
+DIFF_BASE_CACHE_KEY = "hdfc_order_status_log_base"
+DIFF_BASE_CACHE_TTL = 24 * 60 * 60
 
 
 class HDFCOrderStatusLogs(Document):
-	pass
+
+    @staticmethod
+    def clear_old_logs(days=90):
+        cutoff = add_days(now_datetime(), -days)
+
+        # The oldest log kept for an order must not depend on deleted ones
+        for log_name, order in _get_diff_logs_after_cutoff(cutoff):
+            history = _rebuild_responses(_get_order_logs(order))
+            response = next(
+                entry["response"] for entry in history if entry["name"] == log_name
+            )
+            frappe.db.set_value(
+                "HDFC Order Status Logs",
+                log_name,
+                {
+                    "storage_format": "Compressed",
+                    "compressed_response": _compress(response),
+                },
+                update_modified=False,
+            )
+
+        table = frappe.qb.DocType("HDFC Order Status Logs")
+        frappe.db.delete(table, filters=(table.creation < cutoff))
+
+
+def on_doctype_update():
+    frappe.db.add_index("HDFC Order Status Logs", ["order", "creation"])
+
+
+def log_order_status(order_id, status_res, storage_format="Full"):
+    # Callers only log responses whose status fingerprint changed
+    log = {"doctype": "HDFC Order Status Logs", "order": order_id}
+    chain = 0
+
+    if storage_format == "Diff":
+        # Diffed against the cached previous response, trusted only while it
+        # is still the order's latest log. Otherwise a snapshot is written.
+        base = _get_diff_base(order_id)
+        if base and base["chain"] < DIFF_SNAPSHOT_INTERVAL:
+            log["compressed_response"] = _compress(_diff(base["response"], status_res))
+            chain = base["chain"] + 1
+        else:
+            storage_format = "Compressed"
+
+    if storage_format == "Compressed":
+        log["compressed_response"] = _compress(status_res)
+    elif storage_format == "Full":
+        log["response"] = status_res
+
+    log["storage_format"] = storage_format
+    log_doc = frappe.get_doc(log).insert(ignore_permissions=True)
+
+    if storage_format != "Full":
+        frappe.cache().set_value(
+            f"{DIFF_BASE_CACHE_KEY}::{order_id}",
+            {"log": log_doc.name, "chain": chain, "response": status_res},
+            expires_in_sec=DIFF_BASE_CACHE_TTL,
+        )
+    return log_doc
+
+
+@frappe.whitelist()
+def get_order_status_history(order):
+    frappe.has_permission("HDFC Order Status Logs", throw=True)
+
+    return _rebuild_responses(_get_order_logs(order))
+
+
+def _get_diff_base(order_id):
+    base = frappe.cache().get_value(
+        f"{DIFF_BASE_CACHE_KEY}::{order_id}", expires=True
+    )
+    if not base:
+        return None
+
+    latest_log = frappe.get_all(
+        "HDFC Order Status Logs",
+        filters={"order": order_id},
+        pluck="name",
+        order_by="creation desc, name desc",
+        limit=1,
+    )
+    if not latest_log or latest_log[0] != base["log"]:
+        return None
+    return base
+
+
+def _get_order_logs(order):
+    # Every log of the order, in creation order
+    return frappe.get_all(
+        "HDFC Order Status Logs",
+        filters={"order": order},
+        fields=[
+            "name",
+            "creation",
+            "storage_format",
+            "response",
+            "compressed_response",
+        ],
+        order_by="creation asc, name asc",
+    )
+
+
+def _rebuild_responses(logs):
+    history = []
+    response = None
+
+    for log in logs:
+        if log.storage_format == "Diff":
+            if response is None:
+                # The base snapshot of this diff was removed, skip to the next one
+                continue
+            response = _apply_diff(response, _decompress(log.compressed_response))
+        elif log.storage_format == "Compressed":
+            response = _decompress(log.compressed_response)
+        else:
+            response = frappe.parse_json(log.response)
+
+        history.append(
+            {"name": log.name, "creation": log.creation, "response": response}
+        )
+
+    return history
+
+
+def _get_diff_logs_after_cutoff(cutoff):
+    return frappe.db.sql(
+        """
+        select log.name, log.`order`
+        from `tabHDFC Order Status Logs` log
+        where log.creation >= %(cutoff)s
+            and log.storage_format = 'Diff'
+            and exists (
+                select 1 from `tabHDFC Order Status Logs` old
+                where old.`order` = log.`order` and old.creation < %(cutoff)s
+            )
+            and not exists (
+                select 1 from `tabHDFC Order Status Logs` kept
+                where kept.`order` = log.`order`
+                    and kept.creation >= %(cutoff)s
+                    and kept.creation < log.creation
+            )
+        """,
+        {"cutoff": cutoff},
+    )
+
+
+def _diff(previous, current):
+    return {
+        "set": {
+            key: value
+            for key, value in current.items()
+            if key not in previous or previous[key] != value
+        },
+        "unset": [key for key in previous if key not in current],
+    }
+
+
+def _apply_diff(previous, diff):
+    response = {
+        key: value for key, value in previous.items() if key not in diff["unset"]
+    }
+    response.update(diff["set"])
+    return response
+
+
+def _compress(value):
+    compressed = zlib.compress(frappe.as_json(value, indent=None).encode("utf-8"))
+    return b64encode(compressed).decode("utf-8")
+
+
+def _decompress(value):
+    return frappe.parse_json(zlib.decompress(b64decode(value)).decode("utf-8"))
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, OneHash and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("HDFC Order Status Rollup", {
+// 	refresh(frm) {
+
+// 	},
+// });
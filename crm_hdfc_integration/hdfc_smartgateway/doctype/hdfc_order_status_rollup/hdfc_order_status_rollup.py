@@ -0,0 +1,207 @@
+# Copyright (c) 2026, OneHash and contributors
+# For license information, please see license.txt
+
+from hashlib import sha1
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder.functions import Coalesce, Count, Date, Sum
+from frappe.utils import flt, getdate, now_datetime
+
+# An order is counted in the bucket of its date, company, status, payment
+# method and gateway. Rows are named from the bucket, so every delta is a
+# single upsert and no lookup is needed.
+ROLLUP_DIMENSIONS = ("date", "company", "order_status", "mode_of_payment", "gateway")
+ROLLUP_MEASURES = ("order_count", "amount", "amount_refunded")
+ROLLUP_FIELDS = ("name", "creation", "modified", "owner", "modified_by")
+
+UPSERT_ROLLUP_QUERY = {
+    "mariadb": """
+        insert into `tabHDFC Order Status Rollup`
+            (name, creation, modified, owner, modified_by, date, company,
+            order_status, mode_of_payment, gateway, order_count, amount,
+            amount_refunded)
+        values
+            (%(name)s, %(now)s, %(now)s, 'Administrator', 'Administrator',
+            %(date)s, %(company)s, %(order_status)s, %(mode_of_payment)s,
+            %(gateway)s, %(order_count)s, %(amount)s, %(amount_refunded)s)
+        on duplicate key update
+            order_count = order_count + values(order_count),
+            amount = amount + values(amount),
+            amount_refunded = amount_refunded + values(amount_refunded),
+            modified = values(modified)
+    """,
+    "postgres": """
+        insert into "tabHDFC Order Status Rollup"
+            (name, creation, modified, owner, modified_by, date, company,
+            order_status, mode_of_payment, gateway, order_count, amount,
+            amount_refunded)
+        values
+            (%(name)s, %(now)s, %(now)s, 'Administrator', 'Administrator',
+            %(date)s, %(company)s, %(order_status)s, %(mode_of_payment)s,
+            %(gateway)s, %(order_count)s, %(amount)s, %(amount_refunded)s)
+        on conflict (name) do update set
+            order_count = "tabHDFC Order Status Rollup".order_count
+                + excluded.order_count,
+            amount = "tabHDFC Order Status Rollup".amount + excluded.amount,
+            amount_refunded = "tabHDFC Order Status Rollup".amount_refunded
+                + excluded.amount_refunded,
+            modified = excluded.modified
+    """,
+}
+
+
+class HDFCOrderStatusRollup(Document):
+    pass
+
+
+def update_order_rollup(old_order, new_order):
+    # Moves an order between buckets: the old values are taken out and the
+    # new ones added, buckets whose delta cancels out are not written
+    deltas = {}
+    for order, sign in ((old_order, -1), (new_order, 1)):
+        if not order:
+            continue
+        delta = deltas.setdefault(get_order_bucket(order), [0, 0.0, 0.0])
+        delta[0] += sign
+        delta[1] += sign * flt(order.get("amount"))
+        delta[2] += sign * flt(order.get("amount_refunded"))
+
+    for bucket, delta in deltas.items():
+        if any(delta):
+            add_to_rollup(bucket, *delta)
+
+
+def add_to_rollup(bucket, order_count=0, amount=0, amount_refunded=0):
+    frappe.db.multisql(
+        UPSERT_ROLLUP_QUERY,
+        {
+            "name": get_rollup_name(bucket),
+            "now": now_datetime(),
+            **dict(zip(ROLLUP_DIMENSIONS, bucket)),
+            "order_count": order_count,
+            "amount": amount,
+            "amount_refunded": amount_refunded,
+        },
+    )
+
+
+def get_order_bucket(order):
+    # Orders without a posting date are counted on the day they were created
+    return (
+        getdate(order.get("posting_date") or order.get("creation")),
+        order.get("company") or None,
+        order.get("order_status") or None,
+        order.get("mode_of_payment") or None,
+        order.get("gateway") or None,
+    )
+
+
+def get_rollup_name(bucket):
+    key = "\x1f".join(str(value or "") for value in bucket)
+    return sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+@frappe.whitelist()
+def get_order_dashboard(from_date=None, to_date=None, company=None, group_by=None):
+    # Served from the rollup, so the cost follows the number of buckets in
+    # the range and not the number of orders
+    frappe.has_permission("HDFC Order", "read", throw=True)
+
+    group_by = frappe.parse_json(group_by) if group_by else ["order_status"]
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    for dimension in group_by:
+        if dimension not in ROLLUP_DIMENSIONS:
+            frappe.throw(f"Cannot group HDFC Orders by {dimension}.")
+
+    rollup = frappe.qb.DocType("HDFC Order Status Rollup")
+    query = (
+        frappe.qb.from_(rollup)
+        .select(
+            *(rollup[dimension] for dimension in group_by),
+            *(Sum(rollup[measure]).as_(measure) for measure in ROLLUP_MEASURES),
+        )
+        .where(rollup.order_count != 0)
+    )
+    if from_date:
+        query = query.where(rollup.date >= getdate(from_date))
+    if to_date:
+        query = query.where(rollup.date <= getdate(to_date))
+    if company:
+        query = query.where(rollup.company == company)
+    for dimension in group_by:
+        query = query.groupby(rollup[dimension]).orderby(rollup[dimension])
+
+    buckets = query.run(as_dict=True)
+    totals = {
+        measure: sum(flt(bucket[measure]) for bucket in buckets)
+        for measure in ROLLUP_MEASURES
+    }
+    totals["order_count"] = int(totals["order_count"])
+
+    return {"buckets": buckets, "totals": totals}
+
+
+def rebuild_rollup(from_date=None, to_date=None):
+    # Recomputes the buckets of the range from HDFC Orders. Deltas written
+    # while it runs may be lost, so run it when orders are not changing.
+    order = frappe.qb.DocType("HDFC Order")
+    order_date = Coalesce(order.posting_date, Date(order.creation))
+
+    query = frappe.qb.from_(order).select(
+        order_date.as_("date"),
+        order.company,
+        order.order_status,
+        order.mode_of_payment,
+        order.gateway,
+        Count("*").as_("order_count"),
+        Sum(order.amount).as_("amount"),
+        Sum(order.amount_refunded).as_("amount_refunded"),
+    )
+    rollup = frappe.qb.DocType("HDFC Order Status Rollup")
+    rollup_filters = rollup.name.isnotnull()
+    if from_date:
+        query = query.where(order_date >= getdate(from_date))
+        rollup_filters &= rollup.date >= getdate(from_date)
+    if to_date:
+        query = query.where(order_date <= getdate(to_date))
+        rollup_filters &= rollup.date <= getdate(to_date)
+    query = query.groupby(
+        order_date,
+        order.company,
+        order.order_status,
+        order.mode_of_payment,
+        order.gateway,
+    )
+
+    rows = []
+    now = now_datetime()
+    for bucket_values in query.run(as_dict=True):
+        bucket = (
+            getdate(bucket_values.date),
+            *(bucket_values[dimension] or None for dimension in ROLLUP_DIMENSIONS[1:]),
+        )
+        rows.append(
+            (
+                get_rollup_name(bucket),
+                now,
+                now,
+                "Administrator",
+                "Administrator",
+                *bucket,
+                bucket_values.order_count,
+                flt(bucket_values.amount),
+                flt(bucket_values.amount_refunded),
+            )
+        )
+
+    frappe.db.delete(rollup, filters=rollup_filters)
+    frappe.db.bulk_insert(
+        "HDFC Order Status Rollup",
+        (*ROLLUP_FIELDS, *ROLLUP_DIMENSIONS, *ROLLUP_MEASURES),
+        rows,
+    )
+    frappe.db.commit()
+
+    return len(rows)
@@ -0,0 +1,55 @@
+# Copyright (c) 2026, OneHash and Contributors
+# See license.txt
+
+from datetime import date, datetime
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order_status_rollup import (
+	hdfc_order_status_rollup,
+)
+
+
+class TestHDFCOrderStatusRollup(FrappeTestCase):
+	def test_order_bucket(self):
+		order = frappe._dict(
+			posting_date="2026-03-01",
+			creation=datetime(2026, 2, 28, 23, 59),
+			company="Test Company",
+			order_status="Success",
+			mode_of_payment="",
+			gateway=None,
+		)
+		self.assertEqual(
+			hdfc_order_status_rollup.get_order_bucket(order),
+			(date(2026, 3, 1), "Test Company", "Success", None, None),
+		)
+
+		# Orders without a posting date fall back to the day they were created
+		order.posting_date = None
+		self.assertEqual(hdfc_order_status_rollup.get_order_bucket(order)[0], date(2026, 2, 28))
+
+	def test_rollup_name_is_stable(self):
+		# Names are primary keys of stored rows, a change would split every
+		# bucket in two
+		bucket = (date(2026, 3, 1), "Test Company", "Success", "UPI", "HDFC")
+		self.assertEqual(hdfc_order_status_rollup.get_rollup_name(bucket), "dcedf6eb231325049940")
+
+	def test_rollup_name_separates_dimensions(self):
+		names = {
+			hdfc_order_status_rollup.get_rollup_name(bucket)
+			for bucket in (
+				(date(2026, 3, 1), "Test Company", "Success", None, None),
+				(date(2026, 3, 1), "Test Company", None, "Success", None),
+				(date(2026, 3, 1), "Test CompanySuccess", None, None, None),
+				(date(2026, 3, 2), "Test Company", "Success", None, None),
+			)
+		}
+		self.assertEqual(len(names), 4)
+		self.assertEqual(
+			hdfc_order_status_rollup.get_rollup_name((date(2026, 3, 1), None, None, None, None)),
+			hdfc_order_status_rollup.get_rollup_name((date(2026, 3, 1), "", "", "", "")),
+		)
+		for name in names:
+			self.assertEqual(len(name), 20)
@@ -1,8 +1,26 @@
 # Copyright (c) 2025, OneHash and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
+from crm_hdfc_integration.hdfc_smartgateway.integration import client, utils
+
+CONNECTION_FIELDS = (
+    "api_base_uri",
+    "pool_connections",
+    "pool_maxsize",
+    "connect_timeout",
+    "read_timeout",
+    "max_retries",
+    "retry_backoff",
+    "breaker_failure_threshold",
+    "breaker_reset_timeout",
+    "total_rate_limit",
+    "background_reserve",
+    "session_rate_limit",
+    "status_rate_limit",
+    "refund_rate_limit",
+)
 
 
 class HDFCSmartGatewaySettings(Document):
@@ -10,3 +28,10 @@ class HDFCSmartGatewaySettings(Document):
     def before_save(self):
         if self.api_base_uri and self.api_base_uri.endswith("/"):
             self.set("api_base_uri", self.api_base_uri[:-1])
+
+    def on_update(self):
+        # After commit, so no worker caches the old row under the new version
+        frappe.db.after_commit.add(utils.clear_settings_cache)
+
+        if any(self.has_value_changed(field) for field in CONNECTION_FIELDS):
+            frappe.db.after_commit.add(client.reset_session)
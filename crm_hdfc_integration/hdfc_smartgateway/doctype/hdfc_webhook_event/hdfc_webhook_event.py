@@ -0,0 +1,21 @@
+# Copyright (c) 2026, OneHash and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+
+
+class HDFCWebhookEvent(Document):
+
+    @staticmethod
+    def clear_old_logs(days=30):
+        table = frappe.qb.DocType("HDFC Webhook Event")
+        frappe.db.delete(
+            table,
+            filters=(
+                (table.modified < (Now() - Interval(days=days)))
+                & (table.status != "Queued")
+            ),
+        )
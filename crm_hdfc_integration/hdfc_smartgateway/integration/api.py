@@ -1,8 +1,13 @@
-from crm_hdfc_integration.hdfc_smartgateway.integration import client
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    client,
+    metrics,
+    status_cache,
+)
 
 CHECKOUT_INTERFACE_ACTION = "paymentPage"
 
 
+@metrics.timed("create_order_session")
 def create_order_session(
     order_id,
     amount,
@@ -12,6 +17,35 @@ def create_order_session(
     currency=None,
     description=None,
     user_defined_parameters=None,
+):
+    json_data = get_order_session_request(
+        order_id,
+        amount,
+        customer_details,
+        return_url,
+        page_client_id,
+        currency=currency,
+        description=description,
+        user_defined_parameters=user_defined_parameters,
+    )
+
+    return client.make_post_request(
+        "/session",
+        customer_id=json_data["customer_id"],
+        json=json_data,
+        request_class="session",
+    )
+
+
+def get_order_session_request(
+    order_id,
+    amount,
+    customer_details,
+    return_url,
+    page_client_id,
+    currency=None,
+    description=None,
+    user_defined_parameters=None,
 ):
     action = CHECKOUT_INTERFACE_ACTION
     customer_id = customer_details.get("customer_id") or ""
@@ -31,10 +65,32 @@ def create_order_session(
     }
 
     # Remove None values
-    json_data = {k: v for k, v in json_data.items() if v is not None}
+    return {k: v for k, v in json_data.items() if v is not None}
+
+
+@metrics.timed("get_order_status")
+def get_order_status(order_id, customer_id, use_cache=True):
+    def fetch():
+        return client.make_get_request(
+            f"/orders/{order_id}", customer_id=customer_id, request_class="order_status"
+        )
+
+    if not use_cache:
+        return fetch()
+    return status_cache.get_order_status(order_id, fetch)
+
 
-    return client.make_post_request("/session", customer_id=customer_id, json=json_data)
+@metrics.timed("create_refund")
+def create_refund(order_id, customer_id, unique_request_id, amount):
+    # HDFC treats a repeated unique_request_id as the same refund
+    return client.make_post_request(
+        f"/orders/{order_id}/refunds",
+        customer_id=customer_id,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        data=get_refund_request(unique_request_id, amount),
+        request_class="refund",
+    )
 
 
-def get_order_status(order_id, customer_id):
-    return client.make_get_request(f"/orders/{order_id}", customer_id=customer_id)
+def get_refund_request(unique_request_id, amount):
+    return {"unique_request_id": unique_request_id, "amount": amount}
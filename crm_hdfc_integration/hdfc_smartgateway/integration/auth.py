@@ -1,14 +1,51 @@
+from crm_hdfc_integration.config import config
 from crm_hdfc_integration.hdfc_smartgateway.integration import utils
 
 
 def get_auth_details():
-    smartgateway_settings = utils.get_smartgateway_settings()
+    settings = utils.get_cached_settings()
     return {
-        "merchant_id": smartgateway_settings.merchant_id,
-        "api_key": smartgateway_settings.get_password("api_key"),
+        "merchant_id": settings.merchant_id,
+        "api_key": settings.api_key,
+        "authorization": settings.authorization,
     }
 
 
 def get_base_uri():
-    smartgateway_settings = utils.get_smartgateway_settings()
-    return smartgateway_settings.api_base_uri
+    return utils.get_cached_settings().api_base_uri
+
+
+def get_response_key():
+    return utils.get_cached_settings().response_key
+
+
+def get_connection_settings():
+    settings = utils.get_cached_settings()
+    return {
+        "pool_connections": settings.pool_connections
+        or config.HDFC_HTTP_POOL_CONNECTIONS,
+        "pool_maxsize": settings.pool_maxsize or config.HDFC_HTTP_POOL_MAXSIZE,
+        "timeout": (
+            settings.connect_timeout or config.HDFC_HTTP_CONNECT_TIMEOUT,
+            settings.read_timeout or config.HDFC_HTTP_READ_TIMEOUT,
+        ),
+        "max_retries": config.HDFC_HTTP_MAX_RETRIES
+        if settings.max_retries is None
+        else settings.max_retries,
+        "retry_backoff": settings.retry_backoff or config.HDFC_HTTP_RETRY_BACKOFF,
+        "breaker_failure_threshold": settings.breaker_failure_threshold
+        or config.HDFC_BREAKER_FAILURE_THRESHOLD,
+        "breaker_reset_timeout": settings.breaker_reset_timeout
+        or config.HDFC_BREAKER_RESET_TIMEOUT,
+        "total_rate_limit": settings.total_rate_limit or config.HDFC_TOTAL_RATE_LIMIT,
+        "background_reserve": config.HDFC_BACKGROUND_RESERVE
+        if settings.background_reserve is None
+        else settings.background_reserve,
+        "rate_limits": {
+            "session": settings.session_rate_limit
+            or config.HDFC_RATE_LIMITS["session"],
+            "order_status": settings.status_rate_limit
+            or config.HDFC_RATE_LIMITS["order_status"],
+            "refund": settings.refund_rate_limit or config.HDFC_RATE_LIMITS["refund"],
+        },
+    }
@@ -0,0 +1,228 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import frappe
+from frappe.utils import create_batch
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order import hdfc_order
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    client,
+    rate_limit,
+    service,
+    transformers,
+    utils,
+)
+
+BULK_ORDER_RESULTS_KEY = "hdfc_smartgateway_bulk_orders"
+BULK_ORDER_SAVEPOINT = "hdfc_bulk_order"
+HDFC_BULK_ORDERS_PROGRESS = "HDFC_BULK_ORDERS_PROGRESS"
+
+# Keys of an order row, the same arguments create_order takes
+BULK_ORDER_FIELDS = (
+    "order_currency",
+    "order_amount",
+    "customer_details",
+    "invoices",
+    "description",
+    "reference_doctype",
+    "reference_name",
+    "reference_fieldname",
+    "reference_pe_fieldname",
+    "success_url",
+    "failed_url",
+    "user_defined_parameters",
+)
+
+
+@frappe.whitelist()
+def create_orders_bulk(orders):
+    orders = frappe.parse_json(orders)
+    if not orders:
+        frappe.throw("Orders are required.")
+
+    frappe.has_permission("HDFC Order", "create", throw=True)
+    utils.get_cached_settings()
+
+    bulk_id = frappe.generate_hash(length=12)
+    _set_results(
+        bulk_id,
+        {
+            "status": "Queued",
+            "user": frappe.session.user,
+            "total": len(orders),
+            "processed": 0,
+            "results": [],
+        },
+    )
+
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.bulk_orders.create_orders",
+        queue="long",
+        timeout=60 * 60,
+        job_id=f"hdfc_smartgateway_bulk_orders::{bulk_id}",
+        bulk_id=bulk_id,
+        orders=orders,
+    )
+
+    return {"bulk_id": bulk_id}
+
+
+@frappe.whitelist()
+def get_bulk_order_results(bulk_id):
+    frappe.has_permission("HDFC Order", "create", throw=True)
+
+    bulk_results = frappe.cache().get_value(
+        f"{BULK_ORDER_RESULTS_KEY}::{bulk_id}", expires=True
+    )
+    # Results hold customers, amounts and payment links, so they are only
+    # shown to whoever queued them
+    if bulk_results and bulk_results.get("user") != frappe.session.user:
+        frappe.only_for("System Manager")
+
+    return bulk_results
+
+
+def create_orders(bulk_id, orders):
+    # A failing row is reported in its result and never aborts the batch
+    results = [None] * len(orders)
+    summary = {
+        "status": "Running",
+        "user": frappe.session.user,
+        "total": len(orders),
+        "processed": 0,
+    }
+
+    try:
+        invoice_values = _get_invoice_values(orders, results)
+
+        prepared_orders = []
+        for idx, order in enumerate(orders):
+            if results[idx]:
+                # Failed on its invoices
+                summary["processed"] += 1
+                continue
+            try:
+                order_doc, session_args = hdfc_order.build_order(
+                    **{key: order[key] for key in BULK_ORDER_FIELDS if key in order},
+                    invoice_values=invoice_values,
+                )
+                prepared_orders.append((idx, order_doc, session_args))
+            except Exception as e:
+                results[idx] = _get_failed_result(idx, e)
+                summary["processed"] += 1
+        frappe.clear_messages()
+
+        for chunk in create_batch(prepared_orders, config.HDFC_BULK_ORDER_CHUNK_SIZE):
+            _create_order_chunk(chunk, results)
+            frappe.db.commit()
+
+            summary["processed"] += len(chunk)
+            chunk_results = [results[idx] for idx, _, _ in chunk]
+            _set_results(bulk_id, {**summary, "results": results})
+            frappe.publish_realtime(
+                HDFC_BULK_ORDERS_PROGRESS,
+                {"bulk_id": bulk_id, **summary, "results": chunk_results},
+                user=frappe.session.user,
+            )
+
+        summary["status"] = "Completed"
+    except Exception:
+        summary["status"] = "Failed"
+        frappe.log_error("HDFC bulk order creation failed")
+        raise
+    finally:
+        _set_results(bulk_id, {**summary, "results": results})
+        frappe.publish_realtime(
+            HDFC_BULK_ORDERS_PROGRESS,
+            {"bulk_id": bulk_id, **summary},
+            user=frappe.session.user,
+        )
+
+    return results
+
+
+def _get_invoice_values(orders, results):
+    # Invoices of every row are validated with one query per invoice doctype.
+    # Malformed invoices or an unknown doctype fail the rows they came from.
+    invoices_by_type = {}
+    rows_by_type = {}
+    for idx, order in enumerate(orders):
+        try:
+            invoices = frappe.parse_json(order.get("invoices")) or []
+            if not isinstance(invoices, list) or not all(
+                isinstance(invoice, dict) for invoice in invoices
+            ):
+                frappe.throw("Invoices should be a list of invoices.")
+        except Exception as e:
+            results[idx] = _get_failed_result(idx, e)
+            continue
+
+        for invoice in invoices:
+            invoice_type = invoice.get("invoice_type") or ""
+            invoices_by_type.setdefault(invoice_type, []).append(invoice)
+            rows_by_type.setdefault(invoice_type, set()).add(idx)
+
+    invoice_values = {}
+    for invoice_type, invoices in invoices_by_type.items():
+        try:
+            invoice_values.update(hdfc_order.get_invoice_values(invoices))
+        except Exception as e:
+            for idx in rows_by_type[invoice_type]:
+                results[idx] = results[idx] or _get_failed_result(idx, e)
+    frappe.clear_messages()
+
+    return invoice_values
+
+
+def _create_order_chunk(chunk, results):
+    # Sessions are created from worker threads, which have no site context,
+    # so every request is prepared here first
+    session_entry = client.get_session()
+    url = client.prepare_url("/session")
+
+    with ThreadPoolExecutor(max_workers=config.HDFC_BULK_ORDER_CONCURRENCY) as executor:
+        futures = {}
+        for idx, order_doc, session_args in chunk:
+            session_req = service.get_order_session_request(**session_args)
+            future = executor.submit(
+                client.send_request,
+                session_entry,
+                "POST",
+                url,
+                headers=client.prepare_headers(customer_id=session_req["customer_id"]),
+                json=session_req,
+                request_class="session",
+                priority=rate_limit.BACKGROUND,
+            )
+            futures[future] = (idx, order_doc)
+
+        for future in as_completed(futures):
+            idx, order_doc = futures[future]
+            frappe.db.savepoint(BULK_ORDER_SAVEPOINT)
+            try:
+                session_data = transformers.parse_session_res(future.result())
+                hdfc_order.apply_order_session(order_doc, session_data)
+                order_doc.insert()
+                results[idx] = {
+                    "row": idx,
+                    "status": "Created",
+                    "order_id": order_doc.name,
+                    "payment_link": order_doc.payment_link,
+                }
+            except Exception as e:
+                frappe.db.rollback(save_point=BULK_ORDER_SAVEPOINT)
+                results[idx] = _get_failed_result(idx, e)
+
+    frappe.clear_messages()
+
+
+def _get_failed_result(idx, error):
+    return {"row": idx, "status": "Failed", "error": str(error) or repr(error)}
+
+
+def _set_results(bulk_id, bulk_results):
+    frappe.cache().set_value(
+        f"{BULK_ORDER_RESULTS_KEY}::{bulk_id}",
+        bulk_results,
+        expires_in_sec=config.HDFC_BULK_ORDER_RESULT_TTL,
+    )
@@ -1,14 +1,79 @@
+import frappe
 import requests
+from requests.adapters import HTTPAdapter
 
-from crm_hdfc_integration.hdfc_smartgateway.integration import auth
-from crm_hdfc_integration import utils
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    auth,
+    rate_limit,
+    resilience,
+)
+
+HTTP_SESSION_VERSION_KEY = "hdfc_smartgateway_http_session_version"
+
+# Per worker pooled sessions, keyed by site
+_sessions = {}
+
+
+def get_session():
+    version = frappe.cache().get_value(HTTP_SESSION_VERSION_KEY)
+    session_entry = _sessions.get(frappe.local.site)
+
+    if session_entry and session_entry["version"] == version:
+        return session_entry
+
+    if session_entry:
+        session_entry["session"].close()
+
+    connection_settings = auth.get_connection_settings()
+    adapter = HTTPAdapter(
+        pool_connections=connection_settings["pool_connections"],
+        pool_maxsize=connection_settings["pool_maxsize"],
+        max_retries=0,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+
+    connect_timeout, read_timeout = connection_settings["timeout"]
+    session_entry = {
+        "session": session,
+        "timeout": connection_settings["timeout"],
+        # A lower read timeout in the settings also shortens every class
+        "timeouts": {
+            request_class: (connect_timeout, min(class_read_timeout, read_timeout))
+            for request_class, class_read_timeout in (
+                config.HDFC_HTTP_READ_TIMEOUTS.items()
+            )
+        },
+        "max_retries": connection_settings["max_retries"],
+        "retry_backoff": connection_settings["retry_backoff"],
+        "breaker": resilience.get_circuit_breaker(connection_settings),
+        "rate_limiter": rate_limit.get_rate_limiter(connection_settings),
+        "site": frappe.local.site,
+        "version": version,
+    }
+    _sessions[frappe.local.site] = session_entry
+
+    return session_entry
+
+
+def reset_session():
+    # Bumping the version makes every worker rebuild its session on next use
+    frappe.cache().set_value(HTTP_SESSION_VERSION_KEY, frappe.generate_hash(length=10))
+
+    session_entry = _sessions.pop(frappe.local.site, None)
+    if session_entry:
+        session_entry["session"].close()
 
 
 def get_auth_headers(customer_id=None):
     auth_values = auth.get_auth_details()
     headers = {
         "x-merchantid": auth_values["merchant_id"],
-        "Authorization": f"Basic {utils.get_base64_string(auth_values['api_key'])}",
+        "Authorization": auth_values["authorization"],
     }
 
     if customer_id:
@@ -29,7 +94,8 @@ def prepare_url(endpoint):
     return auth.get_base_uri() + endpoint
 
 
-def make_get_request(
+def make_request(
+    method,
     endpoint,
     customer_id=None,
     auth=True,
@@ -39,25 +105,58 @@ def make_get_request(
     json=None,
     full_url=None,
     as_json=True,
+    request_class=None,
+    priority=rate_limit.INTERACTIVE,
 ):
     headers = prepare_headers(headers, customer_id, auth)
     url = full_url if full_url else prepare_url(endpoint)
 
-    res = requests.get(
+    return send_request(
+        get_session(),
+        method,
+        url,
+        headers=headers,
+        params=params,
+        data=data,
+        json=json,
+        as_json=as_json,
+        request_class=request_class,
+        priority=priority,
+    )
+
+
+def send_request(
+    session_entry,
+    method,
+    url,
+    headers=None,
+    params=None,
+    data=None,
+    json=None,
+    as_json=True,
+    request_class=None,
+    priority=rate_limit.INTERACTIVE,
+):
+    # Does not touch frappe.local, so it is safe to call from worker threads
+    # with a session entry fetched by the calling thread
+    res = resilience.send(
+        session_entry,
+        method,
         url,
+        request_class=request_class,
+        priority=priority,
         headers=headers,
         params=params,
         data=data,
         json=json,
     )
-    res.raise_for_status()
 
     if as_json:
         return res.json()
     return res.text
 
 
-def make_post_request(
+def make_get_request(
     endpoint,
     customer_id=None,
     auth=True,
@@ -67,22 +166,48 @@ def make_post_request(
     json=None,
     full_url=None,
     as_json=True,
+    request_class=None,
 ):
-    headers = prepare_headers(headers, customer_id, auth)
-    url = full_url if full_url else prepare_url(endpoint)
-
-    res = requests.post(
-        url,
+    return make_request(
+        "GET",
+        endpoint,
+        customer_id=customer_id,
+        auth=auth,
         headers=headers,
         params=params,
         data=data,
         json=json,
+        full_url=full_url,
+        as_json=as_json,
+        request_class=request_class,
     )
-    res.raise_for_status()
 
-    if as_json:
-        return res.json()
-    return res.text
+
+def make_post_request(
+    endpoint,
+    customer_id=None,
+    auth=True,
+    headers=None,
+    params=None,
+    data=None,
+    json=None,
+    full_url=None,
+    as_json=True,
+    request_class=None,
+):
+    return make_request(
+        "POST",
+        endpoint,
+        customer_id=customer_id,
+        auth=auth,
+        headers=headers,
+        params=params,
+        data=data,
+        json=json,
+        full_url=full_url,
+        as_json=as_json,
+        request_class=request_class,
+    )
 
 
 def make_patch_request(
@@ -95,22 +220,21 @@ def make_patch_request(
     json=None,
     full_url=None,
     as_json=True,
+    request_class=None,
 ):
-    headers = prepare_headers(headers, customer_id, auth)
-    url = full_url if full_url else prepare_url(endpoint)
-
-    res = requests.patch(
-        url,
+    return make_request(
+        "PATCH",
+        endpoint,
+        customer_id=customer_id,
+        auth=auth,
         headers=headers,
         params=params,
         data=data,
         json=json,
+        full_url=full_url,
+        as_json=as_json,
+        request_class=request_class,
     )
-    res.raise_for_status()
-
-    if as_json:
-        return res.json()
-    return res.text
 
 
 def make_delete_request(
@@ -123,19 +247,18 @@ def make_delete_request(
     json=None,
     full_url=None,
     as_json=True,
+    request_class=None,
 ):
-    headers = prepare_headers(headers, customer_id, auth)
-    url = full_url if full_url else prepare_url(endpoint)
-
-    res = requests.delete(
-        url,
+    return make_request(
+        "DELETE",
+        endpoint,
+        customer_id=customer_id,
+        auth=auth,
         headers=headers,
         params=params,
         data=data,
         json=json,
+        full_url=full_url,
+        as_json=as_json,
+        request_class=request_class,
     )
-    res.raise_for_status()
-
-    if as_json:
-        return res.json()
-    return res.text
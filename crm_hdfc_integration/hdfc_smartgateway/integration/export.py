@@ -0,0 +1,232 @@
+import csv
+import os
+from io import StringIO
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+from werkzeug.wrappers import Response
+
+from crm_hdfc_integration.config import config
+
+HDFC_ORDERS_EXPORT_READY = "HDFC_ORDERS_EXPORT_READY"
+
+EXPORT_ORDER_FIELDS = (
+    "name",
+    "modified",
+    "posting_date",
+    "customer",
+    "company",
+    "order_status",
+    "hdfc_status",
+    "currency",
+    "amount",
+    "effective_amount",
+    "amount_refunded",
+    "refunded",
+    "mode_of_payment",
+    "payment_service",
+    "txn_id",
+    "txn_uuid",
+    "txn_status",
+    "txn_date",
+    "txn_currency",
+    "txn_amount",
+    "txn_net_amount",
+    "txn_tax_amount",
+    "txn_supercharge_amount",
+    "txn_offer_deduction_amount",
+    "gateway",
+    "gateway_id",
+    "gateway_reference_id",
+    "payment_entry",
+)
+BREAKUP_EXPORT_FIELDS = ("breakup_name", "value", "method")
+REFUND_EXPORT_FIELDS = ("id", "unique_request_id", "status", "amount", "refund_time")
+EXPORT_HEADER = (*EXPORT_ORDER_FIELDS, "txn_amount_breakup", "refunds")
+
+
+@frappe.whitelist()
+def export_orders_csv(from_date=None, to_date=None, order_status=None):
+    # Built within the request and capped, larger exports go through
+    # enqueue_orders_export
+    frappe.has_permission("HDFC Order", "export", throw=True)
+
+    max_rows = config.HDFC_EXPORT_MAX_DIRECT_ROWS
+    filters = _get_export_filters(from_date, to_date, order_status)
+    pages = list(iter_export_pages(filters, max_rows=max_rows + 1))
+    if sum(len(rows) for rows in pages) > max_rows:
+        frappe.throw(
+            f"More than {max_rows} HDFC Orders match, export them in the background."
+        )
+
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+    for rows in pages:
+        writer.writerows(rows)
+
+    filename = f"hdfc_orders_{now_datetime():%Y%m%d%H%M%S}.csv"
+    return Response(
+        buffer.getvalue().encode("utf-8"),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@frappe.whitelist()
+def enqueue_orders_export(
+    file_format="xlsx", from_date=None, to_date=None, order_status=None
+):
+    frappe.has_permission("HDFC Order", "export", throw=True)
+    if file_format not in ("csv", "xlsx"):
+        frappe.throw(f"Unsupported export format {file_format}.")
+
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.export.export_orders_to_file",
+        queue="long",
+        timeout=2 * 60 * 60,
+        file_format=file_format,
+        filters=_get_export_filters(from_date, to_date, order_status),
+    )
+
+
+def export_orders_to_file(file_format, filters):
+    # Written straight to the private files folder, then attached as a File
+    file_name = f"hdfc_orders_{now_datetime():%Y%m%d%H%M%S}.{file_format}"
+    file_path = frappe.get_site_path("private", "files", file_name)
+
+    if file_format == "xlsx":
+        _write_xlsx(file_path, filters)
+    else:
+        with open(file_path, "w", newline="") as f:
+            for chunk in iter_csv_chunks(filters, encode=False):
+                f.write(chunk)
+
+    file_doc = frappe.get_doc(
+        {
+            "doctype": "File",
+            "file_name": file_name,
+            "file_url": f"/private/files/{file_name}",
+            "is_private": 1,
+            "file_size": os.path.getsize(file_path),
+        }
+    ).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    frappe.publish_realtime(
+        HDFC_ORDERS_EXPORT_READY,
+        {"file_url": file_doc.file_url},
+        user=frappe.session.user,
+    )
+    return file_doc.file_url
+
+
+def iter_csv_chunks(filters, encode=True):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+
+    for rows in iter_export_pages(filters):
+        writer.writerows(rows)
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        yield chunk.encode("utf-8") if encode else chunk
+
+    # Header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8") if encode else buffer.getvalue()
+
+
+def iter_export_pages(filters, page_size=None, max_rows=None):
+    # Keyset pagination on (modified, name) with child rows fetched per page
+    page_size = page_size or config.HDFC_EXPORT_PAGE_SIZE
+    order = frappe.qb.DocType("HDFC Order")
+    last_order = None
+
+    while max_rows is None or max_rows > 0:
+        limit = page_size if max_rows is None else min(page_size, max_rows)
+        query = (
+            frappe.qb.from_(order)
+            .select(*(order[field] for field in EXPORT_ORDER_FIELDS))
+            .orderby(order.modified)
+            .orderby(order.name)
+            .limit(limit)
+        )
+        if filters.get("from_date"):
+            query = query.where(order.modified >= filters["from_date"])
+        if filters.get("to_date"):
+            query = query.where(order.modified <= filters["to_date"])
+        if filters.get("order_status"):
+            query = query.where(order.order_status == filters["order_status"])
+        if last_order:
+            query = query.where(
+                (order.modified > last_order.modified)
+                | (
+                    (order.modified == last_order.modified)
+                    & (order.name > last_order.name)
+                )
+            )
+
+        orders = query.run(as_dict=True)
+        if not orders:
+            break
+
+        names = [row.name for row in orders]
+        breakups = _get_child_rows(
+            "HDFC Txn Amount Breakup", names, BREAKUP_EXPORT_FIELDS
+        )
+        refunds = _get_child_rows("HDFC Refunds", names, REFUND_EXPORT_FIELDS)
+
+        yield [
+            [
+                *(row[field] for field in EXPORT_ORDER_FIELDS),
+                frappe.as_json(breakups.get(row.name, []), indent=None),
+                frappe.as_json(refunds.get(row.name, []), indent=None),
+            ]
+            for row in orders
+        ]
+
+        last_order = orders[-1]
+        if max_rows is not None:
+            max_rows -= len(orders)
+
+
+def _get_child_rows(doctype, parents, fields):
+    child_rows = {}
+    for row in frappe.get_all(
+        doctype,
+        filters={"parenttype": "HDFC Order", "parent": ["in", parents]},
+        fields=["parent", *fields],
+        order_by="parent asc, idx asc",
+    ):
+        parent = row.pop("parent")
+        child_rows.setdefault(parent, []).append(row)
+    return child_rows
+
+
+def _write_xlsx(file_path, filters):
+    from openpyxl import Workbook
+
+    # Write only mode streams rows to disk instead of keeping the sheet
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("HDFC Orders")
+    sheet.append(EXPORT_HEADER)
+
+    for rows in iter_export_pages(filters):
+        for row in rows:
+            sheet.append(row)
+
+    workbook.save(file_path)
+
+
+def _get_export_filters(from_date=None, to_date=None, order_status=None):
+    if to_date and len(str(to_date)) == 10:
+        # A plain date includes the whole day
+        to_date = f"{to_date} 23:59:59.999999"
+
+    return {
+        "from_date": get_datetime(from_date) if from_date else None,
+        "to_date": get_datetime(to_date) if to_date else None,
+        "order_status": order_status,
+    }
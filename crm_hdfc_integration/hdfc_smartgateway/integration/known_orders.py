@@ -0,0 +1,112 @@
+from hashlib import blake2b
+
+import frappe
+
+from crm_hdfc_integration.config import config
+
+# Bloom filter of HDFC Order names in a Redis bitmap. A miss means the order
+# does not exist, a hit may still be a false positive. The bit after the
+# filter is set once a rebuild has added every order, so a filter lost with
+# the cache is never trusted while it is being rebuilt.
+KNOWN_ORDERS_KEY = "hdfc_smartgateway_known_orders"
+KNOWN_ORDERS_REBUILD_JOB_ID = "hdfc_smartgateway_rebuild_known_orders"
+
+# Sets the sentinel bit (ARGV[2]) only while the bit a rebuild set when it
+# started (ARGV[1]) is still there, so a filter cleared meanwhile is not
+# marked complete
+SET_COMPLETE_SCRIPT = """
+if redis.call("GETBIT", KEYS[1], ARGV[1]) == 1 then
+    redis.call("SETBIT", KEYS[1], ARGV[2], 1)
+    return 1
+end
+return 0
+"""
+
+
+def add_order(order_id):
+    cache = frappe.cache()
+    filter_key = cache.make_key(KNOWN_ORDERS_KEY)
+
+    pipeline = cache.pipeline()
+    for offset in _get_offsets(order_id):
+        pipeline.setbit(filter_key, offset, 1)
+    pipeline.execute()
+
+
+def order_may_exist(order_id):
+    if not order_id:
+        return False
+
+    cache = frappe.cache()
+    filter_key = cache.make_key(KNOWN_ORDERS_KEY)
+
+    pipeline = cache.pipeline()
+    pipeline.getbit(filter_key, config.HDFC_KNOWN_ORDERS_FILTER_BITS)
+    for offset in _get_offsets(order_id):
+        pipeline.getbit(filter_key, offset)
+    complete, *bits = pipeline.execute()
+
+    if not complete:
+        enqueue_rebuild()
+        return True
+    return all(bits)
+
+
+def enqueue_rebuild():
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.known_orders.rebuild",
+        queue="long",
+        job_id=KNOWN_ORDERS_REBUILD_JOB_ID,
+        deduplicate=True,
+    )
+
+
+def rebuild():
+    # Bits are only ever set, so orders inserted meanwhile are kept
+    cache = frappe.cache()
+    filter_key = cache.make_key(KNOWN_ORDERS_KEY)
+    rebuild_bit = config.HDFC_KNOWN_ORDERS_FILTER_BITS + 1
+    cache.setbit(filter_key, rebuild_bit, 1)
+    last_name = None
+
+    while True:
+        names = frappe.get_all(
+            "HDFC Order",
+            filters={"name": [">", last_name]} if last_name else None,
+            pluck="name",
+            order_by="name asc",
+            limit=config.HDFC_KNOWN_ORDERS_REBUILD_PAGE_SIZE,
+        )
+        if not names:
+            break
+
+        pipeline = cache.pipeline()
+        for name in names:
+            for offset in _get_offsets(name):
+                pipeline.setbit(filter_key, offset, 1)
+        pipeline.execute()
+        last_name = names[-1]
+
+    # False when the filter was cleared while rebuilding, the next lookup then
+    # starts another rebuild
+    return bool(
+        cache.eval(
+            SET_COMPLETE_SCRIPT,
+            1,
+            filter_key,
+            rebuild_bit,
+            config.HDFC_KNOWN_ORDERS_FILTER_BITS,
+        )
+    )
+
+
+def _get_offsets(order_id):
+    # Double hashing over the two halves of one 128 bit digest
+    digest = blake2b(order_id.encode("utf-8"), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], "big")
+    second = int.from_bytes(digest[8:], "big") | 1
+
+    return [
+        (first + i * second) % config.HDFC_KNOWN_ORDERS_FILTER_BITS
+        for i in range(config.HDFC_KNOWN_ORDERS_FILTER_HASHES)
+    ]
@@ -0,0 +1,219 @@
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+import frappe
+from werkzeug.wrappers import Response
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+METRICS_KEY = "hdfc_smartgateway_metrics"
+METRICS_FLUSH_INTERVAL = 5  # seconds
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+METRICS = {
+    "hdfc_http_request_seconds": ("histogram", "Latency of HDFC API requests."),
+    "hdfc_http_requests_total": ("counter", "HDFC API responses by status code."),
+    "hdfc_http_retries_total": ("counter", "Retried HDFC API requests."),
+    "hdfc_operation_seconds": ("histogram", "Latency of integration operations."),
+    "hdfc_operation_queries": (
+        "histogram",
+        "Database queries issued per integration operation.",
+    ),
+    "hdfc_order_status_transitions_total": (
+        "counter",
+        "HDFC Order status changes applied from HDFC.",
+    ),
+    "hdfc_webhook_rejections_total": ("counter", "Webhook calls rejected by reason."),
+}
+
+# Samples recorded by this process since its last flush, per site. Flushing
+# adds them to a Redis hash shared by every worker of the site.
+_registry = {}
+_last_flush = {}
+_lock = threading.Lock()
+_tracer = trace.get_tracer("crm_hdfc_integration") if trace else None
+
+
+def inc(name, value=1, site=None, **labels):
+    _add_samples(site, [(_get_sample(name, labels), value)])
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, site=None, **labels):
+    samples = [
+        (_get_sample(f"{name}_bucket", {**labels, "le": le}), 1)
+        for le in buckets
+        if value <= le
+    ]
+    samples.append((_get_sample(f"{name}_bucket", {**labels, "le": "+Inf"}), 1))
+    samples.append((_get_sample(f"{name}_sum", labels), value))
+    samples.append((_get_sample(f"{name}_count", labels), 1))
+    _add_samples(site, samples)
+
+
+@contextmanager
+def instrument(operation, **labels):
+    # Latency of an operation, its query count when hdfc_metrics_count_queries
+    # is set in the site config, and a span when OpenTelemetry is installed
+    with ExitStack() as stack:
+        if _tracer:
+            stack.enter_context(
+                _tracer.start_as_current_span(
+                    f"hdfc.{operation}",
+                    attributes={key: str(value) for key, value in labels.items()},
+                )
+            )
+
+        queries = None
+        if frappe.conf.get("hdfc_metrics_count_queries"):
+            queries = stack.enter_context(_count_queries())
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe(
+                "hdfc_operation_seconds",
+                time.perf_counter() - started,
+                operation=operation,
+                **labels,
+            )
+            if queries is not None:
+                observe(
+                    "hdfc_operation_queries",
+                    queries["count"],
+                    buckets=QUERY_BUCKETS,
+                    operation=operation,
+                    **labels,
+                )
+
+
+def timed(operation):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with instrument(operation):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def flush_metrics(force=False, **kwargs):
+    # Runs after every request and job, writing at most every few seconds
+    site = getattr(frappe.local, "site", None)
+    now = time.monotonic()
+    if not site:
+        return
+    if not force and now - _last_flush.get(site, 0) < METRICS_FLUSH_INTERVAL:
+        return
+
+    with _lock:
+        samples = _registry.pop(site, None)
+    _last_flush[site] = now
+    if not samples:
+        return
+
+    cache = frappe.cache()
+    metrics_key = cache.make_key(METRICS_KEY)
+    pipeline = cache.pipeline()
+    for sample, value in samples.items():
+        pipeline.hincrbyfloat(metrics_key, sample, value)
+    pipeline.execute()
+
+
+def get_metrics_snapshot():
+    flush_metrics(force=True)
+
+    cache = frappe.cache()
+    # Plain redis commands, the cache wrapper pickles hash values
+    pipeline = cache.pipeline()
+    pipeline.hgetall(cache.make_key(METRICS_KEY))
+    samples = pipeline.execute()[0]
+
+    return {
+        frappe.safe_decode(sample): float(value) for sample, value in samples.items()
+    }
+
+
+def reset_metrics():
+    with _lock:
+        _registry.pop(frappe.local.site, None)
+    frappe.cache().delete(frappe.cache().make_key(METRICS_KEY))
+
+
+@frappe.whitelist()
+def get_metrics():
+    # Prometheus text exposition of the metrics of every worker of the site
+    frappe.only_for("System Manager")
+
+    samples_by_metric = {}
+    for sample, value in sorted(get_metrics_snapshot().items()):
+        name = sample.split("{", 1)[0]
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                name = name[: -len(suffix)]
+                break
+        samples_by_metric.setdefault(name, []).append(f"{sample} {value!r}")
+
+    lines = []
+    for name, samples in samples_by_metric.items():
+        metric_type, description = METRICS.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(samples)
+
+    return Response(
+        "\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def _add_samples(site, samples):
+    site = site or getattr(frappe.local, "site", None)
+    with _lock:
+        site_samples = _registry.setdefault(site, {})
+        for sample, value in samples:
+            site_samples[sample] = site_samples.get(sample, 0) + value
+
+
+def _get_sample(name, labels):
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+@contextmanager
+def _count_queries():
+    # Counts sql calls on the request's database connection for the duration
+    # of one operation, the connection's own sql is put back afterwards
+    db = getattr(frappe.local, "db", None)
+    if not db:
+        yield None
+        return
+
+    counter = {"count": 0}
+    had_own_sql = "sql" in vars(db)
+    own_sql = vars(db).get("sql")
+    sql = db.sql
+
+    def counting_sql(*args, **kwargs):
+        counter["count"] += 1
+        return sql(*args, **kwargs)
+
+    db.sql = counting_sql
+    try:
+        yield counter
+    finally:
+        # Left alone when wrapped again meanwhile and not unwrapped
+        if vars(db).get("sql") is counting_sql:
+            if had_own_sql:
+                db.sql = own_sql
+            else:
+                del db.sql
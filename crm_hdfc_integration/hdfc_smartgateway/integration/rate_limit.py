@@ -0,0 +1,163 @@
+import time
+
+import frappe
+
+from crm_hdfc_integration.config import config
+
+RATE_LIMIT_KEY = "hdfc_smartgateway_rate_limit"
+RATE_LIMIT_STATS_KEY = "hdfc_smartgateway_rate_limit_stats"
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Takes one token from both the request class bucket and the total bucket,
+# or returns the seconds to wait until both can be taken. Background callers
+# leave `reserve` tokens of the total bucket for payer facing requests.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local function available(key, rate, burst)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    return math.min(burst, tokens + math.max(now - ts, 0) * rate)
+end
+
+local class_rate, class_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local total_rate, total_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local reserve = tonumber(ARGV[5])
+
+local class_tokens = available(KEYS[1], class_rate, class_burst)
+local total_tokens = available(KEYS[2], total_rate, total_burst)
+
+local wait = 0
+if class_tokens < 1 then
+    wait = (1 - class_tokens) / class_rate
+end
+if total_tokens < 1 + reserve then
+    wait = math.max(wait, (1 + reserve - total_tokens) / total_rate)
+end
+if wait > 0 then
+    return tostring(wait)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', class_tokens - 1, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', total_tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 60)
+redis.call('EXPIRE', KEYS[2], 60)
+return '0'
+"""
+
+
+class SmartGatewayRateLimited(frappe.TooManyRequestsError):
+    pass
+
+
+class RateLimiter:
+    # Like the circuit breaker, keys are built here for use from worker threads
+    def __init__(self, rate_limits, total_rate_limit, background_reserve):
+        self.redis = frappe.cache()
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self.rate_limits = rate_limits
+        self.total_rate_limit = total_rate_limit
+        self.total_burst = max(total_rate_limit, 1)
+        self.background_reserve = self.total_burst * background_reserve / 100
+
+        self.total_key = self.redis.make_key(f"{RATE_LIMIT_KEY}::total")
+        self.bucket_keys = {
+            request_class: self.redis.make_key(f"{RATE_LIMIT_KEY}::{request_class}")
+            for request_class in (*rate_limits, None)
+        }
+        self.stats_key = self.redis.make_key(RATE_LIMIT_STATS_KEY)
+
+    def acquire(self, request_class=None, priority=INTERACTIVE):
+        # Payer facing requests queue briefly and then fail, background ones
+        # keep yielding until the budget frees up
+        if request_class not in self.rate_limits:
+            request_class = None
+        rate = self.rate_limits.get(request_class) or self.total_rate_limit
+        reserve = self.background_reserve if priority == BACKGROUND else 0
+        max_wait = (
+            config.HDFC_RATE_LIMIT_BACKGROUND_MAX_WAIT
+            if priority == BACKGROUND
+            else config.HDFC_RATE_LIMIT_MAX_WAIT
+        )
+
+        started = time.monotonic()
+        waited = 0
+        while True:
+            wait = float(
+                self.script(
+                    keys=[self.bucket_keys[request_class], self.total_key],
+                    args=[
+                        rate,
+                        max(rate, 1),
+                        self.total_rate_limit,
+                        self.total_burst,
+                        reserve,
+                    ],
+                )
+            )
+            if not wait:
+                break
+
+            if waited + wait > max_wait:
+                self._record(request_class, priority, waited, rejected=True)
+                raise SmartGatewayRateLimited(
+                    "Too many requests to HDFC SmartGateway, please try again shortly."
+                )
+            time.sleep(wait)
+            waited = time.monotonic() - started
+
+        self._record(request_class, priority, waited)
+
+    def _record(self, request_class, priority, waited, rejected=False):
+        prefix = f"{request_class or 'other'}:{priority}"
+        pipeline = self.redis.pipeline()
+        pipeline.hincrby(self.stats_key, f"{prefix}:requests", 1)
+        if waited:
+            pipeline.hincrby(self.stats_key, f"{prefix}:delayed", 1)
+            pipeline.hincrbyfloat(self.stats_key, f"{prefix}:wait_time", waited)
+        if rejected:
+            pipeline.hincrby(self.stats_key, f"{prefix}:rejected", 1)
+        pipeline.execute()
+
+
+def get_rate_limiter(connection_settings):
+    return RateLimiter(
+        connection_settings["rate_limits"],
+        connection_settings["total_rate_limit"],
+        connection_settings["background_reserve"],
+    )
+
+
+@frappe.whitelist()
+def get_rate_limit_stats(reset=False):
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    stats_key = cache.make_key(RATE_LIMIT_STATS_KEY)
+
+    # Plain redis commands, the cache wrapper pickles hash values
+    pipeline = cache.pipeline()
+    pipeline.hgetall(stats_key)
+    if frappe.utils.cint(reset):
+        pipeline.delete(stats_key)
+    raw_stats = pipeline.execute()[0]
+
+    stats = {}
+    for field, value in raw_stats.items():
+        request_class, priority, metric = frappe.safe_decode(field).split(":")
+        entry = stats.setdefault(
+            f"{request_class}:{priority}",
+            {"requests": 0, "delayed": 0, "rejected": 0, "wait_time": 0.0},
+        )
+        entry[metric] = float(value) if metric == "wait_time" else int(value)
+
+    for entry in stats.values():
+        entry["avg_queue_delay"] = (
+            entry["wait_time"] / entry["requests"] if entry["requests"] else 0
+        )
+
+    return stats
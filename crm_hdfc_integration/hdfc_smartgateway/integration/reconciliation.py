@@ -0,0 +1,198 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import frappe
+from frappe.utils import now_datetime
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    client,
+    rate_limit,
+    service,
+    utils,
+)
+
+OPEN_ORDER_STATUSES = ("New", "Started", "Pending")
+RECONCILIATION_SAVEPOINT = "hdfc_reconcile_order"
+RECONCILIATION_CURSOR_KEY = "hdfc_smartgateway_reconcile_cursor"
+# Share of the job timeout a run may spend before leaving the rest to the
+# next run, the remainder covers the page in flight
+RECONCILIATION_TIME_BUDGET = 0.8
+
+# Open orders are polled less often as they age; anything older than the
+# last bucket is left to webhooks and manual syncs
+ORDER_AGE_BUCKETS = {
+    "recent": (timedelta(0), timedelta(hours=1)),
+    "today": (timedelta(hours=1), timedelta(days=1)),
+    "week": (timedelta(days=1), timedelta(days=7)),
+}
+
+
+def reconcile_recent_orders():
+    enqueue_reconciliation("recent")
+
+
+def reconcile_today_orders():
+    enqueue_reconciliation("today")
+
+
+def reconcile_week_orders():
+    enqueue_reconciliation("week")
+
+
+def enqueue_reconciliation(age_bucket):
+    if not utils.get_cached_settings(raise_if_disabled=False).enabled:
+        return
+
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.reconciliation.reconcile_open_orders",
+        queue="long",
+        timeout=config.HDFC_RECONCILIATION_TIMEOUTS[age_bucket],
+        job_id=f"hdfc_smartgateway_reconcile::{age_bucket}",
+        deduplicate=True,
+        age_bucket=age_bucket,
+    )
+
+
+def reconcile_open_orders(age_bucket="recent"):
+    min_age, max_age = ORDER_AGE_BUCKETS[age_bucket]
+    now = now_datetime()
+
+    filters = [
+        ["order_status", "in", OPEN_ORDER_STATUSES],
+        ["docstatus", "=", 0],
+        ["creation", ">=", now - max_age],
+        ["creation", "<", now - min_age],
+    ]
+
+    summary = {"polled": 0, "updated": 0, "failed": 0}
+    cursor_key = f"{RECONCILIATION_CURSOR_KEY}::{age_bucket}"
+    last_name = frappe.cache().get_value(cursor_key, expires=True)
+    deadline = time.monotonic() + (
+        config.HDFC_RECONCILIATION_TIMEOUTS[age_bucket] * RECONCILIATION_TIME_BUDGET
+    )
+
+    # Keyset pagination keeps every page query cheap on large order tables
+    while True:
+        # HDFC is failing or the run is out of time, the next run resumes
+        # after the last reconciled order
+        if client.get_session()["breaker"].is_open() or time.monotonic() > deadline:
+            if last_name:
+                frappe.cache().set_value(
+                    cursor_key,
+                    last_name,
+                    expires_in_sec=int(max_age.total_seconds()),
+                )
+            return summary
+
+        page_filters = filters
+        if last_name:
+            page_filters = filters + [["name", ">", last_name]]
+
+        orders = frappe.get_all(
+            "HDFC Order",
+            filters=page_filters,
+            fields=["name", "customer"],
+            order_by="name asc",
+            limit=config.HDFC_RECONCILIATION_PAGE_SIZE,
+        )
+        if not orders:
+            break
+
+        page_summary = reconcile_orders(orders)
+        for key in summary:
+            summary[key] += page_summary[key]
+
+        last_name = orders[-1].name
+
+    frappe.cache().delete_value(cursor_key)
+    return summary
+
+
+def reconcile_orders(orders):
+    settings = utils.get_cached_settings()
+    concurrency = (
+        settings.reconciliation_concurrency or config.HDFC_RECONCILIATION_CONCURRENCY
+    )
+    dispatch_rate = (
+        settings.reconciliation_rate_limit or config.HDFC_RECONCILIATION_RATE_LIMIT
+    )
+    commit_size = (
+        settings.reconciliation_commit_size or config.HDFC_RECONCILIATION_COMMIT_SIZE
+    )
+
+    status_responses, fetch_errors = _fetch_order_statuses(
+        orders, concurrency, dispatch_rate
+    )
+
+    summary = {"polled": len(orders), "updated": 0, "failed": len(fetch_errors)}
+    for idx, (order_id, status_res) in enumerate(status_responses.items(), 1):
+        frappe.db.savepoint(RECONCILIATION_SAVEPOINT)
+        try:
+            if service._sync_order_status(status_res=status_res, log_status=True):
+                summary["updated"] += 1
+        except Exception:
+            frappe.db.rollback(save_point=RECONCILIATION_SAVEPOINT)
+            summary["failed"] += 1
+            fetch_errors[order_id] = frappe.get_traceback()
+
+        if idx % commit_size == 0:
+            frappe.db.commit()
+
+    frappe.db.commit()
+
+    if fetch_errors:
+        frappe.log_error(
+            "HDFC order reconciliation failures",
+            "\n\n".join(f"{name}: {error}" for name, error in fetch_errors.items()),
+        )
+
+    return summary
+
+
+def _fetch_order_statuses(orders, concurrency, dispatch_rate):
+    # Requests are prepared here as worker threads have no site context
+    session_entry = client.get_session()
+    prepared_requests = [
+        (
+            order.name,
+            client.prepare_url(f"/orders/{order.name}"),
+            client.prepare_headers(customer_id=order.customer),
+        )
+        for order in orders
+    ]
+
+    status_responses = {}
+    fetch_errors = {}
+    interval = 1 / dispatch_rate
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        next_dispatch = time.monotonic()
+
+        for order_id, url, headers in prepared_requests:
+            delay = next_dispatch - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_dispatch = max(next_dispatch, time.monotonic()) + interval
+
+            future = executor.submit(
+                client.send_request,
+                session_entry,
+                "GET",
+                url,
+                headers=headers,
+                request_class="order_status",
+                priority=rate_limit.BACKGROUND,
+            )
+            futures[future] = order_id
+
+        for future in as_completed(futures):
+            order_id = futures[future]
+            try:
+                status_responses[order_id] = future.result()
+            except Exception as e:
+                fetch_errors[order_id] = repr(e)
+
+    return status_responses, fetch_errors
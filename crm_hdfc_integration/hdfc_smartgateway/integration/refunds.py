@@ -0,0 +1,526 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import frappe
+import requests
+from frappe.utils import create_batch, flt, now_datetime
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order_status_rollup import (
+    hdfc_order_status_rollup,
+)
+from crm_hdfc_integration.utils import get_system_datetime_converter
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    api,
+    client,
+    rate_limit,
+    reconciliation,
+    status_cache,
+    transformers,
+    utils,
+)
+
+BULK_REFUND_RESULTS_KEY = "hdfc_smartgateway_bulk_refunds"
+HDFC_BULK_REFUNDS_PROGRESS = "HDFC_BULK_REFUNDS_PROGRESS"
+REFUND_POLL_JOB_ID = "hdfc_smartgateway_poll_refunds"
+
+REFUNDABLE_ORDER_STATUSES = ("Success",)
+PENDING_REFUND_STATUSES = ("PENDING", "MANUAL_REVIEW")
+FAILED_REFUND_STATUS = "FAILURE"
+
+# Refund row fields that change while HDFC processes a refund
+REFUND_STATE_FIELDS = ("id", "status", "ref", "error_code", "error_message")
+REFUND_ROW_FIELDS = ("name", "parent", "idx", "amount", *REFUND_STATE_FIELDS)
+ORDER_ROLLUP_FIELDS = (
+    "amount_refunded",
+    "refunded",
+    "posting_date",
+    "creation",
+    "company",
+    "order_status",
+    "mode_of_payment",
+    "gateway",
+)
+
+
+@frappe.whitelist()
+def create_refund(order_id, amount, unique_request_id=None):
+    frappe.has_permission("HDFC Order", "submit", order_id, throw=True)
+
+    result = refund_orders(
+        [
+            {
+                "order_id": order_id,
+                "amount": amount,
+                "unique_request_id": unique_request_id,
+            }
+        ]
+    )[0]
+    if result["status"] == "Failed":
+        frappe.throw(result["error"])
+    return result
+
+
+@frappe.whitelist()
+def create_refunds_bulk(refunds):
+    refunds = frappe.parse_json(refunds)
+    if not refunds:
+        frappe.throw("Refunds are required.")
+
+    for order_id in {refund.get("order_id") for refund in refunds}:
+        if order_id and frappe.db.exists("HDFC Order", order_id):
+            frappe.has_permission("HDFC Order", "submit", order_id, throw=True)
+    utils.get_cached_settings()
+
+    bulk_id = frappe.generate_hash(length=12)
+    _set_results(
+        bulk_id,
+        {
+            "status": "Queued",
+            "user": frappe.session.user,
+            "total": len(refunds),
+            "processed": 0,
+            "results": [],
+        },
+    )
+
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.refunds.create_refunds",
+        queue="long",
+        timeout=2 * 60 * 60,
+        job_id=f"hdfc_smartgateway_bulk_refunds::{bulk_id}",
+        bulk_id=bulk_id,
+        refunds=refunds,
+    )
+
+    return {"bulk_id": bulk_id}
+
+
+@frappe.whitelist()
+def get_bulk_refund_results(bulk_id):
+    bulk_results = frappe.cache().get_value(
+        f"{BULK_REFUND_RESULTS_KEY}::{bulk_id}", expires=True
+    )
+    # Results name the orders, so they are only shown to whoever queued them
+    if bulk_results and bulk_results.get("user") != frappe.session.user:
+        frappe.only_for("System Manager")
+
+    return bulk_results
+
+
+def create_refunds(bulk_id, refunds):
+    # A failing row is reported in its result and never aborts the batch
+    results = []
+    summary = {
+        "status": "Running",
+        "user": frappe.session.user,
+        "total": len(refunds),
+        "processed": 0,
+    }
+
+    try:
+        for chunk in create_batch(refunds, config.HDFC_REFUND_CHUNK_SIZE):
+            chunk_results = refund_orders(
+                chunk, priority=rate_limit.BACKGROUND, row_offset=summary["processed"]
+            )
+            results.extend(chunk_results)
+
+            summary["processed"] += len(chunk)
+            _set_results(bulk_id, {**summary, "results": results})
+            frappe.publish_realtime(
+                HDFC_BULK_REFUNDS_PROGRESS,
+                {"bulk_id": bulk_id, **summary, "results": chunk_results},
+                user=frappe.session.user,
+            )
+
+        summary["status"] = "Completed"
+    except Exception:
+        summary["status"] = "Failed"
+        frappe.log_error("HDFC bulk refund creation failed")
+        raise
+    finally:
+        _set_results(bulk_id, {**summary, "results": results})
+        frappe.publish_realtime(
+            HDFC_BULK_REFUNDS_PROGRESS,
+            {"bulk_id": bulk_id, **summary},
+            user=frappe.session.user,
+        )
+
+    return results
+
+
+def refund_orders(refunds, priority=rate_limit.INTERACTIVE, row_offset=0):
+    # Every refund is recorded and committed before it is sent, so a resend
+    # after a crash or timeout reuses its unique_request_id
+    results = [None] * len(refunds)
+    orders = _get_refundable_orders({refund.get("order_id") for refund in refunds})
+
+    prepared_refunds = []
+    for idx, refund in enumerate(refunds):
+        try:
+            order, refund_row = _prepare_refund(refund, orders)
+            prepared_refunds.append((row_offset + idx, order, refund_row))
+        except Exception as e:
+            results[idx] = _get_failed_result(row_offset + idx, refund, e)
+    frappe.clear_messages()
+
+    for _, _, refund_row in prepared_refunds:
+        # Rows already recorded for a repeated unique_request_id have a name
+        if not refund_row.name:
+            refund_row.db_insert()
+    frappe.db.commit()
+
+    for row, result in send_refunds(prepared_refunds, priority).items():
+        results[row - row_offset] = result
+    frappe.db.commit()
+
+    return results
+
+
+def send_refunds(prepared_refunds, priority=rate_limit.BACKGROUND):
+    # Requests are prepared here as worker threads have no site context
+    session_entry = client.get_session()
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=config.HDFC_REFUND_CONCURRENCY) as executor:
+        futures = {}
+        for row, order, refund_row in prepared_refunds:
+            future = executor.submit(
+                client.send_request,
+                session_entry,
+                "POST",
+                client.prepare_url(f"/orders/{order.name}/refunds"),
+                headers=client.prepare_headers(
+                    {"Content-Type": "application/x-www-form-urlencoded"},
+                    customer_id=order.customer,
+                ),
+                data=api.get_refund_request(
+                    refund_row.unique_request_id, refund_row.amount
+                ),
+                request_class="refund",
+                priority=priority,
+            )
+            futures[future] = (row, order, refund_row)
+
+        for future in as_completed(futures):
+            row, order, refund_row = futures[future]
+            result = {
+                "row": row,
+                "order_id": order.name,
+                "unique_request_id": refund_row.unique_request_id,
+            }
+            try:
+                status_res = future.result()
+            except requests.HTTPError as e:
+                if not _is_rejected(e.response):
+                    status_cache.clear_order_status(order.name)
+                    results[row] = _get_pending_result(result, e)
+                    continue
+
+                error = e.response.text or repr(e)
+                frappe.db.set_value(
+                    "HDFC Refunds",
+                    refund_row.name,
+                    {"status": FAILED_REFUND_STATUS, "error_message": error},
+                    update_modified=False,
+                )
+                results[row] = {**result, "status": "Failed", "error": error}
+            except Exception as e:
+                # HDFC may still have taken the refund
+                status_cache.clear_order_status(order.name)
+                results[row] = _get_pending_result(result, e)
+            else:
+                # A cached settled response would hide the refund until it
+                # expires
+                status_cache.set_order_status(order.name, status_res)
+                refund_status = apply_refunds(order.name, status_res).get(
+                    refund_row.unique_request_id
+                )
+                results[row] = {
+                    **result,
+                    "status": "Submitted",
+                    "refund_status": refund_status or refund_row.status,
+                }
+
+    return results
+
+
+def apply_refunds(order_id, status_res):
+    # Upserts the order's refund rows by unique_request_id and returns their
+    # statuses. Rows are written directly as the order is usually submitted.
+    to_system_datetime = get_system_datetime_converter()
+    refund_rows = {
+        row.unique_request_id: row
+        for row in frappe.get_all(
+            "HDFC Refunds",
+            filters={"parenttype": "HDFC Order", "parent": order_id},
+            fields=["unique_request_id", *REFUND_ROW_FIELDS],
+        )
+    }
+    last_idx = max((row.idx for row in refund_rows.values()), default=0)
+    refund_statuses = {}
+
+    for refund in status_res.get("refunds") or []:
+        refund_values = transformers.parse_refund(refund, to_system_datetime)
+        if isinstance(refund_values.get("metadata"), (dict, list)):
+            refund_values["metadata"] = frappe.as_json(refund_values["metadata"])
+        refund_statuses[refund_values["unique_request_id"]] = refund_values["status"]
+
+        refund_row = refund_rows.get(refund_values["unique_request_id"])
+        if not refund_row:
+            last_idx += 1
+            frappe.get_doc(
+                {
+                    "doctype": "HDFC Refunds",
+                    "parent": order_id,
+                    "parenttype": "HDFC Order",
+                    "parentfield": "refunds",
+                    "idx": last_idx,
+                    **refund_values,
+                }
+            ).db_insert()
+        elif any(
+            refund_row.get(field) != refund_values.get(field)
+            for field in REFUND_STATE_FIELDS
+        ):
+            frappe.db.set_value(
+                "HDFC Refunds", refund_row.name, refund_values, update_modified=False
+            )
+
+    if status_res.get("amount_refunded") is not None:
+        order = frappe.db.get_value(
+            "HDFC Order", order_id, ORDER_ROLLUP_FIELDS, as_dict=True
+        )
+        if flt(order.amount_refunded) != flt(status_res["amount_refunded"]) or bool(
+            order.refunded
+        ) != bool(status_res.get("refunded")):
+            frappe.db.set_value(
+                "HDFC Order",
+                order_id,
+                {
+                    "amount_refunded": status_res["amount_refunded"],
+                    "refunded": int(bool(status_res.get("refunded"))),
+                },
+            )
+            # set_value skips the order's hooks, which keep the rollup
+            hdfc_order_status_rollup.add_to_rollup(
+                hdfc_order_status_rollup.get_order_bucket(order),
+                amount_refunded=flt(status_res["amount_refunded"])
+                - flt(order.amount_refunded),
+            )
+
+    return refund_statuses
+
+
+def poll_pending_refunds():
+    if not utils.get_cached_settings(raise_if_disabled=False).enabled:
+        return
+
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.refunds.sync_pending_refunds",
+        queue="long",
+        job_id=REFUND_POLL_JOB_ID,
+        deduplicate=True,
+    )
+
+
+def sync_pending_refunds():
+    # Only orders with a pending refund are polled, found through the
+    # refund status index
+    summary = {"polled": 0, "updated": 0, "failed": 0, "resent": 0}
+    last_parent = None
+
+    while True:
+        if client.get_session()["breaker"].is_open():
+            return summary
+
+        filters = {
+            "parenttype": "HDFC Order",
+            "status": ["in", PENDING_REFUND_STATUSES],
+        }
+        if last_parent:
+            filters["parent"] = [">", last_parent]
+
+        order_ids = frappe.get_all(
+            "HDFC Refunds",
+            filters=filters,
+            fields=["parent"],
+            distinct=True,
+            order_by="parent asc",
+            limit=config.HDFC_REFUND_POLL_PAGE_SIZE,
+            pluck="parent",
+        )
+        if not order_ids:
+            break
+
+        orders = frappe.get_all(
+            "HDFC Order",
+            filters={"name": ["in", order_ids]},
+            fields=["name", "customer"],
+        )
+        page_summary = reconciliation.reconcile_orders(orders)
+        for key in page_summary:
+            summary[key] += page_summary[key]
+
+        last_parent = order_ids[-1]
+
+    summary["resent"] = resend_unacknowledged_refunds()
+    return summary
+
+
+def resend_unacknowledged_refunds():
+    # Refunds HDFC never returned an id for, sent again with the same
+    # unique_request_id
+    refund_rows = frappe.get_all(
+        "HDFC Refunds",
+        filters={
+            "parenttype": "HDFC Order",
+            "status": "PENDING",
+            "id": ["is", "not set"],
+            "creation": [
+                "<",
+                now_datetime() - timedelta(seconds=config.HDFC_REFUND_RESEND_AFTER),
+            ],
+        },
+        fields=["name", "parent", "unique_request_id", "amount", "status"],
+    )
+    if not refund_rows:
+        return 0
+
+    customers = dict(
+        frappe.get_all(
+            "HDFC Order",
+            filters={"name": ["in", list({row.parent for row in refund_rows})]},
+            fields=["name", "customer"],
+            as_list=True,
+        )
+    )
+
+    resent = 0
+    for chunk in create_batch(refund_rows, config.HDFC_REFUND_CHUNK_SIZE):
+        results = send_refunds(
+            [
+                (
+                    idx,
+                    frappe._dict(name=row.parent, customer=customers.get(row.parent)),
+                    row,
+                )
+                for idx, row in enumerate(chunk)
+            ]
+        )
+        resent += sum(result["status"] == "Submitted" for result in results.values())
+        frappe.db.commit()
+
+    return resent
+
+
+def generate_refund_request_id():
+    return "refund" + frappe.generate_hash(length=14)
+
+
+def _get_refundable_orders(order_ids):
+    # Orders and their refunds are read locked until the new refund rows are
+    # committed, so concurrent requests cannot both take the remaining amount
+    orders = {
+        order.name: order
+        for order in frappe.get_all(
+            "HDFC Order",
+            filters={"name": ["in", list(order_ids)]},
+            fields=["name", "customer", "order_status", "amount", "amount_refunded"],
+            order_by="name asc",
+            for_update=True,
+        )
+    }
+    refunded = dict.fromkeys(orders, 0)
+    for order in orders.values():
+        order.last_idx = 0
+        order.refund_rows = {}
+
+    for row in frappe.get_all(
+        "HDFC Refunds",
+        filters={"parenttype": "HDFC Order", "parent": ["in", list(orders)]},
+        fields=["unique_request_id", *REFUND_ROW_FIELDS],
+        for_update=True,
+    ):
+        order = orders[row.parent]
+        order.last_idx = max(order.last_idx, row.idx)
+        order.refund_rows[row.unique_request_id] = row
+        if row.status != FAILED_REFUND_STATUS:
+            refunded[row.parent] += flt(row.amount)
+
+    # Requested refunds count before HDFC adds them to amount_refunded
+    for order in orders.values():
+        order.refundable_amount = flt(order.amount) - max(
+            flt(order.amount_refunded), refunded[order.name]
+        )
+
+    return orders
+
+
+def _prepare_refund(refund, orders):
+    order_id = refund.get("order_id")
+    order = orders.get(order_id)
+    if not order:
+        frappe.throw(f"HDFC Order {order_id} not found.")
+
+    unique_request_id = refund.get("unique_request_id")
+    if unique_request_id in order.refund_rows:
+        # Already requested, sending it again is idempotent
+        return order, order.refund_rows[unique_request_id]
+
+    if order.order_status not in REFUNDABLE_ORDER_STATUSES:
+        frappe.throw(f"HDFC Order {order_id} is not paid, it cannot be refunded.")
+
+    amount = flt(refund.get("amount"), 2)
+    if amount <= 0:
+        frappe.throw("Refund amount should be greater than zero.")
+    if amount - order.refundable_amount > 0.005:
+        frappe.throw(
+            f"Refund amount {amount} exceeds the refundable amount "
+            f"{order.refundable_amount} of HDFC Order {order_id}."
+        )
+
+    order.refundable_amount -= amount
+    order.last_idx += 1
+    refund_row = frappe.get_doc(
+        {
+            "doctype": "HDFC Refunds",
+            "parent": order_id,
+            "parenttype": "HDFC Order",
+            "parentfield": "refunds",
+            "idx": order.last_idx,
+            "unique_request_id": unique_request_id or generate_refund_request_id(),
+            "amount": amount,
+            "status": "PENDING",
+            "initiated_by": frappe.session.user,
+        }
+    )
+    order.refund_rows[refund_row.unique_request_id] = refund_row
+    return order, refund_row
+
+
+def _is_rejected(res):
+    # Client errors other than throttling will not succeed on a resend
+    return res is not None and 400 <= res.status_code < 500 and res.status_code != 429
+
+
+def _get_pending_result(result, error):
+    # Left pending, the poller resends it with the same unique_request_id
+    return {**result, "status": "Pending", "error": str(error) or repr(error)}
+
+
+def _get_failed_result(row, refund, error):
+    return {
+        "row": row,
+        "order_id": refund.get("order_id"),
+        "status": "Failed",
+        "error": str(error) or repr(error),
+    }
+
+
+def _set_results(bulk_id, bulk_results):
+    frappe.cache().set_value(
+        f"{BULK_REFUND_RESULTS_KEY}::{bulk_id}",
+        bulk_results,
+        expires_in_sec=config.HDFC_REFUND_RESULT_TTL,
+    )
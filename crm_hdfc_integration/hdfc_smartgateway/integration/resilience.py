@@ -0,0 +1,154 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import frappe
+import requests
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import metrics
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+CIRCUIT_BREAKER_KEY = "hdfc_smartgateway_circuit_breaker"
+
+
+class SmartGatewayUnavailable(frappe.ValidationError):
+    http_status_code = 503
+
+
+class CircuitBreaker:
+    # State is kept in Redis so every worker shares it. Keys are built here
+    # as worker threads have no site context to build them.
+    def __init__(self, failure_threshold, reset_timeout, failure_window):
+        self.redis = frappe.cache()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_window = failure_window
+
+        self.open_key = self.redis.make_key(f"{CIRCUIT_BREAKER_KEY}::open")
+        self.tripped_key = self.redis.make_key(f"{CIRCUIT_BREAKER_KEY}::tripped")
+        self.failures_key = self.redis.make_key(f"{CIRCUIT_BREAKER_KEY}::failures")
+        self.probe_key = self.redis.make_key(f"{CIRCUIT_BREAKER_KEY}::probe")
+
+    def is_open(self):
+        return bool(self.redis.get(self.open_key))
+
+    def before_request(self):
+        # Returns whether a success has to reset any breaker state
+        opened, tripped, failures = self.redis.mget(
+            self.open_key, self.tripped_key, self.failures_key
+        )
+        if opened:
+            raise SmartGatewayUnavailable(
+                "HDFC SmartGateway is unavailable, please try again shortly."
+            )
+
+        # Half open, a single trial request is let through
+        if tripped and not self.redis.set(
+            self.probe_key, 1, nx=True, ex=self.reset_timeout
+        ):
+            raise SmartGatewayUnavailable(
+                "HDFC SmartGateway is unavailable, please try again shortly."
+            )
+
+        return bool(tripped or failures)
+
+    def record_success(self, has_state):
+        if has_state:
+            self.redis.delete(self.tripped_key, self.failures_key, self.probe_key)
+
+    def record_failure(self):
+        pipeline = self.redis.pipeline()
+        pipeline.incr(self.failures_key)
+        pipeline.expire(self.failures_key, self.failure_window)
+        pipeline.get(self.tripped_key)
+        failures, _, tripped = pipeline.execute()
+
+        if tripped or failures >= self.failure_threshold:
+            pipeline = self.redis.pipeline()
+            pipeline.set(self.open_key, 1, ex=self.reset_timeout)
+            pipeline.set(self.tripped_key, 1)
+            pipeline.delete(self.failures_key, self.probe_key)
+            pipeline.execute()
+
+
+def get_circuit_breaker(connection_settings):
+    return CircuitBreaker(
+        connection_settings["breaker_failure_threshold"],
+        connection_settings["breaker_reset_timeout"],
+        config.HDFC_BREAKER_FAILURE_WINDOW,
+    )
+
+
+def send(
+    session_entry, method, url, request_class=None, priority=None, **request_kwargs
+):
+    # Status reads are retried with jittered exponential backoff; session
+    # creation and other writes are sent once as they are not idempotent
+    breaker = session_entry["breaker"]
+    timeout = session_entry["timeouts"].get(request_class, session_entry["timeout"])
+    retries = session_entry["max_retries"] if method in IDEMPOTENT_METHODS else 0
+    # Requests may be sent from worker threads, which have no site context
+    labels = {"site": session_entry["site"], "request_class": request_class or ""}
+    attempt = 0
+
+    while True:
+        if attempt:
+            metrics.inc("hdfc_http_retries_total", **labels)
+
+        has_state = breaker.before_request()
+        session_entry["rate_limiter"].acquire(request_class, priority)
+        started = time.perf_counter()
+        try:
+            res = session_entry["session"].request(
+                method, url, timeout=timeout, **request_kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.observe(
+                "hdfc_http_request_seconds", time.perf_counter() - started, **labels
+            )
+            metrics.inc("hdfc_http_requests_total", status=type(e).__name__, **labels)
+            breaker.record_failure()
+            if attempt >= retries:
+                raise
+            delay = get_backoff(session_entry["retry_backoff"], attempt)
+        else:
+            metrics.observe(
+                "hdfc_http_request_seconds", time.perf_counter() - started, **labels
+            )
+            metrics.inc("hdfc_http_requests_total", status=res.status_code, **labels)
+            if res.status_code not in RETRY_STATUS_CODES:
+                breaker.record_success(has_state)
+                res.raise_for_status()
+                return res
+
+            breaker.record_failure()
+            if attempt >= retries:
+                res.raise_for_status()
+            delay = get_retry_after(res)
+            if delay is None:
+                delay = get_backoff(session_entry["retry_backoff"], attempt)
+
+        time.sleep(min(delay, config.HDFC_HTTP_RETRY_MAX_DELAY))
+        attempt += 1
+
+
+def get_backoff(base_delay, attempt):
+    # Full jitter
+    return random.uniform(0, base_delay * 2**attempt)
+
+
+def get_retry_after(res):
+    retry_after = res.headers.get("Retry-After")
+    if not retry_after:
+        return None
+
+    if retry_after.isdigit():
+        return int(retry_after)
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
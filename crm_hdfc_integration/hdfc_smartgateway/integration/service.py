@@ -1,8 +1,38 @@
+import time
+
 import frappe
 from frappe.auth import LoginManager
-from crm_hdfc_integration.hdfc_smartgateway.integration import utils, api, transformers
+from frappe.model.document import Document
+from frappe.utils.password import get_decrypted_password
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    utils,
+    api,
+    auth,
+    metrics,
+    refunds,
+    resilience,
+    signature,
+    status_cache,
+    transformers,
+)
+from crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order_status_logs import (
+    hdfc_order_status_logs,
+)
 from urllib.parse import quote, urlencode
 
+ORDER_STATUS_CHANNEL = "hdfc_smartgateway_order_status"
+
+# Columns a status sync reads before deciding whether the order changed
+ORDER_SYNC_FIELDS = (
+    "name",
+    "owner",
+    "customer",
+    "order_status",
+    "hdfc_status",
+    "status_fingerprint",
+)
+
 
 def generate_order_id():
     return utils.generate_order_id()
@@ -16,9 +46,7 @@ def create_order_session(
     description=None,
     user_defined_parameters=None,
 ):
-    page_client_id = frappe.db.get_single_value(
-        "HDFC SmartGateway Settings", "api_base_uri"
-    )
+    page_client_id = utils.get_cached_settings().client_id
 
     if not order_id:
         order_id = generate_order_id()
@@ -38,16 +66,44 @@ def create_order_session(
     return session_data
 
 
+def get_order_session_request(
+    amount,
+    customer_details,
+    order_id,
+    currency=None,
+    description=None,
+    user_defined_parameters=None,
+):
+    # Request body of create_order_session, for callers sending it themselves
+    return api.get_order_session_request(
+        order_id,
+        amount,
+        customer_details,
+        utils.get_return_url(),
+        utils.get_cached_settings().client_id,
+        currency=currency,
+        description=description,
+        user_defined_parameters=user_defined_parameters,
+    )
+
+
 @frappe.whitelist(allow_guest=True)
 def verify_order():
     frappe.form_dict.pop("cmd")
     signature_algorithm = frappe.form_dict.pop("signature_algorithm")
-    signature = frappe.form_dict.pop("signature")
+    payload_signature = frappe.form_dict.pop("signature")
 
     order_id = frappe.form_dict.get("order_id")
-    order_doc = frappe.get_doc("HDFC Order", order_id)
+    order_doc = frappe.db.get_value(
+        "HDFC Order",
+        order_id,
+        ["owner", "order_status", "success_url", "failed_url"],
+        as_dict=True,
+    )
+    if not order_doc:
+        frappe.throw("No Order Found.")
 
-    if not (signature_algorithm or signature):
+    if not (signature_algorithm or payload_signature):
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = "/login?" + urlencode(
             {"redirect-to": order_doc.failed_url}, quote_via=quote
@@ -62,10 +118,8 @@ def verify_order():
         )
         frappe.throw(f"algorithm: {signature_algorithm} is not currently supported")
 
-    gateway_settings = utils.get_smartgateway_settings()
-
-    is_valid_payload = utils.verify_hmac_signature(
-        signature, frappe.form_dict, gateway_settings.response_key
+    is_valid_payload = signature.verify_signature(
+        payload_signature, frappe.form_dict, auth.get_response_key()
     )
     if not is_valid_payload:
         frappe.throw("Unathorized, Signature verification failed.")
@@ -74,13 +128,21 @@ def verify_order():
         frappe.form_dict.get("status_id")
     )
 
+    # The payer is redirected right away, the signed status only tells
+    # whether the order needs a sync. Enqueued at once, this GET request
+    # writes nothing the job waits for and is not committed.
     if new_status and order_doc.order_status != new_status:
-        _sync_order_status(order_id)
+        enqueue_order_sync(order_id)
 
-    # FIXME: Assuming owner of hdfc order will be the payer
-    # The following workaround is done as user session is lost
-    # in hdfc return url
-    user_session_id = utils.get_user_active_sid(order_doc.owner)
+    # The payer's session is lost in the hdfc return url, so the one stored
+    # at order creation is resumed. Orders without one fall back to the
+    # latest active session of the owner, assuming the owner is the payer.
+    user_session_id = get_decrypted_password(
+        "HDFC Order", order_id, "payer_sid", raise_exception=False
+    )
+    if not utils.is_session_active(user_session_id):
+        # The stored session expired or was logged out meanwhile
+        user_session_id = utils.get_user_active_sid(order_doc.owner)
     redirect_url = order_doc.success_url or frappe.utils.get_url()
 
     frappe.local.form_dict.sid = user_session_id
@@ -90,9 +152,45 @@ def verify_order():
     frappe.local.response["location"] = redirect_url
 
 
+def enqueue_order_sync(order_id):
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.service.sync_order_status_job",
+        queue="short",
+        job_id=f"hdfc_smartgateway_sync_order::{order_id}",
+        deduplicate=True,
+        order_id=order_id,
+    )
+
+
+def sync_order_status_job(order_id):
+    try:
+        _sync_order_status(order_id)
+    except resilience.SmartGatewayUnavailable:
+        # Webhooks and reconciliation bring the order up to date later
+        pass
+
+
 @frappe.whitelist()
-def sync_order_status(order_id, status=None):
-    order_doc = _sync_order_status(order_id)
+def sync_order_status(order_id, status=None, use_cache=True):
+    try:
+        order_doc = _sync_order_status(
+            order_id, use_cache=frappe.utils.sbool(use_cache)
+        )
+    except resilience.SmartGatewayUnavailable:
+        # HDFC is failing, answer with the stored order state
+        order_doc = None
+
+    if not isinstance(order_doc, Document):
+        # The stored status did not change, compare against it before loading
+        # the whole order
+        order_status = (
+            order_doc.order_status
+            if order_doc
+            else frappe.db.get_value("HDFC Order", order_id, "order_status")
+        )
+        if status is not None and order_status == status:
+            return None
+        order_doc = frappe.get_doc("HDFC Order", order_id)
 
     if status is None or order_doc.order_status != status:
         return order_doc.as_dict(convert_dates_to_str=True)
@@ -100,43 +198,149 @@ def sync_order_status(order_id, status=None):
     return None
 
 
-def _sync_order_status(order_id=None, status_res=None):
-    order_doc = None
+# Returns None, without loading the order, when the response matches the
+# status fingerprint already stored on it. The order is only loaded in full
+# when its HDFC status changes, otherwise its synced columns are returned.
+@metrics.timed("sync_order_status")
+def _sync_order_status(order_id=None, status_res=None, log_status=None, use_cache=True):
     if not status_res:
         if not order_id:
             frappe.throw("Order id is required.")
 
-        order_doc = frappe.get_doc("HDFC Order", order_id)
-
-        status_res = api.get_order_status(order_id, order_doc.customer)
+        order = frappe.db.get_value(
+            "HDFC Order", order_id, ORDER_SYNC_FIELDS, as_dict=True
+        )
+        if not order:
+            frappe.throw("No Order Found.")
 
-        # Maintain Order Status Response log
-        frappe.get_doc(
-            {
-                "doctype": "HDFC Order Status Logs",
-                "order": order_id,
-                "response": status_res,
-            }
-        ).save(ignore_permissions=True)
+        status_res = api.get_order_status(order_id, order.customer, use_cache=use_cache)
+        if log_status is None:
+            log_status = True
     else:
-        order_doc = frappe.get_doc("HDFC Order", status_res.get("order_id"))
+        order_id = status_res.get("order_id")
+        order = frappe.db.get_value(
+            "HDFC Order", order_id, ORDER_SYNC_FIELDS, as_dict=True
+        )
+        if not order:
+            frappe.throw("No Order Found.")
 
-    if not order_doc:
-        frappe.throw("No Order Found.")
+        # Pushed and reconciled responses are newer than any cached one
+        status_cache.set_order_status(order_id, status_res)
+
+    fingerprint = transformers.get_status_fingerprint(status_res)
+    if fingerprint == order.status_fingerprint:
+        return None
+
+    if log_status:
+        log_order_status(order_id, status_res)
 
-    status_data, _ = transformers.parse_order_status_res(status_res)
+    status_data = transformers.peek_order_status_res(status_res)
 
     if (
         status_data.get("hdfc_status")
-        and order_doc.hdfc_status != status_data["hdfc_status"]
+        and order.hdfc_status != status_data["hdfc_status"]
     ):
+        order_doc = frappe.get_doc("HDFC Order", order_id)
+        status_data, _ = transformers.parse_order_status_res(status_res)
+        # Refund rows are upserted below, keeping the ones not yet sent
+        status_data.pop("refunds", None)
+        metrics.inc(
+            "hdfc_order_status_transitions_total",
+            from_status=order_doc.order_status,
+            to_status=status_data["order_status"],
+        )
         order_doc.update(status_data)
+        order_doc.status_fingerprint = fingerprint
         order_doc = order_doc.save(ignore_permissions=True)
+        frappe.db.after_commit.add(
+            lambda: publish_order_status(order_id, status_data["order_status"])
+        )
 
         if status_data["order_status"] == "Success":
             frappe.set_user("Administrator")
             order_doc.docstatus = 1
             order_doc._action = "submit"
             order_doc = order_doc.save(ignore_permissions=True)
+    else:
+        frappe.db.set_value(
+            "HDFC Order",
+            order_id,
+            "status_fingerprint",
+            fingerprint,
+            update_modified=False,
+        )
+        order_doc = order
+
+    refunds.apply_refunds(order_id, status_res)
 
     return order_doc
+
+
+@frappe.whitelist()
+def wait_for_order_status(order_id, current_status=None, timeout=None):
+    # Blocks until the order leaves current_status or the timeout passes,
+    # replacing client side polling of sync_order_status
+    order = frappe.db.get_value(
+        "HDFC Order", order_id, ["owner", "order_status"], as_dict=True
+    )
+    if not order:
+        frappe.throw("No Order Found.")
+    if order.owner != frappe.session.user:
+        frappe.has_permission("HDFC Order", "read", order_id, throw=True)
+
+    if order.order_status != current_status:
+        return {"order_id": order_id, "order_status": order.order_status}
+
+    max_timeout = utils.get_cached_settings(
+        raise_if_disabled=False
+    ).order_status_wait_timeout
+    if max_timeout is None:
+        max_timeout = config.HDFC_ORDER_STATUS_WAIT_TIMEOUT
+    max_timeout = min(max_timeout, config.HDFC_MAX_ORDER_STATUS_WAIT_TIMEOUT)
+    timeout = min(frappe.utils.flt(timeout) or max_timeout, max_timeout)
+    if timeout <= 0:
+        return None
+    deadline = time.monotonic() + timeout
+
+    pubsub = frappe.cache().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(_get_order_status_channel(order_id))
+    try:
+        # Subscribed first, so a change committed meanwhile is not missed.
+        # The rollback ends the read snapshot of this request's transaction.
+        while True:
+            frappe.db.rollback()
+            order_status = frappe.db.get_value("HDFC Order", order_id, "order_status")
+            if order_status != current_status:
+                return {"order_id": order_id, "order_status": order_status}
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            pubsub.get_message(timeout=remaining)
+    finally:
+        pubsub.close()
+
+
+def publish_order_status(order_id, order_status):
+    # Runs after commit, but may have been registered inside a savepoint that
+    # was rolled back, so only the stored status is published
+    if frappe.db.get_value("HDFC Order", order_id, "order_status") != order_status:
+        return
+
+    frappe.cache().publish(
+        _get_order_status_channel(order_id),
+        frappe.as_json({"order_id": order_id, "order_status": order_status}),
+    )
+
+
+def _get_order_status_channel(order_id):
+    return frappe.cache().make_key(f"{ORDER_STATUS_CHANNEL}::{order_id}")
+
+
+def log_order_status(order_id, status_res):
+    # Maintain Order Status Response log
+    hdfc_order_status_logs.log_order_status(
+        order_id,
+        status_res,
+        storage_format=utils.get_cached_settings().status_log_storage or "Full",
+    )
@@ -0,0 +1,341 @@
+import csv
+from itertools import islice
+
+import frappe
+from frappe.utils import flt, get_datetime, now_datetime
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    reconciliation,
+    transformers,
+)
+
+HDFC_SETTLEMENT_RECONCILED = "HDFC_SETTLEMENT_RECONCILED"
+SETTLED_ORDER_STATUSES = ("Success", "Auto Refunded")
+
+# Accepted header names per settlement column, compared lower cased with
+# spaces as underscores
+SETTLEMENT_COLUMNS = {
+    "order_id": ("order_id", "merchant_order_id", "order_no"),
+    "txn_id": ("txn_id", "transaction_id", "juspay_txn_id"),
+    "amount": ("amount", "txn_amount", "order_amount", "gross_amount"),
+    "status": ("status", "txn_status", "order_status"),
+    "refund_amount": ("refund_amount", "amount_refunded", "refunded_amount"),
+}
+
+# Settlement statuses that are not HDFC order statuses
+SETTLEMENT_STATUS_MAP = {
+    "SUCCESS": "Success",
+    "SETTLED": "Success",
+    "CAPTURED": "Success",
+    "REFUNDED": "Success",
+    "FAILED": "Failed",
+    "FAILURE": "Failed",
+}
+
+ORDER_FIELDS = (
+    "name",
+    "customer",
+    "txn_id",
+    "amount",
+    "order_status",
+    "amount_refunded",
+)
+REPORT_HEADER = (
+    "order_id",
+    "issue",
+    "file_value",
+    "order_value",
+)
+
+
+@frappe.whitelist()
+def reconcile_settlement_file(
+    file_url, from_date=None, to_date=None, sync_mismatched=0
+):
+    frappe.has_permission("HDFC Order", "write", throw=True)
+    file_doc = frappe.get_doc("File", {"file_url": file_url})
+    frappe.has_permission("File", "read", doc=file_doc, throw=True)
+
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.settlement.run_settlement_reconciliation",
+        queue="long",
+        timeout=2 * 60 * 60,
+        file_url=file_url,
+        from_date=from_date,
+        to_date=to_date,
+        sync_mismatched=frappe.utils.cint(sync_mismatched),
+    )
+
+
+def run_settlement_reconciliation(
+    file_url, from_date=None, to_date=None, sync_mismatched=False
+):
+    file_path = frappe.get_doc("File", {"file_url": file_url}).get_full_path()
+    settlement_file = build_settlement_index(file_path)
+    settlement_index = settlement_file.orders
+    txn_index = settlement_file.txn_ids
+
+    report_name = f"hdfc_settlement_report_{now_datetime():%Y%m%d%H%M%S}.csv"
+    report_path = frappe.get_site_path("private", "files", report_name)
+    summary = {
+        "file_rows": settlement_file.rows,
+        "short_rows": len(settlement_file.short_rows),
+        "conflicting_rows": len(settlement_file.conflicts),
+        "matched": 0,
+        "mismatched": 0,
+        "missing_in_erp": 0,
+        "missing_in_file": 0,
+        "synced": None,
+    }
+    mismatched_orders = {}
+
+    def report_order(settlement_row, order):
+        issues = compare_order(settlement_row, order)
+        if not issues:
+            summary["matched"] += 1
+            return
+
+        summary["mismatched"] += 1
+        mismatched_orders[order.name] = order
+        report.writerows((order.name, *issue) for issue in issues)
+
+    with open(report_path, "w", newline="") as f:
+        report = csv.writer(f)
+        report.writerow(REPORT_HEADER)
+
+        for line_num in settlement_file.short_rows:
+            report.writerow(("", "Short row", f"line {line_num}", ""))
+        for key, field, value, other_value in settlement_file.conflicts:
+            report.writerow(
+                (key, f"Conflicting {field} in file", f"{value} / {other_value}", "")
+            )
+
+        for order_ids in _iter_chunks(
+            settlement_index, config.HDFC_SETTLEMENT_CHUNK_SIZE
+        ):
+            orders = {
+                order.name: order
+                for order in frappe.get_all(
+                    "HDFC Order",
+                    filters={"name": ["in", order_ids]},
+                    fields=ORDER_FIELDS,
+                )
+            }
+
+            for order_id in order_ids:
+                order = orders.get(order_id)
+                if not order:
+                    summary["missing_in_erp"] += 1
+                    report.writerow((order_id, "Missing in ERP", "", ""))
+                    continue
+                report_order(settlement_index[order_id], order)
+
+        # Rows with only a transaction id are matched through it
+        for txn_ids in _iter_chunks(txn_index, config.HDFC_SETTLEMENT_CHUNK_SIZE):
+            orders = {
+                order.txn_id: order
+                for order in frappe.get_all(
+                    "HDFC Order",
+                    filters={"txn_id": ["in", txn_ids]},
+                    fields=ORDER_FIELDS,
+                )
+            }
+
+            for txn_id in txn_ids:
+                order = orders.get(txn_id)
+                if not order:
+                    summary["missing_in_erp"] += 1
+                    report.writerow(("", "Missing in ERP", txn_id, ""))
+                    continue
+                if order.name in settlement_index:
+                    # Also listed by its order id
+                    continue
+                settlement_index[order.name] = txn_index[txn_id]
+                report_order(txn_index[txn_id], order)
+
+        if from_date and to_date:
+            for order_id in _get_orders_missing_in_file(
+                settlement_index, from_date, to_date
+            ):
+                summary["missing_in_file"] += 1
+                report.writerow((order_id, "Missing in settlement file", "", ""))
+
+    report_file = frappe.get_doc(
+        {
+            "doctype": "File",
+            "file_name": report_name,
+            "file_url": f"/private/files/{report_name}",
+            "is_private": 1,
+        }
+    ).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    if sync_mismatched and mismatched_orders:
+        summary["synced"] = reconciliation.reconcile_orders(
+            list(mismatched_orders.values())
+        )
+
+    summary["report_url"] = report_file.file_url
+    frappe.publish_realtime(
+        HDFC_SETTLEMENT_RECONCILED, summary, user=frappe.session.user
+    )
+    return summary
+
+
+def build_settlement_index(file_path):
+    # order id -> (txn_id, amount, status, refund_amount), amounts as floats
+    # and statuses as system order statuses so comparisons stay cheap. Rows
+    # without an order id are indexed by txn id, rows missing columns are
+    # returned by line number. Amounts of an order's rows, e.g. a sale and
+    # its refunds, are added up; rows disagreeing on txn id or status are
+    # returned as conflicts.
+    settlement_index = {}
+    txn_index = {}
+    short_rows = []
+    conflicts = []
+    row_count = 0
+
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        columns = _get_column_positions(next(reader, []))
+        row_length = max(columns.values()) + 1
+
+        order_id_col = columns.get("order_id")
+        txn_id_col = columns.get("txn_id")
+        amount_col = columns.get("amount")
+        status_col = columns.get("status")
+        refund_col = columns.get("refund_amount")
+
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            row_count += 1
+            if len(row) < row_length:
+                short_rows.append(reader.line_num)
+                continue
+
+            order_id = row[order_id_col].strip() if order_id_col is not None else ""
+            txn_id = row[txn_id_col].strip() if txn_id_col is not None else None
+            settlement_row = (
+                txn_id,
+                flt(row[amount_col]) if amount_col is not None else None,
+                _get_order_status(row[status_col]) if status_col is not None else None,
+                flt(row[refund_col]) if refund_col is not None else None,
+            )
+            if order_id:
+                _add_row(settlement_index, order_id, settlement_row, conflicts)
+            elif txn_id:
+                _add_row(txn_index, txn_id, settlement_row, conflicts)
+
+    return frappe._dict(
+        orders=settlement_index,
+        txn_ids=txn_index,
+        short_rows=short_rows,
+        conflicts=conflicts,
+        rows=row_count,
+    )
+
+
+def _add_row(index, key, settlement_row, conflicts):
+    existing = index.get(key)
+    if not existing:
+        index[key] = settlement_row
+        return
+
+    txn_id, amount, status, refund_amount = existing
+    row_txn_id, row_amount, row_status, row_refund_amount = settlement_row
+    if txn_id and row_txn_id and txn_id != row_txn_id:
+        conflicts.append((key, "Transaction Id", txn_id, row_txn_id))
+    if status and row_status and status != row_status:
+        conflicts.append((key, "Status", status, row_status))
+
+    index[key] = (
+        txn_id or row_txn_id,
+        _add_amounts(amount, row_amount),
+        status or row_status,
+        _add_amounts(refund_amount, row_refund_amount),
+    )
+
+
+def _add_amounts(amount, other_amount):
+    if amount is None:
+        return other_amount
+    if other_amount is None:
+        return amount
+    return amount + other_amount
+
+
+def compare_order(settlement_row, order):
+    txn_id, amount, status, refund_amount = settlement_row
+    issues = []
+
+    if txn_id and txn_id != order.txn_id:
+        issues.append(("Transaction Id", txn_id, order.txn_id))
+    if amount is not None and abs(amount - flt(order.amount)) > 0.005:
+        issues.append(("Amount", amount, order.amount))
+    if status and status != order.order_status:
+        issues.append(("Status", status, order.order_status))
+    if (
+        refund_amount is not None
+        and abs(refund_amount - flt(order.amount_refunded)) > 0.005
+    ):
+        issues.append(("Refund Amount", refund_amount, order.amount_refunded))
+
+    return issues
+
+
+def _get_orders_missing_in_file(settlement_index, from_date, to_date):
+    # Settled orders of the period, paged by name
+    if len(str(to_date)) == 10:
+        # A plain date includes the whole day
+        to_date = f"{to_date} 23:59:59.999999"
+
+    last_name = None
+    filters = [
+        ["order_status", "in", SETTLED_ORDER_STATUSES],
+        ["txn_date", ">=", get_datetime(from_date)],
+        ["txn_date", "<=", get_datetime(to_date)],
+    ]
+
+    while True:
+        page_filters = filters + [["name", ">", last_name]] if last_name else filters
+        names = frappe.get_all(
+            "HDFC Order",
+            filters=page_filters,
+            pluck="name",
+            order_by="name asc",
+            limit=config.HDFC_SETTLEMENT_CHUNK_SIZE,
+        )
+        if not names:
+            break
+
+        for name in names:
+            if name not in settlement_index:
+                yield name
+        last_name = names[-1]
+
+
+def _get_column_positions(header):
+    normalized = [column.strip().lower().replace(" ", "_") for column in header]
+    positions = {}
+    for column, aliases in SETTLEMENT_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[column] = normalized.index(alias)
+                break
+
+    if "order_id" not in positions and "txn_id" not in positions:
+        frappe.throw("Settlement file has no order id or transaction id column.")
+    return positions
+
+
+def _get_order_status(settlement_status):
+    status = settlement_status.strip().upper()
+    return SETTLEMENT_STATUS_MAP.get(status) or transformers.HDFC_STATUS_MAP.get(status)
+
+
+def _iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,102 @@
+import binascii
+import hmac
+import threading
+from base64 import b64decode, b64encode
+from hashlib import sha256
+from string import ascii_letters, digits
+from urllib.parse import quote_plus
+
+# Per worker HMAC objects keyed by response key. Each message is signed on
+# a copy, so the key schedule is computed once per key.
+_prepared = {}
+_prepared_lock = threading.Lock()
+MAX_PREPARED_KEYS = 16
+
+# Characters quote_plus leaves as they are
+UNRESERVED_CHARACTERS = ascii_letters + digits + "_.-~"
+
+
+def get_signature(params, key):
+    mac = _get_prepared(key).copy()
+    mac.update(get_signature_string(params).encode("utf-8"))
+    return b64encode(mac.digest()).decode()
+
+
+def verify_signature(signature, params, key):
+    expected = _decode_signature(signature)
+    if expected is None:
+        return False
+
+    mac = _get_prepared(key).copy()
+    mac.update(get_signature_string(params).encode("utf-8"))
+    return hmac.compare_digest(mac.digest(), expected)
+
+
+def verify_signatures(callbacks, key):
+    # callbacks are (signature, params) pairs, results keep their order
+    prepared = _get_prepared(key)
+    results = []
+
+    for signature, params in callbacks:
+        expected = _decode_signature(signature)
+        if expected is None:
+            results.append(False)
+            continue
+
+        mac = prepared.copy()
+        mac.update(get_signature_string(params).encode("utf-8"))
+        results.append(hmac.compare_digest(mac.digest(), expected))
+
+    return results
+
+
+def verify_body_signature(signature, body, key):
+    # Webhooks are signed over the raw request body
+    expected = _decode_signature(signature)
+    if expected is None:
+        return False
+
+    mac = _get_prepared(key).copy()
+    mac.update(body)
+    return hmac.compare_digest(mac.digest(), expected)
+
+
+def get_signature_string(params):
+    # HDFC signs the url encoded "name=value" pairs, sorted by name and joined
+    # with "&", url encoded once more. Encoding each part twice and joining
+    # with the encoded separators gives the same string in one pass.
+    return "%26".join(
+        _encode(name) + "%3D" + _encode(params[name]) for name in sorted(params)
+    )
+
+
+def _encode(value):
+    # Ids, statuses and amounts need no encoding
+    if not value.strip(UNRESERVED_CHARACTERS):
+        return value
+    # quote_plus twice: the second pass only changes "%" and "+" from the first
+    return quote_plus(value).replace("%", "%25").replace("+", "%2B")
+
+
+def _decode_signature(signature):
+    if not signature:
+        return None
+    try:
+        return b64decode(signature, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _get_prepared(key):
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+
+    prepared = _prepared.get(key)
+    if prepared:
+        return prepared
+
+    with _prepared_lock:
+        if len(_prepared) >= MAX_PREPARED_KEYS:
+            _prepared.clear()
+        prepared = _prepared[key] = hmac.new(key, digestmod=sha256)
+    return prepared
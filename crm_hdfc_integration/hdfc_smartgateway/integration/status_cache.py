@@ -0,0 +1,74 @@
+import time
+
+import frappe
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import transformers, utils
+
+ORDER_STATUS_CACHE_KEY = "hdfc_smartgateway_order_status"
+TERMINAL_ORDER_STATUSES = (
+    "Success",
+    "Failed",
+    "Card Payment Failed",
+    "Cancelled",
+    "Auto Refunded",
+)
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_order_status(order_id, fetch):
+    # Concurrent callers for the same order share a single upstream request:
+    # the one holding the lock fetches, the others wait for its response
+    cache = frappe.cache()
+    cache_key = f"{ORDER_STATUS_CACHE_KEY}::{order_id}"
+    lock_key = cache.make_key(f"{cache_key}::lock")
+    deadline = time.monotonic() + config.HDFC_STATUS_FETCH_LOCK_TIMEOUT
+
+    while True:
+        status_res = cache.get_value(cache_key, expires=True)
+        if status_res:
+            return status_res
+
+        if cache.set(lock_key, 1, nx=True, ex=config.HDFC_STATUS_FETCH_LOCK_TIMEOUT):
+            try:
+                status_res = fetch()
+                set_order_status(order_id, status_res)
+                return status_res
+            finally:
+                cache.delete(lock_key)
+
+        if time.monotonic() > deadline:
+            return fetch()
+        time.sleep(LOCK_POLL_INTERVAL)
+
+
+def set_order_status(order_id, status_res):
+    settings = utils.get_cached_settings()
+    cache_key = f"{ORDER_STATUS_CACHE_KEY}::{order_id}"
+
+    if (
+        transformers.HDFC_STATUS_ID_MAP.get(status_res.get("status_id"))
+        in TERMINAL_ORDER_STATUSES
+    ):
+        ttl = settings.terminal_status_cache_ttl
+        if ttl is None:
+            ttl = config.HDFC_TERMINAL_STATUS_CACHE_TTL
+        # Capped, a refund of a settled order only shows in a live response
+        ttl = min(
+            ttl or config.HDFC_MAX_TERMINAL_STATUS_CACHE_TTL,
+            config.HDFC_MAX_TERMINAL_STATUS_CACHE_TTL,
+        )
+        frappe.cache().set_value(cache_key, status_res, expires_in_sec=ttl)
+        return
+
+    ttl = settings.status_cache_ttl
+    if ttl is None:
+        ttl = config.HDFC_STATUS_CACHE_TTL
+    if ttl:
+        frappe.cache().set_value(cache_key, status_res, expires_in_sec=ttl)
+    else:
+        frappe.cache().delete_value(cache_key)
+
+
+def clear_order_status(order_id):
+    frappe.cache().delete_value(f"{ORDER_STATUS_CACHE_KEY}::{order_id}")
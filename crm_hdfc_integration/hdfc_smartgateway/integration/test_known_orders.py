@@ -0,0 +1,61 @@
+# Copyright (c) 2026, OneHash and Contributors
+# See license.txt
+
+from hashlib import blake2b
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import known_orders
+
+
+class TestKnownOrders(FrappeTestCase):
+	def setUp(self):
+		# Tests start from an empty filter, a cleared filter is rebuilt on its
+		# next lookup
+		self.filter_key = frappe.cache().make_key(known_orders.KNOWN_ORDERS_KEY)
+		frappe.cache().delete(self.filter_key)
+		self.addCleanup(frappe.cache().delete, self.filter_key)
+
+	def test_offsets_are_stable(self):
+		# Offsets are stored in Redis, a change in hashing would make every
+		# stored order look unknown
+		digest = blake2b(b"order4f8a1c2d9e7b3a6", digest_size=16).digest()
+		first = int.from_bytes(digest[:8], "big")
+		second = int.from_bytes(digest[8:], "big") | 1
+
+		self.assertEqual(
+			known_orders._get_offsets("order4f8a1c2d9e7b3a6"),
+			[
+				(first + i * second) % config.HDFC_KNOWN_ORDERS_FILTER_BITS
+				for i in range(config.HDFC_KNOWN_ORDERS_FILTER_HASHES)
+			],
+		)
+
+	def test_offsets_stay_inside_the_filter(self):
+		for order_id in ("a", "order" * 40, "Zoë-₹", "HDFC-ORD-000001"):
+			offsets = known_orders._get_offsets(order_id)
+			with self.subTest(order_id):
+				self.assertEqual(len(offsets), config.HDFC_KNOWN_ORDERS_FILTER_HASHES)
+				self.assertEqual(len(set(offsets)), len(offsets))
+				self.assertTrue(
+					all(0 <= offset < config.HDFC_KNOWN_ORDERS_FILTER_BITS for offset in offsets)
+				)
+				# The sentinel bits after the filter are never hashed to
+				self.assertNotIn(config.HDFC_KNOWN_ORDERS_FILTER_BITS, offsets)
+
+	def test_added_orders_are_found(self):
+		frappe.cache().setbit(self.filter_key, config.HDFC_KNOWN_ORDERS_FILTER_BITS, 1)
+		known_orders.add_order("order-known")
+
+		self.assertTrue(known_orders.order_may_exist("order-known"))
+		self.assertFalse(known_orders.order_may_exist("order-unknown"))
+		self.assertFalse(known_orders.order_may_exist(None))
+
+	def test_incomplete_filter_is_not_trusted(self):
+		known_orders.add_order("order-known")
+		with patch.object(known_orders, "enqueue_rebuild") as enqueue_rebuild:
+			self.assertTrue(known_orders.order_may_exist("order-unknown"))
+		enqueue_rebuild.assert_called_once()
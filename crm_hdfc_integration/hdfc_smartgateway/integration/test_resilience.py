@@ -0,0 +1,207 @@
+# Copyright (c) 2026, OneHash and Contributors
+# See license.txt
+
+import time
+from email.utils import formatdate
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import resilience
+
+
+def make_response(status_code, headers=None):
+	res = requests.Response()
+	res.status_code = status_code
+	res.headers.update(headers or {})
+	res.url = "https://smartgateway.test/orders/order1"
+	return res
+
+
+class FakeSession:
+	def __init__(self, outcomes):
+		self.outcomes = list(outcomes)
+		self.calls = []
+
+	def request(self, method, url, **kwargs):
+		self.calls.append((method, url, kwargs))
+		outcome = self.outcomes.pop(0)
+		if isinstance(outcome, Exception):
+			raise outcome
+		return outcome
+
+
+class FakeBreaker:
+	def __init__(self):
+		self.failures = 0
+		self.successes = 0
+
+	def before_request(self):
+		return bool(self.failures)
+
+	def record_success(self, has_state):
+		self.successes += 1
+
+	def record_failure(self):
+		self.failures += 1
+
+
+class FakeRateLimiter:
+	def acquire(self, request_class, priority):
+		pass
+
+
+class TestRetryPolicy(FrappeTestCase):
+	def send(self, method, outcomes, max_retries=2):
+		self.session = FakeSession(outcomes)
+		self.breaker = FakeBreaker()
+		session_entry = {
+			"site": frappe.local.site,
+			"session": self.session,
+			"breaker": self.breaker,
+			"rate_limiter": FakeRateLimiter(),
+			"timeout": (5, 30),
+			"timeouts": {"order_status": (5, 10)},
+			"max_retries": max_retries,
+			"retry_backoff": 0.5,
+		}
+		with patch.object(resilience.time, "sleep") as self.sleep:
+			return resilience.send(
+				session_entry,
+				method,
+				"https://smartgateway.test/orders/order1",
+				request_class="order_status",
+			)
+
+	def test_idempotent_requests_are_retried(self):
+		res = self.send("GET", [make_response(503), make_response(502), make_response(200)])
+
+		self.assertEqual(res.status_code, 200)
+		self.assertEqual(len(self.session.calls), 3)
+		self.assertEqual(self.breaker.failures, 2)
+		self.assertEqual(self.breaker.successes, 1)
+		# Full jitter backoff, doubling per attempt
+		first, second = (call.args[0] for call in self.sleep.call_args_list)
+		self.assertTrue(0 <= first <= 0.5)
+		self.assertTrue(0 <= second <= 1)
+
+	def test_class_timeout_is_used(self):
+		self.send("GET", [make_response(200)])
+		self.assertEqual(self.session.calls[0][2]["timeout"], (5, 10))
+
+	def test_writes_are_sent_once(self):
+		with self.assertRaises(requests.HTTPError):
+			self.send("POST", [make_response(503)])
+		self.assertEqual(len(self.session.calls), 1)
+		self.sleep.assert_not_called()
+
+	def test_retries_are_bounded(self):
+		with self.assertRaises(requests.HTTPError):
+			self.send("GET", [make_response(503)] * 3)
+		self.assertEqual(len(self.session.calls), 3)
+
+		with self.assertRaises(requests.ConnectionError):
+			self.send("GET", [requests.ConnectionError()] * 2, max_retries=1)
+		self.assertEqual(len(self.session.calls), 2)
+
+	def test_client_errors_are_not_retried(self):
+		with self.assertRaises(requests.HTTPError):
+			self.send("GET", [make_response(404), make_response(200)])
+		self.assertEqual(len(self.session.calls), 1)
+		self.assertEqual(self.breaker.failures, 0)
+
+	def test_retry_after_is_honoured_and_capped(self):
+		self.send("GET", [make_response(429, {"Retry-After": "2"}), make_response(200)])
+		self.sleep.assert_called_once_with(2)
+
+		self.send("GET", [make_response(503, {"Retry-After": "600"}), make_response(200)])
+		self.sleep.assert_called_once_with(config.HDFC_HTTP_RETRY_MAX_DELAY)
+
+	def test_retry_after_values(self):
+		self.assertEqual(resilience.get_retry_after(make_response(503)), None)
+		self.assertEqual(
+			resilience.get_retry_after(make_response(503, {"Retry-After": "7"})), 7
+		)
+		self.assertEqual(
+			resilience.get_retry_after(make_response(503, {"Retry-After": "soon"})), None
+		)
+
+		retry_at = formatdate(time.time() + 30, usegmt=True)
+		delay = resilience.get_retry_after(make_response(503, {"Retry-After": retry_at}))
+		self.assertTrue(25 <= delay <= 30)
+
+		retry_at = formatdate(time.time() - 30, usegmt=True)
+		self.assertEqual(
+			resilience.get_retry_after(make_response(503, {"Retry-After": retry_at})), 0
+		)
+
+
+class TestCircuitBreaker(FrappeTestCase):
+	def setUp(self):
+		self.breaker = resilience.CircuitBreaker(
+			failure_threshold=3, reset_timeout=30, failure_window=60
+		)
+		self.reset()
+		self.addCleanup(self.reset)
+
+	def reset(self):
+		frappe.cache().delete(
+			self.breaker.open_key,
+			self.breaker.tripped_key,
+			self.breaker.failures_key,
+			self.breaker.probe_key,
+		)
+
+	def trip(self):
+		for _ in range(3):
+			self.breaker.record_failure()
+
+	def test_closed_until_threshold(self):
+		self.assertFalse(self.breaker.before_request())
+
+		self.breaker.record_failure()
+		self.breaker.record_failure()
+		self.assertFalse(self.breaker.is_open())
+		# Failures are state a success has to clear
+		self.assertTrue(self.breaker.before_request())
+
+		self.breaker.record_success(True)
+		self.assertFalse(self.breaker.before_request())
+
+	def test_opens_at_threshold(self):
+		self.trip()
+
+		self.assertTrue(self.breaker.is_open())
+		with self.assertRaises(resilience.SmartGatewayUnavailable):
+			self.breaker.before_request()
+
+	def test_half_open_lets_one_probe_through(self):
+		self.trip()
+		# The open key expires after reset_timeout
+		frappe.cache().delete(self.breaker.open_key)
+
+		self.assertTrue(self.breaker.before_request())
+		with self.assertRaises(resilience.SmartGatewayUnavailable):
+			self.breaker.before_request()
+
+	def test_failed_probe_reopens(self):
+		self.trip()
+		frappe.cache().delete(self.breaker.open_key)
+		self.breaker.before_request()
+
+		# A single failure is enough once tripped
+		self.breaker.record_failure()
+		self.assertTrue(self.breaker.is_open())
+
+	def test_successful_probe_closes(self):
+		self.trip()
+		frappe.cache().delete(self.breaker.open_key)
+		has_state = self.breaker.before_request()
+
+		self.breaker.record_success(has_state)
+		self.assertFalse(self.breaker.is_open())
+		self.assertFalse(self.breaker.before_request())
+		self.assertFalse(self.breaker.before_request())
@@ -0,0 +1,96 @@
+# Copyright (c) 2026, OneHash and Contributors
+# See license.txt
+
+import os
+import tempfile
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from crm_hdfc_integration.hdfc_smartgateway.integration import settlement
+
+
+class TestSettlement(FrappeTestCase):
+	def build_index(self, content):
+		with tempfile.NamedTemporaryFile(
+			"w", suffix=".csv", delete=False, encoding="utf-8"
+		) as f:
+			f.write(content)
+		self.addCleanup(os.remove, f.name)
+		return settlement.build_settlement_index(f.name)
+
+	def test_rows_of_an_order_are_added_up(self):
+		index = self.build_index(
+			"Order Id,Txn Id,Amount,Status,Refund Amount\n"
+			"A1,t1,100,CHARGED,0\n"
+			"A1,t1,0,CHARGED,40\n"
+			"A1,,0,,10.5\n"
+			"A2,t2,50,SETTLED,\n"
+		)
+
+		self.assertEqual(index.orders["A1"], ("t1", 100.0, "Success", 50.5))
+		self.assertEqual(index.orders["A2"], ("t2", 50.0, "Success", 0.0))
+		self.assertEqual(index.rows, 4)
+		self.assertEqual(index.conflicts, [])
+
+	def test_disagreeing_rows_are_reported(self):
+		index = self.build_index(
+			"order_id,txn_id,amount,status\n"
+			"A1,t1,100,CHARGED\n"
+			"A1,t9,5,AUTHORIZATION_FAILED\n"
+		)
+
+		self.assertEqual(
+			index.conflicts,
+			[("A1", "Transaction Id", "t1", "t9"), ("A1", "Status", "Success", "Failed")],
+		)
+		# The first row's values are kept, amounts are still added up
+		self.assertEqual(index.orders["A1"], ("t1", 105.0, "Success", None))
+
+	def test_rows_without_order_id_are_indexed_by_txn_id(self):
+		index = self.build_index(
+			"Merchant Order Id,Transaction Id,Txn Amount,Txn Status\n"
+			",t1,10,SUCCESS\n"
+			",t1,5,SUCCESS\n"
+			"A2,t2,20,FAILURE\n"
+		)
+
+		self.assertEqual(index.txn_ids, {"t1": ("t1", 15.0, "Success", None)})
+		self.assertEqual(index.orders, {"A2": ("t2", 20.0, "Failed", None)})
+
+	def test_short_and_blank_rows(self):
+		# Spreadsheet exports often start with a byte order mark
+		index = self.build_index(
+			"\ufefforder_id,txn_id,amount\n"
+			"A1,t1,10\n"
+			"A2,t2\n"
+			",,\n"
+			"\n"
+			"A3,t3,30\n"
+		)
+
+		self.assertEqual(index.short_rows, [3])
+		self.assertEqual(index.rows, 3)
+		self.assertEqual(set(index.orders), {"A1", "A3"})
+
+	def test_file_without_id_columns_is_rejected(self):
+		with self.assertRaises(frappe.ValidationError):
+			self.build_index("amount,status\n10,CHARGED\n")
+
+	def test_compare_order(self):
+		order = frappe._dict(
+			txn_id="t1", amount=100, order_status="Success", amount_refunded=50.5
+		)
+
+		self.assertEqual(
+			settlement.compare_order(("t1", 100.0, "Success", 50.5), order), []
+		)
+		self.assertEqual(
+			settlement.compare_order(("t2", 99.0, "Failed", 0.0), order),
+			[
+				("Transaction Id", "t2", "t1"),
+				("Amount", 99.0, 100),
+				("Status", "Failed", "Success"),
+				("Refund Amount", 0.0, 50.5),
+			],
+		)
@@ -0,0 +1,70 @@
+# Copyright (c) 2026, OneHash and Contributors
+# See license.txt
+
+import hmac
+from base64 import b64encode
+from hashlib import sha256
+from urllib.parse import quote_plus
+
+from frappe.tests.utils import FrappeTestCase
+
+from crm_hdfc_integration.benchmarks.payloads import load_signature_vectors
+from crm_hdfc_integration.hdfc_smartgateway.integration import signature
+
+
+class TestSignature(FrappeTestCase):
+	def setUp(self):
+		vectors = load_signature_vectors()
+		self.key = vectors["key"]
+		self.vectors = vectors["vectors"]
+
+	def test_signature_matches_vectors(self):
+		for vector in self.vectors:
+			with self.subTest(vector["name"]):
+				self.assertEqual(
+					signature.get_signature(vector["params"], self.key), vector["signature"]
+				)
+				self.assertTrue(
+					signature.verify_signature(vector["signature"], vector["params"], self.key)
+				)
+
+	def test_signature_string_is_encoded_twice(self):
+		# The canonical form HDFC documents, built the slow way
+		for vector in self.vectors:
+			params = vector["params"]
+			encoded = "&".join(
+				quote_plus(name) + "=" + quote_plus(params[name]) for name in sorted(params)
+			)
+			with self.subTest(vector["name"]):
+				self.assertEqual(signature.get_signature_string(params), quote_plus(encoded))
+
+	def test_tampered_params_are_rejected(self):
+		vector = self.vectors[0]
+		params = {**vector["params"], "status": "CHARGED", "status_id": "22"}
+		self.assertFalse(signature.verify_signature(vector["signature"], params, self.key))
+		self.assertFalse(
+			signature.verify_signature(vector["signature"], vector["params"], "other-key")
+		)
+
+	def test_malformed_signatures_are_rejected(self):
+		params = self.vectors[0]["params"]
+		for value in (None, "", "not base64!", "YWJj"):
+			with self.subTest(value):
+				self.assertFalse(signature.verify_signature(value, params, self.key))
+
+	def test_batch_verification_keeps_order(self):
+		callbacks = [(vector["signature"], vector["params"]) for vector in self.vectors]
+		callbacks.insert(1, ("", self.vectors[0]["params"]))
+		callbacks.append((self.vectors[0]["signature"], self.vectors[1]["params"]))
+
+		self.assertEqual(
+			signature.verify_signatures(callbacks, self.key),
+			[True, False, *[True] * (len(self.vectors) - 1), False],
+		)
+
+	def test_body_signature(self):
+		body = b'{"event_name": "ORDER_SUCCEEDED"}'
+		signed = b64encode(hmac.new(self.key.encode(), body, sha256).digest())
+
+		self.assertTrue(signature.verify_body_signature(signed, body, self.key))
+		self.assertFalse(signature.verify_body_signature(signed, body + b" ", self.key))
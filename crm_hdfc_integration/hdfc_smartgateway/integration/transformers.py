@@ -1,4 +1,6 @@
 import frappe
+from hashlib import sha1
+from operator import itemgetter
 from crm_hdfc_integration import utils
 
 ORDER_STATUS_MAP = {
@@ -67,12 +69,120 @@ HDFC_PAYMENT_METHOD_MAP = {
 }
 
 
+UDF_KEYS = tuple(f"udf{idx}" for idx in range(1, 11))
+
+# (HDFC Order field, status response key) pairs copied as is
+ORDER_FIELD_SPECS = (
+    ("hdfc_status", "status"),
+    ("amount", "amount"),
+    ("payment_service", "payment_method"),
+    ("refunded", "refunded"),
+    ("amount_refunded", "amount_refunded"),
+    ("effective_amount", "effective_amount"),
+    ("response_code", "resp_code"),
+    ("response_message", "resp_message"),
+    ("bank_error_code", "bank_error_code"),
+    ("bank_error_message", "bank_error_message"),
+    ("gateway_id", "gateway_id"),
+    ("gateway_reference_id", "gateway_reference_id"),
+)
+
+# (HDFC Order field, txn_detail key) pairs, all optional
+TXN_FIELD_SPECS = (
+    ("txn_id", "txn_id"),
+    ("txn_uuid", "txn_uuid"),
+    ("txn_status", "status"),
+    ("txn_currency", "currency"),
+    ("txn_net_amount", "net_amount"),
+    ("txn_supercharge_amount", "surcharge_amount"),
+    ("txn_tax_amount", "tax_amount"),
+    ("txn_amount", "txn_amount"),
+    ("txn_offer_deduction_amount", "offer_deduction_amount"),
+    ("txn_error_code", "error_code"),
+    ("txn_error_message", "error_message"),
+    ("express_checkout", "express_checkout"),
+    ("gateway", "gateway"),
+)
+
+# (HDFC Txn Amount Breakup field, breakup key) pairs
+BREAKUP_FIELD_SPECS = (
+    ("idx", "sno"),
+    ("breakup_name", "name"),
+    ("value", "value"),
+    ("method", "method"),
+    ("description", "desc"),
+)
+
+CARD_FIELDS = (
+    "name_on_card",
+    "card_reference",
+    "expiry_year",
+    "expiry_month",
+    "last_four_digits",
+    "saved_to_locker",
+    "using_saved_card",
+    "card_issuer",
+    "card_brand",
+    "card_type",
+    "card_isin",
+    "card_fingerprint",
+)
+
+REFUND_FIELDS = (
+    "id",
+    "amount",
+    "unique_request_id",
+    "ref",
+    "status",
+    "error_message",
+    "sent_to_gateway",
+    "initiated_by",
+    "refund_source",
+    "refund_type",
+    "error_code",
+    "metadata",
+)
+
+
+# Getters compiled once from the specs above
+_get_udf_values = itemgetter(*UDF_KEYS)
+_ORDER_FIELDS = tuple(field for field, _ in ORDER_FIELD_SPECS)
+_get_order_values = itemgetter(*(key for _, key in ORDER_FIELD_SPECS))
+_get_card_values = itemgetter(*CARD_FIELDS)
+_get_refund_values = itemgetter(*REFUND_FIELDS)
+
+
 def get_system_status_for_id(hdfc_status_id):
     if isinstance(hdfc_status_id, str):
         hdfc_status_id = int(hdfc_status_id)
     return HDFC_STATUS_ID_MAP[hdfc_status_id]
 
 
+def get_status_fingerprint(order_status_res):
+    # Covers every field whose change is worth applying to the order
+    txn_details = order_status_res.get("txn_detail") or {}
+    refunds = [
+        [
+            refund.get("id"),
+            refund.get("unique_request_id"),
+            refund.get("status"),
+            refund.get("amount"),
+        ]
+        for refund in order_status_res.get("refunds") or []
+    ]
+    fingerprint_source = frappe.as_json(
+        [
+            order_status_res.get("status_id"),
+            order_status_res.get("status"),
+            order_status_res.get("amount_refunded"),
+            txn_details.get("txn_id"),
+            refunds,
+        ],
+        indent=None,
+    )
+    return sha1(fingerprint_source.encode("utf-8")).hexdigest()
+
+
 def parse_session_res(session_res):
     return {
         "sdk_payload": session_res["sdk_payload"],
@@ -85,101 +195,55 @@ def parse_session_res(session_res):
     }
 
 
-def parse_order_status_res(order_status_res):
-    user_defined_values = {
-        "udf1": order_status_res["udf1"],
-        "udf2": order_status_res["udf2"],
-        "udf3": order_status_res["udf3"],
-        "udf4": order_status_res["udf4"],
-        "udf5": order_status_res["udf5"],
-        "udf6": order_status_res["udf6"],
-        "udf7": order_status_res["udf7"],
-        "udf8": order_status_res["udf8"],
-        "udf9": order_status_res["udf9"],
-        "udf10": order_status_res["udf10"],
+def peek_order_status_res(order_status_res):
+    # Cheap partial decode, enough to tell whether the full parse is needed
+    return {
+        "order_status": HDFC_STATUS_ID_MAP[order_status_res["status_id"]],
+        "hdfc_status": order_status_res["status"],
     }
 
-    txn_details = order_status_res.get("txn_detail") or {}
 
-    order_status_data = {
-        "order_status": HDFC_STATUS_ID_MAP[order_status_res["status_id"]],
-        "hdfc_status": order_status_res["status"],
-        "amount": order_status_res["amount"],
-        "user_defined_values": frappe.as_json(user_defined_values),
-        "mode_of_payment": HDFC_PAYMENT_METHOD_MAP[
-            order_status_res["payment_method_type"]
-        ],
-        "payment_service": order_status_res["payment_method"],
-        "refunded": order_status_res["refunded"],
-        "amount_refunded": order_status_res["amount_refunded"],
-        "effective_amount": order_status_res["effective_amount"],
-        "response_code": order_status_res["resp_code"],
-        "response_message": order_status_res["resp_message"],
-        "bank_error_code": order_status_res["bank_error_code"],
-        "bank_error_message": order_status_res["bank_error_message"],
-        "txn_id": txn_details.get("txn_id"),
-        "txn_uuid": txn_details.get("txn_uuid"),
-        "txn_status": txn_details.get("status"),
-        "txn_date": utils.parse_utc_datetime(txn_details.get("created")),
-        "txn_currency": txn_details.get("currency"),
-        "txn_net_amount": txn_details.get("net_amount"),
-        "txn_supercharge_amount": txn_details.get("surcharge_amount"),
-        "txn_tax_amount": txn_details.get("tax_amount"),
-        "txn_amount": txn_details.get("txn_amount"),
-        "txn_offer_deduction_amount": txn_details.get("offer_deduction_amount"),
-        "txn_error_code": txn_details.get("error_code"),
-        "txn_error_message": txn_details.get("error_message"),
-        "express_checkout": txn_details.get("express_checkout"),
-        "gateway": txn_details.get("gateway"),
-        "txn_amount_breakup": [
-            {
-                "idx": amnt_break.get("sno"),
-                "breakup_name": amnt_break.get("name"),
-                "value": amnt_break.get("value"),
-                "method": amnt_break.get("method"),
-                "description": amnt_break.get("desc"),
-            }
-            for amnt_break in txn_details.get("txn_amount_breakup") or []
-        ],
-        "gateway_id": order_status_res["gateway_id"],
-        "gateway_reference_id": order_status_res["gateway_reference_id"],
+def parse_refund(refund, to_system_datetime):
+    return {
+        **dict(zip(REFUND_FIELDS, _get_refund_values(refund))),
+        "refund_time": to_system_datetime(refund["created"]),
     }
 
-    if order_status_res.get("card"):
-        card_res = order_status_res["card"]
-        order_status_data["name_on_card"] = card_res["name_on_card"]
-        order_status_data["card_reference"] = card_res["card_reference"]
-        order_status_data["expiry_year"] = card_res["expiry_year"]
-        order_status_data["expiry_month"] = card_res["expiry_month"]
-        order_status_data["last_four_digits"] = card_res["last_four_digits"]
-        order_status_data["saved_to_locker"] = card_res["saved_to_locker"]
-        order_status_data["using_saved_card"] = card_res["using_saved_card"]
-        order_status_data["card_issuer"] = card_res["card_issuer"]
-        order_status_data["card_brand"] = card_res["card_brand"]
-        order_status_data["card_type"] = card_res["card_type"]
-        order_status_data["card_isin"] = card_res["card_isin"]
-        order_status_data["card_fingerprint"] = card_res["card_fingerprint"]
+
+def parse_order_status_res(order_status_res):
+    user_defined_values = dict(zip(UDF_KEYS, _get_udf_values(order_status_res)))
+    txn_details = order_status_res.get("txn_detail") or {}
+    to_system_datetime = utils.get_system_datetime_converter()
+
+    order_status_data = dict(zip(_ORDER_FIELDS, _get_order_values(order_status_res)))
+    order_status_data.update(
+        {field: txn_details.get(key) for field, key in TXN_FIELD_SPECS}
+    )
+    order_status_data.update(
+        {
+            "order_status": HDFC_STATUS_ID_MAP[order_status_res["status_id"]],
+            # Compact JSON keeps the C encoder, indented output does not
+            "user_defined_values": frappe.as_json(user_defined_values, indent=None),
+            "mode_of_payment": HDFC_PAYMENT_METHOD_MAP[
+                order_status_res["payment_method_type"]
+            ],
+            "txn_date": to_system_datetime(txn_details.get("created")),
+            "txn_amount_breakup": [
+                {field: amnt_break.get(key) for field, key in BREAKUP_FIELD_SPECS}
+                for amnt_break in txn_details.get("txn_amount_breakup") or []
+            ],
+        }
+    )
+
+    card_res = order_status_res.get("card")
+    if card_res:
+        order_status_data.update(zip(CARD_FIELDS, _get_card_values(card_res)))
 
     if order_status_res.get("refunds"):
-        order_status_data["refunds"] = []
-        for refund in order_status_res.get("refunds"):
-            order_status_data["refunds"].append(
-                {
-                    "id": refund["id"],
-                    "amount": refund["amount"],
-                    "unique_request_id": refund["unique_request_id"],
-                    "ref": refund["ref"],
-                    "refund_time": utils.parse_utc_datetime(refund["created"]),
-                    "status": refund["status"],
-                    "error_message": refund["error_message"],
-                    "sent_to_gateway": refund["sent_to_gateway"],
-                    "initiated_by": refund["initiated_by"],
-                    "refund_source": refund["refund_source"],
-                    "refund_type": refund["refund_type"],
-                    "error_code": refund["error_code"],
-                    "metadata": refund["metadata"],
-                }
-            )
+        order_status_data["refunds"] = [
+            parse_refund(refund, to_system_datetime)
+            for refund in order_status_res["refunds"]
+        ]
 
     # Cleanoff None values
     order_status_data = {k: v for k, v in order_status_data.items() if v is not None}
@@ -1,12 +1,14 @@
 import frappe
 from base64 import b64encode
-from hmac import new as hmac
-from hashlib import sha256
-from urllib.parse import quote_plus
 from frappe.query_builder import Order
 
 ORDER_ID_LENGTH = 15  # 20; -5 for order
 HDFC_WH_ORDER_UPDATED = "HDFC_ORDER_UPDATED_WH"
+SETTINGS_CACHE_VERSION_KEY = "hdfc_smartgateway_settings_version"
+
+# Per worker settings cache, keyed by site and validated against the
+# version stored in the site cache
+_settings_cache = {}
 
 
 def generate_order_id():
@@ -21,17 +23,86 @@ def get_smartgateway_settings():
     return smartgateway_settings
 
 
-def verify_hmac_signature(signature, params, key):
-    if isinstance(key, str):
-        key = key.encode("utf-8")
-    encoded_sorted = []
-    for i in sorted(params.keys()):
-        encoded_sorted.append(quote_plus(i) + "=" + quote_plus(params.get(i)))
+def get_cached_settings(raise_if_disabled=True):
+    cache = frappe.cache()
+    version = cache.get_value(SETTINGS_CACHE_VERSION_KEY)
+    if not version:
+        version = frappe.generate_hash(length=10)
+        cache.set_value(SETTINGS_CACHE_VERSION_KEY, version)
+
+    settings = _settings_cache.get(frappe.local.site)
+    if not settings or settings.version != version:
+        settings = _load_settings(version)
+        _settings_cache[frappe.local.site] = settings
+
+    if raise_if_disabled and not settings.enabled:
+        frappe.throw("HDFC SmartGateway is not enabled")
+
+    return settings
+
+
+def clear_settings_cache():
+    frappe.cache().delete_value(SETTINGS_CACHE_VERSION_KEY)
+    _settings_cache.pop(getattr(frappe.local, "site", None), None)
+
+
+def _load_settings(version):
+    smartgateway_settings = frappe.get_single("HDFC SmartGateway Settings")
+    settings = frappe._dict(
+        version=version,
+        enabled=smartgateway_settings.enabled,
+        merchant_id=smartgateway_settings.merchant_id,
+        client_id=smartgateway_settings.client_id,
+        api_base_uri=smartgateway_settings.api_base_uri,
+        response_key=smartgateway_settings.response_key,
+        pool_connections=smartgateway_settings.pool_connections,
+        pool_maxsize=smartgateway_settings.pool_maxsize,
+        connect_timeout=smartgateway_settings.connect_timeout,
+        read_timeout=smartgateway_settings.read_timeout,
+        max_retries=smartgateway_settings.max_retries,
+        retry_backoff=smartgateway_settings.retry_backoff,
+        breaker_failure_threshold=smartgateway_settings.breaker_failure_threshold,
+        breaker_reset_timeout=smartgateway_settings.breaker_reset_timeout,
+        total_rate_limit=smartgateway_settings.total_rate_limit,
+        background_reserve=smartgateway_settings.background_reserve,
+        session_rate_limit=smartgateway_settings.session_rate_limit,
+        status_rate_limit=smartgateway_settings.status_rate_limit,
+        refund_rate_limit=smartgateway_settings.refund_rate_limit,
+        status_cache_ttl=smartgateway_settings.status_cache_ttl,
+        terminal_status_cache_ttl=smartgateway_settings.terminal_status_cache_ttl,
+        order_status_wait_timeout=smartgateway_settings.order_status_wait_timeout,
+        webhook_processing=smartgateway_settings.webhook_processing,
+        webhook_batch_size=smartgateway_settings.webhook_batch_size,
+        webhook_auth_type=smartgateway_settings.webhook_auth_type,
+        webhook_user=smartgateway_settings.webhook_user,
+        webhook_auth_header=smartgateway_settings.webhook_auth_header,
+        webhook_ip_rate_limit=smartgateway_settings.webhook_ip_rate_limit,
+        reject_unknown_orders=smartgateway_settings.reject_unknown_orders,
+        reconciliation_concurrency=smartgateway_settings.reconciliation_concurrency,
+        reconciliation_rate_limit=smartgateway_settings.reconciliation_rate_limit,
+        reconciliation_commit_size=smartgateway_settings.reconciliation_commit_size,
+        status_log_storage=smartgateway_settings.status_log_storage,
+        payment_entry_creation=smartgateway_settings.payment_entry_creation,
+        payment_entry_queue=smartgateway_settings.payment_entry_queue,
+        api_key=None,
+        authorization=None,
+        webhook_secret=None,
+    )
+
+    if settings.enabled:
+        settings.api_key = smartgateway_settings.get_password(
+            "api_key", raise_exception=False
+        )
+        if settings.api_key:
+            encoded_key = b64encode(settings.api_key.encode("utf-8")).decode("utf-8")
+            settings.authorization = f"Basic {encoded_key}"
 
-    encoded_string = quote_plus("&".join(encoded_sorted))
-    dig = hmac(key, msg=encoded_string.encode("utf-8"), digestmod=sha256).digest()
+        if settings.webhook_auth_type in ("Shared Secret", "HMAC"):
+            settings.webhook_secret = smartgateway_settings.get_password(
+                "webhook_secret", raise_exception=False
+            )
 
-    return b64encode(dig).decode() == signature
+    return settings
 
 
 def get_return_url():
@@ -51,3 +122,17 @@ def get_user_active_sid(user):
     if len(session_ids):
         return session_ids[0]["sid"]
     return None
+
+
+def is_session_active(sid):
+    if not sid:
+        return False
+
+    session = frappe.qb.DocType("Sessions")
+    return bool(
+        frappe.qb.from_(session)
+        .where((session.sid == sid) & (session.status == "Active"))
+        .select(session.sid)
+        .limit(1)
+        .run()
+    )
@@ -1,17 +1,205 @@
+import hmac
+import time
+
 import frappe
-from crm_hdfc_integration.hdfc_smartgateway.integration import service, utils
+from crm_hdfc_integration.config import config
+from crm_hdfc_integration.hdfc_smartgateway.integration import (
+    known_orders,
+    metrics,
+    service,
+    signature,
+    utils,
+)
+
+WEBHOOK_INBOX_JOB_ID = "hdfc_smartgateway_webhook_inbox"
+WEBHOOK_THROTTLE_KEY = "hdfc_smartgateway_webhook_throttle"
 
 
 @frappe.whitelist(allow_guest=True)
+@metrics.timed("webhook_handle_order")
 def handle_order():
+    settings = utils.get_cached_settings()
+    validate_webhook_request(settings)
     content = frappe.form_dict.get("content") or {}
 
     if content.get("order"):
+        if settings.reject_unknown_orders and not known_orders.order_may_exist(
+            content["order"].get("order_id")
+        ):
+            _reject("unknown_order", "No Order Found.", frappe.DoesNotExistError)
+
+        if settings.webhook_processing == "Queued":
+            queue_order_event(content.get("order"))
+            return
+
         order_doc = service._sync_order_status(status_res=content.get("order"))
+        if order_doc:
+            publish_order_update(order_doc)
+
+
+def validate_webhook_request(settings):
+    # Throttling and authentication only use the cached settings and Redis,
+    # so rejected calls never reach the database
+    rate_limit = settings.webhook_ip_rate_limit
+    if rate_limit is None:
+        rate_limit = config.HDFC_WEBHOOK_IP_RATE_LIMIT
+    if rate_limit and _count_ip_call() > rate_limit:
+        _reject("throttled", "Too many webhook calls.", frappe.TooManyRequestsError)
+
+    auth_type = settings.webhook_auth_type
+    if auth_type == "Basic Auth":
+        # Frappe authenticates the api key and secret sent as basic auth
+        is_valid = frappe.session.user == settings.webhook_user
+    elif auth_type == "Shared Secret":
+        received = frappe.get_request_header(settings.webhook_auth_header) or ""
+        is_valid = bool(settings.webhook_secret) and hmac.compare_digest(
+            received.encode("utf-8"), settings.webhook_secret.encode("utf-8")
+        )
+    elif auth_type == "HMAC":
+        is_valid = bool(settings.webhook_secret) and signature.verify_body_signature(
+            frappe.get_request_header(settings.webhook_auth_header),
+            frappe.request.get_data(),
+            settings.webhook_secret,
+        )
+    else:
+        is_valid = True
+
+    if not is_valid:
+        _reject(
+            "unauthenticated",
+            "Webhook authentication failed.",
+            frappe.AuthenticationError,
+        )
+
+
+def _count_ip_call():
+    # Fixed window counter per client IP
+    window = config.HDFC_WEBHOOK_RATE_LIMIT_WINDOW
+    window_start = int(time.time() // window)
+    cache = frappe.cache()
+    throttle_key = cache.make_key(
+        f"{WEBHOOK_THROTTLE_KEY}::{frappe.local.request_ip}::{window_start}"
+    )
+
+    pipeline = cache.pipeline()
+    pipeline.incr(throttle_key)
+    pipeline.expire(throttle_key, window)
+    calls, _ = pipeline.execute()
+    return calls
+
+
+def _reject(reason, message, exc):
+    metrics.inc("hdfc_webhook_rejections_total", reason=reason)
+    frappe.throw(message, exc)
+
+
+def publish_order_update(order_doc):
+    frappe.publish_realtime(
+        utils.HDFC_WH_ORDER_UPDATED,
+        {"order_id": order_doc.name},
+        user=order_doc.owner,
+        after_commit=True,
+    )
+
 
-        frappe.publish_realtime(
-            utils.HDFC_WH_ORDER_UPDATED,
-            {"order_id": order_doc.name},
-            user=order_doc.owner,
-            after_commit=True,
+def queue_order_event(order_res):
+    if not order_res.get("order_id"):
+        frappe.throw("Order Id is required.")
+
+    frappe.get_doc(
+        {
+            "doctype": "HDFC Webhook Event",
+            "order_id": order_res["order_id"],
+            "hdfc_status": order_res.get("status"),
+            "payload": order_res,
+        }
+    ).insert(ignore_permissions=True)
+
+    enqueue_webhook_events(enqueue_after_commit=True)
+
+
+def enqueue_webhook_events(enqueue_after_commit=False):
+    # Every drain goes through the one deduplicated job, so no two workers
+    # read the same queued events
+    frappe.enqueue(
+        "crm_hdfc_integration.hdfc_smartgateway.integration.webhook.process_webhook_events",
+        queue="short",
+        job_id=WEBHOOK_INBOX_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=enqueue_after_commit,
+    )
+
+
+def enqueue_queued_webhook_events():
+    # Scheduler fallback for drains lost with a worker
+    if frappe.db.exists("HDFC Webhook Event", {"status": "Queued"}):
+        enqueue_webhook_events()
+
+
+@metrics.timed("webhook_process_events")
+def process_webhook_events():
+    settings = utils.get_cached_settings(raise_if_disabled=False)
+    if not settings.enabled:
+        return
+
+    batch_size = settings.webhook_batch_size or config.HDFC_WEBHOOK_BATCH_SIZE
+
+    while True:
+        events = frappe.get_all(
+            "HDFC Webhook Event",
+            filters={"status": "Queued"},
+            fields=["name", "order_id"],
+            order_by="creation asc",
+            limit=batch_size,
+        )
+        if not events:
+            break
+
+        # Events are in arrival order, so the last one per order is the latest
+        order_events = {}
+        for event in events:
+            order_events.setdefault(event.order_id, []).append(event.name)
+
+        latest_events = [names[-1] for names in order_events.values()]
+        latest_payloads = dict(
+            frappe.get_all(
+                "HDFC Webhook Event",
+                filters={"name": ["in", latest_events]},
+                fields=["name", "payload"],
+                as_list=True,
+            )
+        )
+
+        for event_names in order_events.values():
+            _apply_order_events(event_names, latest_payloads[event_names[-1]])
+
+
+def _apply_order_events(event_names, payload):
+    latest_event = event_names[-1]
+    try:
+        order_doc = service._sync_order_status(status_res=frappe.parse_json(payload))
+        if order_doc:
+            publish_order_update(order_doc)
+
+        frappe.db.set_value("HDFC Webhook Event", latest_event, "status", "Processed")
+        if len(event_names) > 1:
+            frappe.db.set_value(
+                "HDFC Webhook Event",
+                {"name": ["in", event_names[:-1]]},
+                "status",
+                "Coalesced",
+            )
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.db.set_value(
+            "HDFC Webhook Event",
+            {"name": ["in", event_names]},
+            {"status": "Failed", "error": frappe.get_traceback()},
+        )
+        frappe.db.commit()
+        frappe.log_error(
+            "HDFC webhook event processing failed",
+            reference_doctype="HDFC Webhook Event",
+            reference_name=latest_event,
         )
@@ -107,6 +107,12 @@ after_install = "crm_hdfc_integration.install.after_install"
 # before_app_uninstall = "crm_hdfc_integration.utils.before_app_uninstall"
 # after_app_uninstall = "crm_hdfc_integration.utils.after_app_uninstall"
 
+# Cache
+# ------------------
+# Cleared along with the site cache (bench clear-cache)
+
+clear_cache = "crm_hdfc_integration.hdfc_smartgateway.integration.utils.clear_settings_cache"
+
 # Desk Notifications
 # ------------------
 # See frappe.core.notifications.get_notification_config
@@ -148,23 +154,24 @@ after_install = "crm_hdfc_integration.install.after_install"
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"crm_hdfc_integration.tasks.all"
-# 	],
-# 	"daily": [
-# 		"crm_hdfc_integration.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"crm_hdfc_integration.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"crm_hdfc_integration.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"crm_hdfc_integration.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+	"all": [
+		"crm_hdfc_integration.hdfc_smartgateway.integration.webhook.enqueue_queued_webhook_events"
+	],
+	"cron": {
+		"*/5 * * * *": [
+			"crm_hdfc_integration.hdfc_smartgateway.integration.reconciliation.reconcile_recent_orders",
+			"crm_hdfc_integration.hdfc_smartgateway.integration.refunds.poll_pending_refunds",
+		],
+	},
+	"hourly": [
+		"crm_hdfc_integration.hdfc_smartgateway.integration.reconciliation.reconcile_today_orders",
+		"crm_hdfc_integration.hdfc_smartgateway.doctype.hdfc_order.hdfc_order.enqueue_all_payment_entries",
+	],
+	"daily": [
+		"crm_hdfc_integration.hdfc_smartgateway.integration.reconciliation.reconcile_week_orders"
+	],
+}
 
 # Testing
 # -------
@@ -199,11 +206,16 @@ after_install = "crm_hdfc_integration.install.after_install"
 # before_request = ["crm_hdfc_integration.utils.before_request"]
 # after_request = ["crm_hdfc_integration.utils.after_request"]
 
+# Metrics recorded by a worker are flushed to Redis after requests and jobs
+after_request = ["crm_hdfc_integration.hdfc_smartgateway.integration.metrics.flush_metrics"]
+
 # Job Events
 # ----------
 # before_job = ["crm_hdfc_integration.utils.before_job"]
 # after_job = ["crm_hdfc_integration.utils.after_job"]
 
+after_job = ["crm_hdfc_integration.hdfc_smartgateway.integration.metrics.flush_metrics"]
+
 # User Data Protection
 # --------------------
 
@@ -238,7 +250,8 @@ after_install = "crm_hdfc_integration.install.after_install"
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+	"HDFC Webhook Event": 30,  # days to retain logs
+	"HDFC Order Status Logs": 90,
+}
 
@@ -2,9 +2,32 @@ import frappe
 
 from crm_hdfc_integration.config import config
 
+# Composite indexes on HDFC Order, one per query shape of the integration
+HDFC_ORDER_INDEXES = {
+    # reconcile_open_orders: open drafts created in an age bucket
+    "hdfc_order_docstatus_status_creation_index": [
+        "docstatus",
+        "order_status",
+        "creation",
+    ],
+    # create_queued_payment_entries: oldest queued orders of a company
+    "hdfc_order_payment_entry_queue_index": [
+        "payment_entry_status",
+        "company",
+        "creation",
+    ],
+    # Settlement reconciliation: settled orders of a period
+    "hdfc_order_status_txn_date_index": ["order_status", "txn_date"],
+    # Orders paying for a reference document
+    "hdfc_order_reference_index": ["reference_type", "reference_doc"],
+    # Order export: keyset pages on (modified, name)
+    "hdfc_order_modified_name_index": ["modified", "name"],
+}
+
 
 def after_install():
     add_hdfc_mops()
+    add_hdfc_order_indexes()
 
     frappe.db.commit()
 
@@ -13,3 +36,20 @@ def add_hdfc_mops():
     for mode in config.HDFC_MODE_OF_PAYMENTS:
         if not frappe.db.exists("Mode of Payment", mode.get("mode_of_payment")):
             frappe.get_doc({"doctype": "Mode of Payment", **mode}).insert()
+
+
+def drop_sessions_user_status_index():
+    # Sessions is a core table, the index earlier versions added to it is
+    # removed
+    index_name = "hdfc_user_status_lastupdate_index"
+    if not frappe.db.has_index("tabSessions", index_name):
+        return
+    if frappe.db.db_type == "postgres":
+        frappe.db.sql_ddl(f'drop index if exists "{index_name}"')
+    else:
+        frappe.db.sql_ddl(f"alter table `tabSessions` drop index `{index_name}`")
+
+
+def add_hdfc_order_indexes():
+    for index_name, fields in HDFC_ORDER_INDEXES.items():
+        frappe.db.add_index("HDFC Order", fields, index_name=index_name)
@@ -0,0 +1,5 @@
+from crm_hdfc_integration.install import add_hdfc_order_indexes
+
+
+def execute():
+    add_hdfc_order_indexes()
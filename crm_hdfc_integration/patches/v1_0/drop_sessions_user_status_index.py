@@ -0,0 +1,5 @@
+from crm_hdfc_integration.install import drop_sessions_user_status_index
+
+
+def execute():
+    drop_sessions_user_status_index()
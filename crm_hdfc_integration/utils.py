@@ -1,17 +1,41 @@
 import frappe
 from base64 import b64encode
+from datetime import datetime
+from functools import lru_cache
 from frappe import utils
 from pytz import timezone
 
 
 def parse_utc_datetime(datetime_like_obj):
-    system_tz_name = utils.get_system_timezone()
-    system_tz = timezone(system_tz_name)
+    return get_system_datetime_converter()(datetime_like_obj)
 
-    datetime = utils.get_datetime(datetime_like_obj)
-    if datetime:
-        return datetime.astimezone(system_tz).replace(tzinfo=None)
-    return None
+
+def get_system_datetime_converter():
+    # Resolve the system timezone once for a whole batch of conversions
+    system_tz = _get_timezone(utils.get_system_timezone())
+
+    def to_system_datetime(datetime_like_obj):
+        parsed_datetime = _parse_datetime(datetime_like_obj)
+        if parsed_datetime:
+            return parsed_datetime.astimezone(system_tz).replace(tzinfo=None)
+        return None
+
+    return to_system_datetime
+
+
+def _parse_datetime(datetime_like_obj):
+    # HDFC sends ISO 8601 timestamps, parse them without the dateutil fallback
+    if isinstance(datetime_like_obj, str):
+        try:
+            return datetime.fromisoformat(datetime_like_obj)
+        except ValueError:
+            pass
+    return utils.get_datetime(datetime_like_obj)
+
+
+@lru_cache(maxsize=None)
+def _get_timezone(tz_name):
+    return timezone(tz_name)
 
 
 def get_base64_string(string: str):